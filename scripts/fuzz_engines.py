@@ -0,0 +1,50 @@
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+sys.path[:0] = [str(SRC), str(SRC / "tests")]
+
+from application.conformance import ENGINES, fuzz  # noqa: E402
+from scenarios import GENERATORS  # noqa: E402
+
+
+def format_scenario(scenario) -> str:
+    # In the input file format, so a failure can be replayed with main.py.
+    grid_size_x, grid_size_y, cars = scenario
+    lines = [f"{grid_size_x} {grid_size_y}"]
+    for car_id, pose, commands in cars:
+        lines += ["", car_id, pose, commands]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run seeded random scenarios through the reference Grid "
+        "and every registered engine; exits with status 1 on a mismatch."
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--count", type=int, default=500, help="Scenarios per kind")
+    kinds = list(GENERATORS)
+    parser.add_argument("--kinds", nargs="+", choices=kinds, default=kinds)
+    parser.add_argument("--engines", nargs="+", choices=sorted(ENGINES))
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    generators = [GENERATORS[kind] for kind in args.kinds]
+    mismatches = fuzz(args.seed, args.count, generators, args.engines)
+    for mismatch in mismatches:
+        expected, actual = mismatch["expected"], mismatch["actual"]
+        print(f"== {mismatch['engine']} differs from the reference on:")
+        print(format_scenario(mismatch["scenario"]))
+        print(f"-- expected: {expected}")
+        print(f"-- actual:   {actual}")
+    if mismatches:
+        sys.exit(1)
+    engines = ", ".join(args.engines or ENGINES)
+    print(f"{args.count} scenarios per kind agree on: {engines}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+
+DEFAULT_INPUT = Path(__file__).resolve().parent.parent / "input.txt"
+
+
+async def open_connection(args):
+    if args.socket:
+        return await asyncio.open_unix_connection(args.socket)
+    return await asyncio.open_connection(args.host, args.port)
+
+
+async def client_loop(args, payload: bytes, deadline: float, latencies: list):
+    reader, writer = await open_connection(args)
+    errors = 0
+    try:
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            writer.write(payload)
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - started)
+            if "error" in response:
+                errors += 1
+    finally:
+        writer.close()
+    return errors
+
+
+async def run(args) -> None:
+    payload = json.dumps({"input": Path(args.input).read_text()}).encode() + b"\n"
+    latencies = []
+    started = time.perf_counter()
+    deadline = started + args.duration
+    errors = await asyncio.gather(
+        *(client_loop(args, payload, deadline, latencies) for _ in range(args.clients))
+    )
+    elapsed = time.perf_counter() - started
+
+    if not latencies:
+        print("No requests completed")
+        return
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"requests:   {len(latencies)} ({sum(errors)} errors)")
+    print(f"throughput: {len(latencies) / elapsed:.1f} req/s")
+    print(f"latency:    p50 {statistics.median(latencies) * 1000:.2f} ms")
+    print(f"            p99 {p99 * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the simulation service.")
+    parser.add_argument("--socket", help="Unix socket path of the service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds")
+    parser.add_argument("--input", default=str(DEFAULT_INPUT))
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
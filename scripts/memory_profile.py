@@ -0,0 +1,169 @@
+import argparse
+import io
+import multiprocessing
+import random
+import resource
+import sys
+import tracemalloc
+from contextlib import redirect_stdout
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+DEFAULT_CARS = (25, 100, 400)
+DEFAULT_COMMANDS = (1000, 10000)
+
+
+def scenario(cars: int, commands: int, seed: int = 42):
+    # Cars spread over the smallest square grid that holds them, turning in
+    # place so that every program runs to the end without a collision.
+    size = 1
+    while size * size < cars:
+        size += 1
+    rng = random.Random(seed)
+    cells = rng.sample([(x, y) for x in range(size) for y in range(size)], cars)
+    return size, [
+        (f"C{index}", x, y, "".join(rng.choices("LR", k=commands)))
+        for index, (x, y) in enumerate(cells)
+    ]
+
+
+def traced(build) -> int:
+    # Bytes held by what build() returns.
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        return tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def build_grid(size: int, cars: list):
+    from constants import Direction
+    from domain import Grid
+
+    grid = Grid(size_x=size, size_y=size)
+    for car_id, x, y, commands in cars:
+        grid.add_car(car_id, x, y, Direction.NORTH, commands)
+    return grid
+
+
+def footprint(cars: int, commands: int) -> tuple[float, float]:
+    # Bytes per car (with empty programs) and per command, from the grid
+    # built through Grid.add_car. A first small grid pays for imports and
+    # model set-up, so they are not charged to the cars.
+    build_grid(*scenario(2, 1))
+    size, empty = scenario(cars, 0)
+    _, full = scenario(cars, commands)
+    empty_bytes = traced(lambda: build_grid(size, empty))
+    full_bytes = traced(lambda: build_grid(size, full))
+    return empty_bytes / cars, (full_bytes - empty_bytes) / (cars * commands)
+
+
+def simulate(cars: int, commands: int) -> int:
+    # Peak traced bytes while a Simulation is built and stepped.
+    from application.simulation import Simulation
+    from domain.trajectory import TrajectoryMemo
+
+    size, cars = scenario(cars, commands)
+    rows = [[car_id, f"{x} {y} N", program] for car_id, x, y, program in cars]
+
+    tracemalloc.start()
+    try:
+        simulation = Simulation(size, size, rows, memo=TrajectoryMemo(2**40))
+        with redirect_stdout(io.StringIO()):
+            simulation.run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def stepping_peak(cars: int, commands: int) -> tuple[float, int]:
+    # Runs in a fresh process: what each further car-command adds to the
+    # peak while stepping, from programs of commands and twice as many, and
+    # peak RSS in bytes. Long programs are stepped in windows of a fixed
+    # size, which the difference leaves out.
+    simulate(2, 1)
+    base = simulate(cars, commands)
+    peak = simulate(cars, 2 * commands)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return (peak - base) / (cars * commands), rss
+
+
+def measure_stepping(cars: int, commands: int) -> tuple[float, int]:
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, initializer=sys.path.insert, initargs=(0, str(SRC))) as pool:
+        return pool.apply(stepping_peak, (cars, commands))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure memory per car and per command, and peak memory "
+        "while stepping; exits with status 1 when a budget is exceeded."
+    )
+    parser.add_argument("--cars", type=int, nargs="+", default=DEFAULT_CARS)
+    parser.add_argument("--commands", type=int, nargs="+", default=DEFAULT_COMMANDS)
+    # Defaults are about 1.5x the footprint measured when they were set
+    # (~1.5 KB per car, ~1.1 B per command, ~1 B per further command while
+    # stepping, 2.4 B with 25 cars of 1000 commands).
+    parser.add_argument("--max-bytes-per-car", type=float, default=2304)
+    parser.add_argument("--max-bytes-per-command", type=float, default=1.6)
+    parser.add_argument(
+        "--max-step-bytes-per-command",
+        type=float,
+        default=3.6,
+        help="Budget for what each further car-command adds to the traced "
+        "peak while stepping",
+    )
+    parser.add_argument("--max-peak-rss-mb", type=float, default=256)
+    args = parser.parse_args()
+    sys.path.insert(0, str(SRC))
+
+    failures = []
+
+    def check(label: str, value: float, budget: float) -> str:
+        if value > budget:
+            failures.append(f"{label}: {value:,.1f} > {budget:,.1f}")
+            return "FAIL"
+        return "ok"
+
+    print(
+        f"{'cars':>6} {'commands':>9} {'B/car':>9} {'B/cmd':>7} "
+        f"{'step B/cmd':>11} {'peak RSS MB':>12}"
+    )
+    for cars in args.cars:
+        for commands in args.commands:
+            per_car, per_command = footprint(cars, commands)
+            per_step_command, rss = measure_stepping(cars, commands)
+            rss_mb = rss / 2**20
+            label = f"{cars} cars x {commands} commands"
+            verdicts = [
+                check(f"{label}, bytes per car", per_car, args.max_bytes_per_car),
+                check(
+                    f"{label}, bytes per command",
+                    per_command,
+                    args.max_bytes_per_command,
+                ),
+                check(
+                    f"{label}, stepping bytes per command",
+                    per_step_command,
+                    args.max_step_bytes_per_command,
+                ),
+                check(f"{label}, peak RSS MB", rss_mb, args.max_peak_rss_mb),
+            ]
+            print(
+                f"{cars:>6} {commands:>9} {per_car:>9,.0f} {per_command:>7.2f} "
+                f"{per_step_command:>11.2f} {rss_mb:>12.1f}"
+                + ("" if set(verdicts) == {"ok"} else "  <- over budget")
+            )
+
+    if failures:
+        print("\nOver budget:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nAll within budget.")
+
+
+if __name__ == "__main__":
+    main()
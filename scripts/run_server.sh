@@ -0,0 +1 @@
+PYTHONPATH=src python src/server.py "$@"
@@ -1 +1,11 @@
-from .simulation import Simulation
+# Resolved lazily, see domain/__init__.py.
+__all__ = ["Simulation"]
+
+
+def __getattr__(name):
+    if name != "Simulation":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from .simulation import Simulation
+
+    globals()[name] = Simulation
+    return Simulation
@@ -0,0 +1,108 @@
+import numpy as np
+
+from domain.command_store import CommandProgram, RunLengthProgram, encode_commands
+from domain.trajectory import Trajectory
+
+METRICS = ("visits", "dwell", "blocked")
+
+
+def memo_program(commands) -> bytes | RunLengthProgram:
+    # What TrajectoryMemo.trajectory takes; run-length programs stay compact.
+    if isinstance(commands, CommandProgram):
+        return commands.to_bytes()
+    if isinstance(commands, RunLengthProgram):
+        return commands
+    return encode_commands(commands)
+
+
+class TrafficStats:
+    # Aggregates of one run. Cell counts are arrays indexed [y, x]:
+    #   visits   times a car entered the cell, starting cells included
+    #   dwell    car-steps spent in the cell, parked cars included
+    #   blocked  moves rejected at the edge while a car was in the cell
+    # distance is the number of cells each car moved, in car_ids order.
+    def __init__(self, car_ids, steps, visits, dwell, blocked, distance):
+        self.car_ids = car_ids
+        self.steps = steps
+        self.visits = visits
+        self.dwell = dwell
+        self.blocked = blocked
+        self.distance = distance
+
+    @property
+    def car_steps(self) -> int:
+        return len(self.car_ids) * self.steps
+
+    def hotspots(self, metric: str = "blocked", count: int = 10) -> list[tuple]:
+        # Busiest cells as (x, y, value), highest first, ties in cell order.
+        if metric not in METRICS:
+            raise ValueError(f"Unknown traffic metric '{metric}'")
+        values = getattr(self, metric).ravel()
+        order = np.argsort(-values, kind="stable")[:count]
+        order = order[values[order] > 0]
+        size_x = getattr(self, metric).shape[1]
+        return [
+            (cell % size_x, cell // size_x, values[cell].item())
+            for cell in order.tolist()
+        ]
+
+    def car_distances(self) -> dict[str, int]:
+        return dict(zip(self.car_ids, self.distance.tolist()))
+
+
+def traffic_stats(
+    trajectories: list[Trajectory], car_ids: list, size_x: int, size_y: int, steps
+) -> TrafficStats:
+    # Replays nothing: every car's cells up to steps go into one array that
+    # is reduced with bincount. Cars whose programs ended earlier stay parked
+    # in their last cell until steps.
+    cell_count = size_x * size_y
+    lengths = np.array(
+        [min(len(trajectory), steps + 1) for trajectory in trajectories],
+        dtype=np.int64,
+    )
+    cells = np.concatenate(
+        [np.empty(0, dtype=np.int32)]
+        + [
+            np.frombuffer(trajectory.cell_array(length), dtype=np.int32)
+            for trajectory, length in zip(trajectories, lengths.tolist())
+        ]
+    )
+    starts = np.cumsum(lengths) - lengths
+    car = np.repeat(np.arange(len(trajectories)), lengths)
+
+    first = np.zeros(len(cells), dtype=bool)
+    first[starts] = True
+    entered = first.copy()
+    entered[1:] |= cells[1:] != cells[:-1]
+
+    # Step 0 is where a car starts, not a step spent there.
+    weights = np.ones(len(cells), dtype=np.int64)
+    weights[starts] = 0
+    weights[starts + lengths - 1] += steps - (lengths - 1)
+
+    # Blocked moves leave the car in place, so its cell at that step is
+    # where the hotspot is.
+    car_events = [list(trajectory.blocked_steps(steps)) for trajectory in trajectories]
+    events = np.array(
+        [event for blocked_steps in car_events for event in blocked_steps],
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    owners = np.repeat(
+        np.arange(len(trajectories)), [len(events) for events in car_events]
+    )
+    blocked = cells[starts[owners] + events[:, 0]]
+
+    def grid(counts) -> np.ndarray:
+        return counts.reshape(size_y, size_x)
+
+    return TrafficStats(
+        car_ids,
+        steps,
+        grid(np.bincount(cells[entered], minlength=cell_count)),
+        grid(
+            np.bincount(cells, weights=weights, minlength=cell_count).astype(np.int64)
+        ),
+        grid(np.bincount(blocked, minlength=cell_count)),
+        np.bincount(car[entered & ~first], minlength=len(trajectories)),
+    )
@@ -0,0 +1,267 @@
+import logging
+import time
+
+import numpy as np
+
+from domain import Grid
+from domain.command_store import NON_COMMAND_BYTES, TEXT_CODES, command_text
+from domain.metrics import Metrics, get_metrics
+from settings import settings
+
+from .run_control import MAX_STEPS, RunControl, stopped_result
+from .simulation import parse_direction
+
+# Clockwise order, so a right turn is +1 and a left turn is -1 (mod 4).
+DIRECTION_CODES = {"N": 0, "E": 1, "S": 2, "W": 3}
+DX = np.array([0, 1, 0, -1], dtype=np.int32)
+DY = np.array([1, 0, -1, 0], dtype=np.int32)
+# Indexed by command code: F, L, R, then the padding code for "no command".
+TURNS = np.array([0, -1, 1, 0], dtype=np.int32)
+FORWARD = 0
+NO_COMMAND = 3
+SEPARATOR = ord("\n")
+NON_PROGRAM_BYTES = NON_COMMAND_BYTES.replace(b"\n", b"")
+
+
+class BatchSimulation:
+    # Cars of every scenario are packed end to end rather than padded to the
+    # largest scenario, so one big scenario does not inflate the rest: per
+    # car a row, pose and program slice of one flat array of command codes.
+    def __init__(self, scenarios: list, metrics: Metrics | None = None):
+        self.logger = logging.getLogger(__name__)
+        self.metrics = metrics if metrics is not None else get_metrics()
+        self.scenarios = scenarios
+        self.results = [None] * len(scenarios)
+        self.car_ids = [[car[0] for car in cars] for _, _, cars in scenarios]
+
+        self._pack()
+        self.loaded = self._validate()
+
+    def _pack(self) -> None:
+        count = len(self.scenarios)
+        flat = [car for _, _, cars in self.scenarios for car in cars]
+        car_counts = np.array([len(ids) for ids in self.car_ids], dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(car_counts)))
+        self.row = np.repeat(np.arange(count), car_counts)
+
+        # Sizes the Grid would reject are zeroed before the int32 casts, and
+        # validation sends their scenarios to it for the exact error.
+        self.sized = np.array(
+            [
+                0 < size_x <= settings.max_grid_size_x
+                and 0 < size_y <= settings.max_grid_size_y
+                for size_x, size_y, _ in self.scenarios
+            ],
+            dtype=bool,
+        )
+        self.size_x = np.array(
+            [s[0] if ok else 0 for s, ok in zip(self.scenarios, self.sized)],
+            dtype=np.int32,
+        )
+        self.size_y = np.array(
+            [s[1] if ok else 0 for s, ok in zip(self.scenarios, self.sized)],
+            dtype=np.int32,
+        )
+
+        # Positions past any grid are as out of bounds one cell beyond it,
+        # where they fit the int32 columns and the cell keys.
+        xs, ys, directions = self._parse_poses(flat)
+        self.x = np.clip(xs, -1, settings.max_grid_size_x).astype(np.int32)
+        self.y = np.clip(ys, -1, settings.max_grid_size_y).astype(np.int32)
+        self.direction = np.array(directions, dtype=np.int32)
+        self.width = settings.max_grid_size_x + 2
+        self.row_cells = self.width * (settings.max_grid_size_y + 2)
+
+        # One translate over every program, then split on the separators.
+        blob = "\n".join(command_text(car[2]) for car in flat).encode()
+        codes = np.frombuffer(
+            blob.translate(TEXT_CODES, NON_PROGRAM_BYTES), dtype=np.uint8
+        )
+        breaks = np.flatnonzero(codes == SEPARATOR)
+        ends = np.append(breaks, len(codes)) if flat else breaks
+        self.lengths = ends - np.concatenate(([0], breaks + 1))[: len(ends)]
+        self.codes = codes[codes != SEPARATOR]
+        self.starts = np.cumsum(self.lengths) - self.lengths
+
+        self.max_step = np.zeros(count, dtype=np.int64)
+        np.maximum.at(self.max_step, self.row, self.lengths)
+
+    def _parse_poses(self, flat: list) -> tuple:
+        tokens = " ".join(car[1] for car in flat).split()
+        try:
+            if len(tokens) != 3 * len(flat):
+                raise ValueError("Position must have exactly 3 parts: x y direction")
+            return (
+                np.array(tokens[0::3]).astype(np.int64),
+                np.array(tokens[1::3]).astype(np.int64),
+                [DIRECTION_CODES[direction.upper()] for direction in tokens[2::3]],
+            )
+        except (ValueError, KeyError, OverflowError):
+            pass
+
+        # Slow path only when some pose is malformed: find the bad scenarios.
+        poses = []
+        for row, car in zip(self.row.tolist(), flat):
+            try:
+                x, y, direction = car[1].split()
+                poses.append((int(x), int(y), DIRECTION_CODES[direction.upper()]))
+            except (ValueError, KeyError):
+                self.results[row] = {"error": f"Invalid position/direction: '{car[1]}'"}
+                poses.append((0, 0, 0))
+        xs, ys, directions = tuple(zip(*poses)) if poses else ([], [], [])
+        return np.array(xs, dtype=object), np.array(ys, dtype=object), directions
+
+    def _collided_rows(self, row: np.ndarray, x: np.ndarray, y: np.ndarray):
+        # Rows where two of the given cars share a cell. Keys are unique per
+        # scenario and cell, with room for the clamped out-of-bounds cells.
+        keys = row * self.row_cells
+        keys += (y + 1).astype(np.int64) * self.width + x + 1
+        keys.sort()
+        shared = keys[1:][keys[1:] == keys[:-1]]
+        return np.unique(shared // self.row_cells) if shared.size else shared
+
+    def _validate(self) -> np.ndarray:
+        car_counts = np.diff(self.offsets)
+        size_x = self.size_x.astype(np.int64)
+        size_y = self.size_y.astype(np.int64)
+
+        ok = self.sized & (car_counts <= size_x * size_y)
+
+        out = (self.x < 0) | (self.x >= self.size_x[self.row])
+        out |= (self.y < 0) | (self.y >= self.size_y[self.row])
+        ok[self.row[out]] = False
+        ok[self._collided_rows(self.row, self.x, self.y)] = False
+
+        for row, car_ids in enumerate(self.car_ids):
+            if self.results[row] is not None:
+                ok[row] = False
+            elif not ok[row] or len(set(car_ids)) != len(car_ids):
+                ok[row] = self._validate_with_grid(row)
+
+        return ok
+
+    def _validate_with_grid(self, row: int) -> bool:
+        # Let Grid produce the exact error message for the rare bad scenario.
+        grid_size_x, grid_size_y, cars = self.scenarios[row]
+        parsed_cars = []
+        for car_id, init_state, commands in cars:
+            x, y, direction = init_state.split()
+            parsed_cars.append(
+                (car_id, int(x), int(y), parse_direction(direction), commands)
+            )
+
+        try:
+            Grid(size_x=grid_size_x, size_y=grid_size_y).validate_cars(parsed_cars)
+        except ValueError as e:
+            self.results[row] = {"error": str(e)}
+            return False
+        return True
+
+    def run(self, control: RunControl | None = None) -> list[dict]:
+        count = len(self.scenarios)
+        running = self.loaded.copy()
+
+        total = int(self.max_step.max(initial=0))
+        limit = total if control is None else control.step_limit(total)
+        completed = 0
+        stopped = None
+        # A vectorized step counts as a step of every running scenario, but
+        # its latency is observed once.
+        recorder = self.metrics.recorder()
+        blocked = active_cars = 0
+        # Steps work on copies of the running scenarios' cars, regathered
+        # whenever a scenario finishes so that finished ones cost nothing.
+        cars, running_rows = None, 0
+
+        for step in range(limit):
+            running &= step < self.max_step
+            rows = int(running.sum())
+            if not rows:
+                break
+            if control is not None:
+                stopped = control.stop_reason()
+                if stopped is not None:
+                    break
+
+            started = time.perf_counter()
+            if rows != running_rows:
+                if cars is not None:
+                    self._store(cars, x, y, direction)
+                cars, running_rows = np.flatnonzero(running[self.row]), rows
+                x, y, direction = self.x[cars], self.y[cars], self.direction[cars]
+                row, starts, lengths = (
+                    self.row[cars],
+                    self.starts[cars],
+                    self.lengths[cars],
+                )
+                size_x, size_y = self.size_x[row], self.size_y[row]
+
+            active = step < lengths
+            commands = np.full(len(cars), NO_COMMAND, dtype=np.uint8)
+            commands[active] = self.codes[starts[active] + step]
+
+            forward = commands == FORWARD
+            wants_forward = int(forward.sum())
+            new_x = x + DX[direction]
+            new_y = y + DY[direction]
+            forward &= (new_x >= 0) & (new_x < size_x)
+            forward &= (new_y >= 0) & (new_y < size_y)
+            moved = int(forward.sum())
+            blocked += wants_forward - moved
+            np.copyto(x, new_x, where=forward)
+            np.copyto(y, new_y, where=forward)
+            direction = (direction + TURNS[commands]) & 3
+
+            # Turns alone cannot create a collision the previous step lacked.
+            collided = self._collided_rows(row, x, y) if moved else ()
+            if len(collided):
+                self._store(cars, x, y, direction)
+            for collided_row in collided:
+                self._record_collision(collided_row, step + 1)
+                running[collided_row] = False
+
+            active_cars = int(active.sum())
+            recorder.step(active_cars, len(cars), time.perf_counter() - started, rows)
+            completed = step + 1
+            if control is not None:
+                control.report(completed, total)
+
+        if cars is not None:
+            self._store(cars, x, y, direction)
+        if stopped is None and limit < total:
+            stopped = MAX_STEPS
+        if stopped is not None:
+            # Rows still running with commands left get a partial result.
+            for row in np.flatnonzero(running & (self.max_step > completed)).tolist():
+                self.results[row] = stopped_result(stopped, completed)
+
+        recorder.flush(blocked, active_cars)
+
+        for row in range(count):
+            if self.results[row] is None:
+                self.results[row] = {"collision": False}
+
+        self.logger.info(f"Batch of {count} scenarios complete.")
+        return self.results
+
+    def _store(self, cars: np.ndarray, x, y, direction) -> None:
+        self.x[cars], self.y[cars], self.direction[cars] = x, y, direction
+
+    def final_positions(self, row: int) -> list[tuple[int, int]]:
+        cars = slice(self.offsets[row], self.offsets[row + 1])
+        return list(zip(self.x[cars].tolist(), self.y[cars].tolist()))
+
+    def _record_collision(self, row: int, step: int) -> None:
+        positions = {}
+        for car_id, pos in zip(self.car_ids[row], self.final_positions(row)):
+            positions.setdefault(pos, []).append(car_id)
+
+        for pos, ids in positions.items():
+            if len(ids) > 1:
+                self.results[row] = {
+                    "collision": True,
+                    "cars": ids,
+                    "position": pos,
+                    "step": step,
+                }
+                return
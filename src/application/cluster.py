@@ -0,0 +1,275 @@
+import asyncio
+import json
+import logging
+from collections import deque
+
+from constants import Command
+from domain.command_store import RunLengthProgram
+
+from .run_control import stopped_result
+from .service import from_response, to_request
+
+
+def parse_node(address: str) -> tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Worker node must be given as host:port, got '{address}'")
+    return host, int(port)
+
+
+def car_box(grid_size_x: int, grid_size_y: int, car) -> tuple:
+    # Every cell a car can reach: its start, widened by its forward moves.
+    _, pose, commands = car
+    x, y, _ = pose.split()
+    if isinstance(commands, RunLengthProgram):
+        reach = commands.count(Command.F)
+    else:
+        reach = commands.upper().count("F")
+    return (
+        max(int(x) - reach, 0),
+        max(int(y) - reach, 0),
+        min(int(x) + reach, grid_size_x - 1),
+        min(int(y) + reach, grid_size_y - 1),
+    )
+
+
+def overlaps(a: tuple, b: tuple) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def independent_groups(grid_size_x: int, grid_size_y: int, cars) -> list[list[int]]:
+    # Car indices in groups that can never share a cell, each in input
+    # order, groups ordered by their first car. Cars only meet inside the
+    # boxes they can reach, so groups are built by merging overlapping
+    # boxes, swept in order of their left edge.
+    boxes = [car_box(grid_size_x, grid_size_y, car) for car in cars]
+    active, done = [], []
+    for index in sorted(range(len(cars)), key=lambda index: boxes[index][0]):
+        box, members = boxes[index], [index]
+        done += [group for group in active if group[0][2] < box[0]]
+        active = [group for group in active if group[0][2] >= box[0]]
+        # Merging widens the box, which can make it reach further groups.
+        merged = True
+        while merged:
+            merged = False
+            for group in active:
+                if overlaps(group[0], box):
+                    box = (
+                        min(box[0], group[0][0]),
+                        min(box[1], group[0][1]),
+                        max(box[2], group[0][2]),
+                        max(box[3], group[0][3]),
+                    )
+                    members += group[1]
+                    active.remove(group)
+                    merged = True
+                    break
+        active.append((box, members))
+
+    groups = [sorted(members) for _, members in done + active]
+    return sorted(groups, key=lambda group: group[0])
+
+
+def merge_group_results(results: list[dict], car_ids: list) -> dict:
+    # The outcome of the whole scenario from those of its independent
+    # groups: the earliest collision, ties going to the cell whose first car
+    # comes first in the input, as Grid.check_collisions reports them. A
+    # group stopped early only hides collisions after its last step.
+    for result in results:
+        if "error" in result:
+            return result
+
+    order = {car_id: index for index, car_id in enumerate(car_ids)}
+    collisions = [
+        (result["step"], min(order[car_id] for car_id in result["cars"]), result)
+        for result in results
+        if result["collision"]
+    ]
+    stops = [result for result in results if "stopped" in result]
+    first = min(collisions, key=lambda entry: entry[:2], default=None)
+    stop = min(stops, key=lambda result: result["step"], default=None)
+    if stop is not None and (first is None or first[0] > stop["step"]):
+        return stopped_result(stop["stopped"], stop["step"])
+    if first is None:
+        return {"collision": False}
+    return first[2]
+
+
+class WorkUnit:
+    def __init__(self, index: int, first: int, scenarios: list):
+        self.index = index
+        self.first = first
+        self.scenarios = scenarios
+        self.attempts = 0
+
+
+class Coordinator:
+    # Spreads scenarios over simulation services (server.py) running on
+    # worker nodes, in units of unit_size scenarios. Units are dealt
+    # round-robin to one queue per node; a node whose queue runs dry steals
+    # from the back of the longest other queue. A node that fails or times
+    # out is dropped and its unit retried on another, at most retries times.
+    # Results come back in input order.
+    def __init__(
+        self,
+        nodes: list,
+        unit_size: int = 64,
+        retries: int = 2,
+        timeout: float = 60.0,
+    ):
+        if not nodes:
+            raise ValueError("At least one worker node is required")
+        if unit_size <= 0:
+            raise ValueError("Unit size must be positive")
+        self.logger = logging.getLogger(__name__)
+        self.nodes = [
+            parse_node(node) if isinstance(node, str) else tuple(node) for node in nodes
+        ]
+        self.unit_size = unit_size
+        self.retries = retries
+        self.timeout = timeout
+        self.failed_nodes = set()
+        self.stolen = 0
+
+    def run(self, scenarios: list) -> list[dict]:
+        return asyncio.run(self.run_async(scenarios))
+
+    def run_split(self, scenario: tuple) -> dict:
+        return asyncio.run(self.run_split_async(scenario))
+
+    async def run_split_async(self, scenario: tuple) -> dict:
+        # One scenario, run as its independent car groups.
+        grid_size_x, grid_size_y, cars = scenario
+        groups = independent_groups(grid_size_x, grid_size_y, cars)
+        results = await self.run_async(
+            [
+                (grid_size_x, grid_size_y, [cars[index] for index in group])
+                for group in groups
+            ]
+        )
+        return merge_group_results(results, [car[0] for car in cars])
+
+    async def run_async(self, scenarios: list) -> list[dict]:
+        self._results = [None] * len(scenarios)
+        self._queues = [deque() for _ in self.nodes]
+        self._retry = deque()
+        self._in_flight = 0
+        self._changed = asyncio.Condition()
+        for index, first in enumerate(range(0, len(scenarios), self.unit_size)):
+            unit = WorkUnit(index, first, scenarios[first : first + self.unit_size])
+            self._queues[index % len(self.nodes)].append(unit)
+
+        await asyncio.gather(*(self._work(node) for node in range(len(self.nodes))))
+
+        # Left over only when every node has failed.
+        for unit in [*self._retry, *(unit for queue in self._queues for unit in queue)]:
+            self._fail(unit, "no worker node left")
+        return self._results
+
+    def _take(self, node: int) -> WorkUnit | None:
+        if self._retry:
+            return self._retry.popleft()
+        if self._queues[node]:
+            return self._queues[node].popleft()
+        victim = max(self._queues, key=len)
+        if victim:
+            self.stolen += 1
+            return victim.pop()
+        return None
+
+    async def _next_unit(self, node: int) -> WorkUnit | None:
+        # Waits while units are in flight elsewhere, as they may come back.
+        async with self._changed:
+            while True:
+                unit = self._take(node)
+                if unit is not None or not self._in_flight:
+                    if unit is not None:
+                        self._in_flight += 1
+                    return unit
+                await self._changed.wait()
+
+    async def _done(self, unit: WorkUnit, error: str | None = None) -> None:
+        async with self._changed:
+            self._in_flight -= 1
+            if error is not None:
+                unit.attempts += 1
+                if unit.attempts > self.retries:
+                    self._fail(unit, error)
+                else:
+                    self._retry.append(unit)
+            self._changed.notify_all()
+
+    def _fail(self, unit: WorkUnit, error: str) -> None:
+        for offset in range(len(unit.scenarios)):
+            self._results[unit.first + offset] = {
+                "error": f"Work unit {unit.index} failed: {error}"
+            }
+
+    async def _work(self, node: int) -> None:
+        # A node that cannot be reached or breaks the protocol is dropped. A
+        # unit that outlasts the timeout only costs its connection, whose
+        # late answers would otherwise be read as the next unit's.
+        host, port = self.nodes[node]
+        writer = None
+        try:
+            while (unit := await self._next_unit(node)) is not None:
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.wait_for(
+                            asyncio.open_connection(host, port), self.timeout
+                        )
+                    responses = await asyncio.wait_for(
+                        self._send(reader, writer, unit), self.timeout
+                    )
+                except asyncio.TimeoutError:
+                    if writer is None:
+                        await self._drop(node, unit, "connection timed out")
+                        return
+                    writer.close()
+                    writer = None
+                    await self._done(
+                        unit, f"{host}:{port}: no answer within {self.timeout} s"
+                    )
+                    continue
+                except (OSError, ValueError) as e:
+                    await self._drop(node, unit, repr(e))
+                    return
+                for offset, response in enumerate(responses):
+                    self._results[unit.first + offset] = from_response(response)
+                await self._done(unit)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    async def _drop(self, node: int, unit: WorkUnit, reason: str) -> None:
+        host, port = self.nodes[node]
+        error = f"{host}:{port}: {reason}"
+        self.logger.warning(f"Dropping worker node {error}")
+        self.failed_nodes.add((host, port))
+        await self._done(unit, error)
+
+    async def _send(self, reader, writer, unit: WorkUnit) -> list[dict]:
+        # Every request of the unit at once; the service answers them in
+        # whatever order its batches finish.
+        for offset, scenario in enumerate(unit.scenarios):
+            request = {"id": offset, **to_request(scenario)}
+            writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+
+        responses = [None] * len(unit.scenarios)
+        for _ in unit.scenarios:
+            line = await reader.readline()
+            if not line:
+                raise ConnectionError("Worker node closed the connection")
+            response = json.loads(line)
+            if not isinstance(response, dict):
+                raise ValueError(f"Worker node sent {response!r} for a response")
+            index = response.get("id")
+            if type(index) is not int or not 0 <= index < len(responses):
+                raise ValueError(f"Worker node answered unknown request {index!r}")
+            if responses[index] is not None:
+                raise ValueError(f"Worker node answered request {index} twice")
+            if "collision" not in response and "error" not in response:
+                raise ValueError(f"Worker node sent no result for request {index}")
+            responses[index] = response
+        return responses
@@ -0,0 +1,94 @@
+import io
+import json
+import os
+
+# Leading bytes of each compressed format, and the suffixes that ask for it
+# on output. The codecs are imported only when a file needs them.
+COMPRESSION_MAGIC = {
+    "gzip": b"\x1f\x8b",
+    "bz2": b"BZh",
+    "xz": b"\xfd7zXZ\x00",
+}
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz"}
+
+
+def detect_compression(path) -> str | None:
+    with open(path, "rb") as file:
+        head = file.read(max(map(len, COMPRESSION_MAGIC.values())))
+    for compression, magic in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def compression_for(path) -> str | None:
+    return COMPRESSION_SUFFIXES.get(os.path.splitext(str(path))[1].lower())
+
+
+class CheckedReader(io.RawIOBase):
+    # A decompressing stream that raises ValueError, as for any malformed
+    # input, on the codec errors that are not OSError already: EOFError for
+    # a truncated file, zlib.error and lzma.LZMAError for corrupt data.
+    def __init__(self, stream, errors: tuple, description: str):
+        self.stream = stream
+        self.errors = (EOFError, *errors)
+        self.description = description
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        try:
+            return self.stream.readinto(buffer)
+        except self.errors as e:
+            raise ValueError(f"Corrupt {self.description}: {e or 'truncated'}")
+
+    def close(self) -> None:
+        self.stream.close()
+        super().close()
+
+
+def open_codec(path, mode: str, compression: str) -> tuple:
+    # The codec's file object, and the errors it raises on bad data.
+    if compression == "gzip":
+        import gzip
+        import zlib
+
+        return gzip.open(path, mode), (zlib.error,)
+    if compression == "bz2":
+        import bz2
+
+        return bz2.open(path, mode), ()
+    if compression == "xz":
+        import lzma
+
+        return lzma.open(path, mode), (lzma.LZMAError,)
+    raise ValueError(f"Unknown compression '{compression}'")
+
+
+def open_compressed(path, mode: str, compression: str | None):
+    if compression is None:
+        return open(path, mode)
+    if "w" in mode:
+        # The codecs open in binary unless told otherwise, unlike open.
+        return open_codec(path, mode if "b" in mode else mode + "t", compression)[0]
+    stream, errors = open_codec(path, "rb", compression)
+    reader = io.BufferedReader(
+        CheckedReader(stream, errors, f"{compression} file '{path}'")
+    )
+    return reader if "b" in mode else io.TextIOWrapper(reader)
+
+
+def open_input(path, mode: str = "r"):
+    # Decompresses while reading, by the file's magic bytes.
+    return open_compressed(path, mode, detect_compression(path))
+
+
+def open_output(path, mode: str = "w"):
+    # Compresses while writing, by the file's suffix.
+    return open_compressed(path, mode, compression_for(path))
+
+
+def write_ndjson(file, records) -> None:
+    for record in records:
+        file.write(json.dumps(record, separators=(",", ":")) + "\n")
@@ -0,0 +1,238 @@
+import io
+import os
+import random
+import tempfile
+from contextlib import redirect_stdout
+
+from domain import Grid
+from domain.command_store import RunLengthProgram
+from domain.kernel import kernel_outcome
+
+from .batch_simulation import BatchSimulation
+from .paged_simulation import PagedSimulation
+from .results import format_result
+from .run_control import RunControl
+from .scenario_file import ScenarioFile, write_scenario
+from .simulation import Simulation, parse_cars
+from .streaming import StreamingSimulation
+
+# Every engine maps a scenario (grid_size_x, grid_size_y, cars) to an
+# outcome (result, output, positions): the result dict with its "step", what
+# the CLI prints, and each car's final (x, y). Engines that do not print are
+# compared on format_result instead. An engine returns None for scenarios it
+# does not handle.
+ENGINES = {}
+
+
+def register_engine(name: str, engine) -> None:
+    if name in ENGINES or name == "reference":
+        raise ValueError(f"Engine '{name}' is already registered")
+    ENGINES[name] = engine
+
+
+def printed(result: dict) -> str:
+    return format_result(result) + "\n"
+
+
+def positions(grid) -> list[tuple[int, int]]:
+    return [(car.x, car.y) for car in grid.cars.values()]
+
+
+def reference_outcome(scenario) -> tuple:
+    # Grid.next_step until the first collision, as Simulation.run used to.
+    grid_size_x, grid_size_y, cars = scenario
+    max_step, parsed_cars = parse_cars(cars)
+    grid = Grid(size_x=grid_size_x, size_y=grid_size_y)
+    grid.add_cars(parsed_cars)
+
+    result = {"collision": False}
+    with redirect_stdout(io.StringIO()) as output:
+        for _ in range(max_step):
+            result = grid.next_step()
+            if result["collision"]:
+                result["step"] = grid.current_step
+                break
+        else:
+            print("no collision")
+    return result, output.getvalue(), positions(grid)
+
+
+def simulation_outcome(scenario, control=None) -> tuple:
+    with redirect_stdout(io.StringIO()) as output:
+        simulation = Simulation(*scenario)
+        result = simulation.run(control)
+    return result, output.getvalue(), positions(simulation.grid)
+
+
+def iter_steps_outcome(scenario) -> tuple:
+    result = {"collision": False}
+    with redirect_stdout(io.StringIO()):
+        simulation = Simulation(*scenario)
+        for view in simulation.iter_steps(sync=False):
+            if view.collision is not None:
+                result = {**view.collision, "step": view.step}
+    return result, printed(result), positions(simulation.grid)
+
+
+def rerun_outcome(scenario) -> tuple:
+    # Starts from the same cars with their programs cut in half, then
+    # re-runs the scenario itself.
+    grid_size_x, grid_size_y, cars = scenario
+    halved = [
+        [car_id, pose, commands[: len(commands) // 2]]
+        for car_id, pose, commands in cars
+    ]
+    with redirect_stdout(io.StringIO()):
+        simulation = Simulation(grid_size_x, grid_size_y, halved)
+        simulation.run()
+    with redirect_stdout(io.StringIO()) as output:
+        result = simulation.rerun(cars)
+    return result, output.getvalue(), positions(simulation.grid)
+
+
+def kernel_engine(scenario) -> tuple | None:
+    outcome = kernel_outcome(*scenario)
+    if outcome is None:
+        return None
+    result, kernel_positions = outcome
+    return result, printed(result), kernel_positions
+
+
+def batch_outcome(scenario) -> tuple:
+    batch = BatchSimulation([scenario])
+    (result,) = batch.run()
+    return result, printed(result), batch.final_positions(0)
+
+
+def streaming_outcome(scenario) -> tuple:
+    with redirect_stdout(io.StringIO()) as output:
+        simulation = StreamingSimulation(*scenario)
+        result = simulation.close()
+    return result, output.getvalue(), positions(simulation.grid)
+
+
+def paged_outcome(scenario) -> tuple:
+    # Small blocks and a one-block cache, so that every step pages.
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "scenario.scn")
+        write_scenario(path, *scenario)
+        with redirect_stdout(io.StringIO()) as output:
+            simulation = PagedSimulation(
+                ScenarioFile(path), directory, block_cars=16, cache_bytes=1
+            )
+            try:
+                result = simulation.run()
+                paged_positions = simulation.final_positions()
+            finally:
+                simulation.close()
+    return result, output.getvalue(), paged_positions
+
+
+def scenario_file_outcome(scenario) -> tuple:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "scenario.scn")
+        write_scenario(path, *scenario)
+        with redirect_stdout(io.StringIO()) as output:
+            simulation = Simulation.from_scenario(ScenarioFile(path))
+            result = simulation.run()
+    return result, output.getvalue(), positions(simulation.grid)
+
+
+def run_length(scenario) -> tuple:
+    grid_size_x, grid_size_y, cars = scenario
+    return (
+        grid_size_x,
+        grid_size_y,
+        [
+            [car_id, pose, RunLengthProgram.compress(commands)]
+            for car_id, pose, commands in cars
+        ],
+    )
+
+
+register_engine("trajectory", simulation_outcome)
+register_engine(
+    "controlled", lambda scenario: simulation_outcome(scenario, RunControl())
+)
+register_engine("iter_steps", iter_steps_outcome)
+register_engine("rerun", rerun_outcome)
+register_engine("kernel", kernel_engine)
+register_engine("batch", batch_outcome)
+register_engine("streaming", streaming_outcome)
+register_engine("paged", paged_outcome)
+register_engine("scenario_file", scenario_file_outcome)
+register_engine("run_length", lambda scenario: simulation_outcome(run_length(scenario)))
+register_engine(
+    "run_length_steps", lambda scenario: reference_outcome(run_length(scenario))
+)
+
+
+def check(scenario, engines=None) -> list[dict]:
+    # Mismatches of each engine against the reference on one scenario.
+    expected = reference_outcome(scenario)
+    mismatches = []
+    for name in engines or ENGINES:
+        try:
+            actual = ENGINES[name](scenario)
+        except Exception as e:
+            actual = ("raised", repr(e))
+        if actual is not None and tuple(actual) != expected:
+            mismatches.append(
+                {
+                    "engine": name,
+                    "scenario": scenario,
+                    "expected": expected,
+                    "actual": actual,
+                }
+            )
+    return mismatches
+
+
+def candidates(scenario):
+    # Smaller variants of a scenario, roughly biggest reductions first.
+    size_x, size_y, cars = scenario
+    if len(cars) > 1:
+        for index in range(len(cars)):
+            yield size_x, size_y, cars[:index] + cars[index + 1 :]
+    for index, (car_id, pose, commands) in enumerate(cars):
+        shorter = [commands[: len(commands) // 2], commands[:-1]]
+        shorter += [commands[:at] + commands[at + 1 :] for at in range(len(commands))]
+        for program in shorter:
+            if len(program) < len(commands):
+                car = [car_id, pose, program]
+                yield size_x, size_y, cars[:index] + [car] + cars[index + 1 :]
+    xs = [int(pose.split()[0]) for _, pose, _ in cars]
+    ys = [int(pose.split()[1]) for _, pose, _ in cars]
+    if size_x > max(xs) + 1:
+        yield max(xs) + 1, size_y, cars
+    if size_y > max(ys) + 1:
+        yield size_x, max(ys) + 1, cars
+
+
+def shrink(scenario, engine: str) -> tuple:
+    # Greedily takes the first smaller variant that still fails, until none
+    # does.
+    shrunk = True
+    while shrunk:
+        shrunk = False
+        for candidate in candidates(scenario):
+            if check(candidate, [engine]):
+                scenario, shrunk = candidate, True
+                break
+    return scenario
+
+
+def fuzz(seed: int, count: int, generators, engines=None) -> list[dict]:
+    # Runs count scenarios from each generator, a function of a Random, and
+    # returns one shrunk mismatch per failing engine.
+    rng = random.Random(seed)
+    failing = {}
+    for generate in generators:
+        for _ in range(count):
+            for mismatch in check(generate(rng), engines):
+                failing.setdefault(mismatch["engine"], mismatch)
+
+    return [
+        check(shrink(mismatch["scenario"], engine), [engine])[0]
+        for engine, mismatch in failing.items()
+    ]
@@ -0,0 +1,97 @@
+from domain.command_store import is_run_length, parse_run_length
+
+
+def parse_grid_size(line: str) -> tuple[int, int]:
+    try:
+        grid_parts = line.split()
+        if len(grid_parts) != 2:
+            raise ValueError("Grid size must have exactly 2 numbers")
+        grid_size_x, grid_size_y = map(int, grid_parts)
+        if grid_size_x <= 0 or grid_size_y <= 0:
+            raise ValueError("Grid dimensions must be positive")
+    except (ValueError, IndexError) as e:
+        raise ValueError(
+            f"Invalid grid size format: '{line}'. Expected: two positive integers (e.g., '10 10')"
+        )
+    return grid_size_x, grid_size_y
+
+
+def parse_input(input_text):
+    lines = [line.strip() for line in input_text.split("\n")]
+
+    while lines and not lines[0]:
+        lines.pop(0)
+    while lines and not lines[-1]:
+        lines.pop()
+
+    if not lines:
+        raise ValueError("Empty input!")
+
+    grid_size_x, grid_size_y = parse_grid_size(lines[0])
+
+    cars = []
+    i = 1
+    car_number = 1
+
+    while i < len(lines):
+        while i < len(lines) and not lines[i]:
+            i += 1
+
+        if i >= len(lines):
+            break
+
+        car_id = lines[i]
+        if not car_id:
+            raise ValueError(f"Car {car_number} has empty ID")
+        i += 1
+
+        if i >= len(lines):
+            raise ValueError(
+                f"Car {car_number} ('{car_id}') missing position and direction"
+            )
+
+        try:
+            pos_parts = lines[i].split()
+            if len(pos_parts) != 3:
+                raise ValueError("Position must have exactly 3 parts: x y direction")
+            x, y, direction = int(pos_parts[0]), int(pos_parts[1]), pos_parts[2].upper()
+            if x < 0 or y < 0:
+                raise ValueError("Coordinates must be non-negative")
+            if direction not in ["N", "S", "E", "W"]:
+                raise ValueError("Direction must be N, S, E, or W")
+        except (ValueError, IndexError) as e:
+            raise ValueError(
+                f"Car {car_number} ('{car_id}') has invalid position/direction: '{lines[i]}'. Expected format: 'x y direction' (e.g., '1 2 N')"
+            )
+
+        position_direction = lines[i]
+        i += 1
+
+        commands = ""
+        if i < len(lines) and lines[i]:
+            is_next_car = (
+                i + 1 < len(lines) and lines[i + 1] and len(lines[i + 1].split()) == 3
+            )
+
+            if not is_next_car:
+                commands = lines[i]
+                if is_run_length(commands):
+                    try:
+                        commands = parse_run_length(commands)
+                    except ValueError as e:
+                        raise ValueError(f"Car {car_number} ('{car_id}'): {e}")
+                else:
+                    for cmd in commands:
+                        if cmd not in "FLR":
+                            raise ValueError(
+                                f"Car {car_number} ('{car_id}') has invalid command '{cmd}' in '{commands}'. Commands must contain only F (Forward), L (Left), R (Right)"
+                            )
+                i += 1
+
+        cars.append([car_id, position_direction, commands])
+        car_number += 1
+
+    if not cars:
+        raise ValueError("No cars found in input!")
+
+    return grid_size_x, grid_size_y, cars
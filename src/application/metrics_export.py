@@ -0,0 +1,39 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from domain.metrics import Metrics
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def write_prometheus(metrics: Metrics, path) -> None:
+    # Written atomically, for the node_exporter textfile collector.
+    temp_path = f"{path}.tmp{os.getpid()}"
+    with open(temp_path, "w") as file:
+        file.write(metrics.to_prometheus())
+    os.replace(temp_path, path)
+
+
+def serve_metrics(
+    metrics: Metrics, host: str = "127.0.0.1", port: int = 9108
+) -> ThreadingHTTPServer:
+    # Serves GET /metrics from a daemon thread; call shutdown() to stop.
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,236 @@
+import logging
+import time
+
+import numpy as np
+
+from domain.metrics import Metrics, get_metrics
+from settings import settings
+
+from .batch_simulation import DX, DY, FORWARD, TURNS
+from .paged_store import DEFAULT_BLOCK_CARS, PARKED, PagedCarStore
+from .results import format_result
+from .run_control import MAX_STEPS, RunControl, stopped_result
+
+# Binary scenarios with at least this many cars run out of core by default.
+PAGED_MIN_CARS = 1_000_000
+
+
+class PagedSimulation:
+    # Runs a ScenarioFile with the outcome of Simulation.run, holding only a
+    # bounded cache of car blocks in memory plus one occupancy counter per
+    # grid cell. Each step sweeps the blocks in order, so the scratch file is
+    # read and written sequentially.
+    def __init__(
+        self,
+        scenario,
+        directory=None,
+        block_cars: int = DEFAULT_BLOCK_CARS,
+        cache_bytes: int | None = None,
+        metrics: Metrics | None = None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.metrics = metrics if metrics is not None else get_metrics()
+        self.scenario = scenario
+        self.size_x, self.size_y = scenario.size_x, scenario.size_y
+        self._validate_grid()
+        if cache_bytes is None:
+            cache_bytes = settings.paged_cache_mb * 1024 * 1024
+
+        self.max_step = 0
+        self.current_step = 0
+        # Counts stay small: a step can bring at most four cars into a cell
+        # that already holds one, and the run stops at the first collision.
+        self.occupancy = np.zeros(self.size_x * self.size_y, dtype=np.uint8)
+        self.store = PagedCarStore(
+            scenario.program_codes, directory, block_cars, cache_bytes
+        )
+        try:
+            self._load(block_cars)
+        except BaseException:
+            self.store.close()
+            raise
+
+    def _validate_grid(self) -> None:
+        for name, size, limit in (
+            ("size_x", self.size_x, settings.max_grid_size_x),
+            ("size_y", self.size_y, settings.max_grid_size_y),
+        ):
+            if size <= 0:
+                raise ValueError(f"Grid {name} must be a positive integer")
+            if size > limit:
+                raise ValueError(f"Grid {name} cannot exceed {limit}")
+        if len(self.scenario) > self.size_x * self.size_y:
+            raise ValueError("Cannot add more cars than the grid can hold")
+
+    def _load(self, block_cars: int) -> None:
+        xs = np.frombuffer(self.scenario.xs, dtype=np.int32)
+        ys = np.frombuffer(self.scenario.ys, dtype=np.int32)
+        directions = np.frombuffer(self.scenario.directions, dtype=np.uint8)
+        offsets = np.frombuffer(self.scenario.program_offsets, dtype=np.int64)
+
+        for first in range(0, len(self.scenario), block_cars):
+            last = min(first + block_cars, len(self.scenario))
+            x, y = xs[first:last], ys[first:last]
+            outside = (x < 0) | (x >= self.size_x) | (y < 0) | (y >= self.size_y)
+            if outside.any():
+                i = int(np.flatnonzero(outside)[0])
+                raise ValueError(
+                    f"Car position ({x[i]}, {y[i]}) is out of bounds on grid size "
+                    f"{self.size_x}x{self.size_y}"
+                )
+
+            cells = y.astype(np.int64) * self.size_x + x
+            before = self.occupancy[cells]
+            np.add.at(self.occupancy, cells, 1)
+            if (self.occupancy[cells] > 1).any():
+                self._raise_occupied(cells, before, xs, ys)
+
+            starts, ends = offsets[first:last], offsets[first + 1 : last + 1]
+            self.max_step = max(self.max_step, int((ends - starts).max()))
+            self.store.append(
+                np.arange(first, last), x, y, directions[first:last], starts, ends
+            )
+
+    def _raise_occupied(self, cells, before, xs, ys) -> None:
+        seen = set()
+        for i, cell in enumerate(cells.tolist()):
+            if before[i] or cell in seen:
+                y, x = divmod(cell, self.size_x)
+                occupant = int(np.flatnonzero((xs == x) & (ys == y))[0])
+                raise ValueError(
+                    f"Position ({x}, {y}) is already occupied by car "
+                    f"{self.scenario.car_id(occupant)}"
+                )
+            seen.add(cell)
+
+    def run(self, control: RunControl | None = None) -> dict:
+        self.logger.info("Starting simulation out of core...")
+        limit = self.max_step if control is None else control.step_limit(self.max_step)
+        warn = self.logger.isEnabledFor(logging.WARNING)
+        recorder = self.metrics.recorder()
+        collision_result = {"collision": False}
+        stopped = None
+        blocked = active = 0
+
+        for step in range(limit):
+            if not self.store.active_cars:
+                break
+            if control is not None:
+                stopped = control.stop_reason()
+                if stopped is not None:
+                    break
+
+            started = time.perf_counter()
+            active = moves = 0
+            arrived = []
+            for block, used in enumerate(self.store.used):
+                if not used:
+                    continue
+                records = self.store.block(block)
+                codes = self.store.commands(block, records, step)
+                block_moves, block_blocked, hits = self._step_block(
+                    records, codes, warn
+                )
+                active += used
+                moves += block_moves
+                blocked += block_blocked
+                if len(hits):
+                    arrived.append(hits)
+
+                finished = records["end"] - records["start"] <= step + 1
+                if finished.any():
+                    self.store.park(block, ~finished)
+
+            self.current_step = step + 1
+            recorder.step(active, moves, time.perf_counter() - started)
+            # Cells that briefly held two cars while the blocks were swept
+            # only count if they still do now that every car has moved.
+            if arrived:
+                cells = np.unique(np.concatenate(arrived))
+                cells = cells[self.occupancy[cells] > 1]
+                if len(cells):
+                    collision_result = self._collision(cells)
+                    break
+            if control is not None:
+                control.report(self.current_step, self.max_step)
+
+        recorder.flush(blocked, active)
+        if (
+            stopped is None
+            and limit < self.max_step
+            and not collision_result["collision"]
+        ):
+            stopped = MAX_STEPS
+        if collision_result["collision"]:
+            print(format_result(collision_result))
+        elif stopped is not None:
+            self.logger.info(f"Simulation stopped ({stopped}).")
+            return stopped_result(stopped, self.current_step)
+        else:
+            self.current_step = self.max_step
+            print("no collision")
+
+        self.logger.info("Simulation complete.")
+        return collision_result
+
+    def _step_block(self, records, codes, warn: bool) -> tuple:
+        # Moves one block's cars a step; returns the number of moves, of
+        # moves blocked at the edge, and the cells now holding two cars.
+        x, y, direction = records["x"], records["y"], records["direction"]
+        forward = codes == FORWARD
+        new_x = x + DX[direction]
+        new_y = y + DY[direction]
+        inside = (new_x >= 0) & (new_x < self.size_x)
+        inside &= (new_y >= 0) & (new_y < self.size_y)
+        moving = forward & inside
+        blocked = forward & ~inside
+        if warn and blocked.any():
+            for i in np.flatnonzero(blocked).tolist():
+                car_id = self.scenario.car_id(int(records["index"][i]))
+                self.logger.warning(
+                    f"Car {car_id} cannot move to ({new_x[i]}, {new_y[i]}) "
+                    "- out of bounds"
+                )
+
+        hits = ()
+        if moving.any():
+            old = y[moving].astype(np.int64) * self.size_x + x[moving]
+            new = new_y[moving].astype(np.int64) * self.size_x + new_x[moving]
+            np.subtract.at(self.occupancy, old, 1)
+            np.add.at(self.occupancy, new, 1)
+            hits = new[self.occupancy[new] > 1]
+            x[moving] = new_x[moving]
+            y[moving] = new_y[moving]
+        direction[:] = (direction + TURNS[codes]) & 3
+        return int(moving.sum()), int(blocked.sum()), hits
+
+    def _collision(self, cells: np.ndarray) -> dict:
+        # Reported like Grid.check_collisions: the collided cell first reached
+        # in input order, with its cars in input order.
+        indices, found = [], []
+        for chunk in self.store.iter_cars():
+            chunk_cells = chunk["y"].astype(np.int64) * self.size_x + chunk["x"]
+            here = np.isin(chunk_cells, cells)
+            indices.append(chunk["index"][here])
+            found.append(chunk_cells[here])
+        indices, found = np.concatenate(indices), np.concatenate(found)
+
+        cell = int(found[np.argmin(indices)])
+        y, x = divmod(cell, self.size_x)
+        return {
+            "collision": True,
+            "cars": [
+                self.scenario.car_id(int(i)) for i in np.sort(indices[found == cell])
+            ],
+            "position": (x, y),
+            "step": self.current_step,
+        }
+
+    def final_positions(self) -> list[tuple[int, int]]:
+        chunks = list(self.store.iter_cars())
+        cars = np.concatenate(chunks) if chunks else np.empty(0, PARKED)
+        cars = cars[np.argsort(cars["index"])]
+        return list(zip(cars["x"].tolist(), cars["y"].tolist()))
+
+    def close(self) -> None:
+        self.store.close()
@@ -0,0 +1,170 @@
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from .batch_simulation import NO_COMMAND
+
+DEFAULT_BLOCK_CARS = 1 << 16
+# Commands copied next to each car's state, refilled every this many steps,
+# so programs are read from their file once per window instead of per step.
+PROGRAM_WINDOW = 64
+PARKED = np.dtype([("index", "<i8"), ("x", "<i4"), ("y", "<i4"), ("direction", "u1")])
+
+
+def record_dtype(window: int) -> np.dtype:
+    # start and end are offsets into the program codes; index is the car's
+    # position in the input and orders everything that is reported.
+    return np.dtype(
+        [
+            ("index", "<i8"),
+            ("x", "<i4"),
+            ("y", "<i4"),
+            ("direction", "u1"),
+            ("start", "<i8"),
+            ("end", "<i8"),
+            ("window", "u1", (window,)),
+        ]
+    )
+
+
+def parked_cars(records: np.ndarray) -> np.ndarray:
+    parked = np.empty(len(records), dtype=PARKED)
+    for name in PARKED.names:
+        parked[name] = records[name]
+    return parked
+
+
+class PagedCarStore:
+    # Car state in fixed-size blocks of a scratch file, with the most
+    # recently used blocks cached in memory and written back when evicted.
+    # Cars whose programs have ended are parked: moved out of their block
+    # into an append-only file, so the blocks only hold cars that still move.
+    def __init__(
+        self,
+        program_codes,
+        directory=None,
+        block_cars: int = DEFAULT_BLOCK_CARS,
+        cache_bytes: int = 256 * 1024 * 1024,
+        window: int = PROGRAM_WINDOW,
+    ):
+        if block_cars <= 0 or window <= 0:
+            raise ValueError("Block size and program window must be positive")
+        self.codes = np.frombuffer(program_codes, dtype=np.uint8)
+        self.block_cars = block_cars
+        self.window = window
+        self.dtype = record_dtype(window)
+        self.block_bytes = self.dtype.itemsize * block_cars
+        self.cache_blocks = max(1, cache_bytes // self.block_bytes)
+        self.used = []
+        self.window_starts = []
+        self.parked = 0
+        self.reads = self.writes = 0
+
+        self._file = tempfile.TemporaryFile(dir=directory)
+        self._parked_file = tempfile.TemporaryFile(dir=directory)
+        self._cache = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.used)
+
+    @property
+    def active_cars(self) -> int:
+        return sum(self.used)
+
+    def append(self, index, xs, ys, directions, starts, ends) -> None:
+        # Columns of at most block_cars cars, in input order, as one new block.
+        # Cars without commands are parked straight away.
+        count = len(index)
+        if count > self.block_cars:
+            raise ValueError(f"A block holds at most {self.block_cars} cars")
+        records = np.zeros(self.block_cars, dtype=self.dtype)
+        records["index"][:count] = index
+        records["x"][:count] = xs
+        records["y"][:count] = ys
+        records["direction"][:count] = directions
+        records["start"][:count] = starts
+        records["end"][:count] = ends
+
+        self.used.append(count)
+        self.window_starts.append(-self.window)
+        block = len(self.used) - 1
+        self._cache[block] = [records, True]
+        self._evict()
+        self.park(block, records[:count]["end"] > records[:count]["start"])
+
+    def block(self, block: int, dirty: bool = True) -> np.ndarray:
+        # The block's cars that are still moving. Unless dirty is false,
+        # changes to the returned records are written back on eviction.
+        entry = self._cache.get(block)
+        if entry is None:
+            records = np.empty(self.block_cars, dtype=self.dtype)
+            self._file.seek(block * self.block_bytes)
+            self._file.readinto(records.view(np.uint8))
+            self.reads += 1
+            entry = self._cache[block] = [records, False]
+            self._evict()
+        else:
+            self._cache.move_to_end(block)
+        entry[1] = entry[1] or dirty
+        return entry[0][: self.used[block]]
+
+    def commands(self, block: int, records: np.ndarray, step: int) -> np.ndarray:
+        # Command codes of the block's cars at a 0-based step, NO_COMMAND
+        # where a program has ended.
+        start = self.window_starts[block]
+        if not start <= step < start + self.window:
+            start = step - step % self.window
+            self._fill_window(records, start)
+            self.window_starts[block] = start
+        return records["window"][:, step - start]
+
+    def _fill_window(self, records: np.ndarray, start: int) -> None:
+        offsets = records["start"][:, None] + (start + np.arange(self.window))
+        inside = offsets < records["end"][:, None]
+        window = np.full(offsets.shape, NO_COMMAND, dtype=np.uint8)
+        window[inside] = self.codes[offsets[inside]]
+        records["window"] = window
+
+    def park(self, block: int, keep: np.ndarray) -> None:
+        # Streams the cars not kept out to the parked file and compacts the
+        # block, keeping input order.
+        if keep.all():
+            return
+        records = self.block(block)
+        parked = parked_cars(records[~keep])
+        self._parked_file.seek(0, 2)
+        self._parked_file.write(parked.tobytes())
+        self.parked += len(parked)
+
+        kept = records[keep]
+        records[: len(kept)] = kept
+        self.used[block] = len(kept)
+
+    def iter_parked(self):
+        # Parked cars in chunks of at most block_cars, in the order parked.
+        self._parked_file.seek(0)
+        size = PARKED.itemsize * self.block_cars
+        while chunk := self._parked_file.read(size):
+            yield np.frombuffer(chunk, dtype=PARKED)
+
+    def iter_cars(self):
+        # Every car's index, x, y and direction, in chunks of at most
+        # block_cars; not in input order.
+        for block, used in enumerate(self.used):
+            if used:
+                yield parked_cars(self.block(block, dirty=False))
+        yield from self.iter_parked()
+
+    def _evict(self) -> None:
+        while len(self._cache) > self.cache_blocks:
+            block, (records, dirty) = self._cache.popitem(last=False)
+            if dirty:
+                self._file.seek(block * self.block_bytes)
+                self._file.write(records.view(np.uint8))
+                self.writes += 1
+
+    def close(self) -> None:
+        self._cache.clear()
+        self._file.close()
+        self._parked_file.close()
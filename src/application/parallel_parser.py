@@ -0,0 +1,287 @@
+import mmap
+import os
+from array import array
+
+from domain.command_store import (
+    CODE_TEXT,
+    NON_COMMAND_BYTES,
+    TEXT_CODES,
+    encode_commands,
+    is_run_length,
+    parse_run_length,
+)
+
+from .compressed_io import detect_compression, open_input
+from .input_parser import parse_grid_size, parse_input
+from .scenario_file import DIRECTION_LETTERS, write_columns
+
+# main.py parses text inputs at least this large in parallel.
+PARALLEL_MIN_BYTES = 64 * 1024 * 1024
+CHUNK_BYTES = 4 * 1024 * 1024
+
+
+class ParsedScenario:
+    # A text scenario as the columns of a binary scenario file, in input
+    # order: ids as one UTF-8 blob with offsets, positions, direction
+    # indices, and programs as one blob of command codes with offsets.
+    def __init__(
+        self, size_x: int, size_y: int, ids: tuple, poses: tuple, programs: tuple
+    ):
+        self.size_x, self.size_y = size_x, size_y
+        self.id_blob, self.id_offsets = ids
+        self.xs, self.ys, self.directions = poses
+        self.program_codes, self.program_offsets = programs
+
+    def __len__(self) -> int:
+        return len(self.xs)
+
+    def car_id(self, index: int) -> str:
+        return self.id_blob[
+            self.id_offsets[index] : self.id_offsets[index + 1]
+        ].decode()
+
+    def cars(self) -> list:
+        # As parse_input returns them, with run-length programs expanded.
+        text = self.program_codes.translate(CODE_TEXT).decode()
+        offsets = self.program_offsets
+        return [
+            [
+                self.car_id(i),
+                f"{self.xs[i]} {self.ys[i]} {DIRECTION_LETTERS[self.directions[i]]}",
+                text[offsets[i] : offsets[i + 1]],
+            ]
+            for i in range(len(self))
+        ]
+
+    def validate(self) -> None:
+        # Grid.validate_cars on the columns. The common case of unique ids
+        # and cells is settled with two sets; otherwise the cars are walked
+        # in order for the error Grid would raise first.
+        size_x, size_y, count = self.size_x, self.size_y, len(self)
+        cells = [
+            y * size_x + x if x < size_x and y < size_y else -1
+            for x, y in zip(self.xs, self.ys)
+        ]
+        offsets = self.id_offsets
+        ids = [self.id_blob[offsets[i] : offsets[i + 1]] for i in range(count)]
+        if (
+            count <= size_x * size_y
+            and -1 not in cells
+            and len(set(cells)) == count
+            and len(set(ids)) == count
+        ):
+            return
+
+        occupants, seen = {}, set()
+        for i, (cell, car_id) in enumerate(zip(cells, ids)):
+            x, y = self.xs[i], self.ys[i]
+            if i >= size_x * size_y:
+                raise ValueError("Cannot add more cars than the grid can hold")
+            if cell in occupants:
+                raise ValueError(
+                    f"Position ({x}, {y}) is already occupied by car {occupants[cell]}"
+                )
+            if car_id in seen:
+                raise ValueError(f"Car with id '{car_id.decode()}' already exists")
+            if cell < 0:
+                raise ValueError(
+                    f"Car position ({x}, {y}) is out of bounds on grid size {size_x}x{size_y}"
+                )
+            occupants[cell] = car_id.decode()
+            seen.add(car_id)
+
+    def write(self, path) -> None:
+        def write_programs(file) -> array:
+            file.write(self.program_codes)
+            return self.program_offsets
+
+        write_columns(
+            path,
+            self.size_x,
+            self.size_y,
+            (self.id_blob, self.id_offsets),
+            (self.xs, self.ys, self.directions),
+            write_programs,
+        )
+
+
+def is_pose(line: str) -> bool:
+    return len(line.split()) == 3
+
+
+def record_start(data, position: int, end: int) -> int:
+    # Offset of the first car record in data[position:end] that starts on a
+    # line of its own. A non-empty line that is not pose-shaped and is
+    # followed by a pose-shaped line can only be a car id to parse_input: a
+    # pose has three parts, and a commands line is never followed by a pose.
+    if position > 0 and data[position - 1] != ord("\n"):
+        newline = data.find(b"\n", position, end)
+        position = end if newline < 0 else newline + 1
+    line_end = data.find(b"\n", position, end)
+    while 0 <= line_end:
+        next_end = data.find(b"\n", line_end + 1, end)
+        line = data[position:line_end].decode(errors="replace").strip()
+        following = data[line_end + 1 : end if next_end < 0 else next_end]
+        if line and not is_pose(line) and is_pose(following.decode(errors="replace")):
+            return position
+        position, line_end = line_end + 1, next_end
+    return end
+
+
+def chunk_bounds(data, start: int, end: int, chunks: int) -> list[tuple[int, int]]:
+    starts = [start]
+    for chunk in range(1, chunks):
+        boundary = record_start(data, start + (end - start) * chunk // chunks, end)
+        if starts[-1] < boundary < end:
+            starts.append(boundary)
+    return list(zip(starts, starts[1:] + [end]))
+
+
+def parse_chunk(path, start: int, end: int) -> tuple:
+    # The car records in bytes start:end of the file, read as parse_input
+    # reads them, packed as ParsedScenario columns.
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            lines = [line.strip() for line in data[start:end].decode().split("\n")]
+
+    id_blob, id_offsets = bytearray(), array("q", [0])
+    xs, ys, directions = array("i"), array("i"), bytearray()
+    codes, program_offsets = bytearray(), array("q", [0])
+    i, count = 0, len(lines)
+    while i < count:
+        if not lines[i]:
+            i += 1
+            continue
+        car_id = lines[i]
+        if i + 1 >= count:
+            raise ValueError(f"Car '{car_id}' missing position and direction")
+        x, y, direction = lines[i + 1].split()
+        x, y, direction = int(x), int(y), DIRECTION_LETTERS.index(direction.upper())
+        if x < 0 or y < 0:
+            raise ValueError(f"Car '{car_id}' has invalid position/direction")
+        i += 2
+
+        if i < count and lines[i]:
+            is_next_car = i + 1 < count and lines[i + 1] and is_pose(lines[i + 1])
+            if not is_next_car:
+                if is_run_length(lines[i]):
+                    codes += parse_run_length(lines[i]).to_bytes()
+                else:
+                    commands = lines[i].encode()
+                    if commands.translate(None, b"FLR"):
+                        raise ValueError(f"Car '{car_id}' has invalid commands")
+                    codes += commands.translate(TEXT_CODES, NON_COMMAND_BYTES)
+                i += 1
+
+        id_blob += car_id.encode()
+        id_offsets.append(len(id_blob))
+        xs.append(x)
+        ys.append(y)
+        directions.append(direction)
+        program_offsets.append(len(codes))
+    return bytes(id_blob), id_offsets, xs, ys, bytes(directions), codes, program_offsets
+
+
+def merge_chunks(grid_size_x: int, grid_size_y: int, chunks: list) -> ParsedScenario:
+    id_blob, id_offsets = bytearray(), array("q", [0])
+    xs, ys, directions = array("i"), array("i"), bytearray()
+    codes, program_offsets = bytearray(), array("q", [0])
+    for chunk in chunks:
+        chunk_ids, chunk_id_offsets, chunk_xs, chunk_ys = chunk[:4]
+        chunk_directions, chunk_codes, chunk_program_offsets = chunk[4:]
+        id_base, code_base = len(id_blob), len(codes)
+        id_offsets.extend(offset + id_base for offset in chunk_id_offsets[1:])
+        program_offsets.extend(
+            offset + code_base for offset in chunk_program_offsets[1:]
+        )
+        id_blob += chunk_ids
+        codes += chunk_codes
+        xs.extend(chunk_xs)
+        ys.extend(chunk_ys)
+        directions += chunk_directions
+    return ParsedScenario(
+        grid_size_x,
+        grid_size_y,
+        (bytes(id_blob), id_offsets),
+        (xs, ys, bytes(directions)),
+        (bytes(codes), program_offsets),
+    )
+
+
+def from_cars(grid_size_x: int, grid_size_y: int, cars: list) -> ParsedScenario:
+    id_blob, id_offsets = bytearray(), array("q", [0])
+    xs, ys, directions = array("i"), array("i"), bytearray()
+    codes, program_offsets = bytearray(), array("q", [0])
+    for car_id, pose, commands in cars:
+        x, y, direction = pose.split()
+        id_blob += car_id.encode()
+        id_offsets.append(len(id_blob))
+        xs.append(int(x))
+        ys.append(int(y))
+        directions.append(DIRECTION_LETTERS.index(direction.upper()))
+        codes += encode_commands(commands)
+        program_offsets.append(len(codes))
+    return ParsedScenario(
+        grid_size_x,
+        grid_size_y,
+        (bytes(id_blob), id_offsets),
+        (xs, ys, bytes(directions)),
+        (bytes(codes), program_offsets),
+    )
+
+
+def parse_sequential(path) -> ParsedScenario:
+    with open_input(path) as file:
+        return from_cars(*parse_input(file.read()))
+
+
+def parse_file(
+    path,
+    workers: int | None = None,
+    validate: bool = True,
+    chunk_bytes: int = CHUNK_BYTES,
+) -> ParsedScenario:
+    # Chunks are read at byte offsets, which a compressed stream lacks.
+    if detect_compression(path) is not None:
+        scenario = parse_sequential(path)
+    else:
+        scenario = parse_chunked(path, workers or os.cpu_count() or 1, chunk_bytes)
+    if validate:
+        scenario.validate()
+    return scenario
+
+
+def parse_chunked(path, workers: int, chunk_bytes: int) -> ParsedScenario:
+    # parse_input for files with millions of cars: the car records are split
+    # into chunks of about chunk_bytes at record boundaries, parsed by worker
+    # processes and merged in input order. A chunk that does not parse sends
+    # the whole file through parse_input, for its exact error message.
+    with open(path, "rb") as file:
+        if not os.fstat(file.fileno()).st_size:
+            raise ValueError("Empty input!")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start, line_end = 0, data.find(b"\n")
+            while not data[start : len(data) if line_end < 0 else line_end].strip():
+                if line_end < 0:
+                    raise ValueError("Empty input!")
+                start, line_end = line_end + 1, data.find(b"\n", line_end + 1)
+            body = len(data) if line_end < 0 else line_end + 1
+            grid_line = data[start:body].decode(errors="replace").strip()
+            chunks = max(1, (len(data) - body) // chunk_bytes)
+            bounds = chunk_bounds(data, body, len(data), chunks)
+
+    grid_size_x, grid_size_y = parse_grid_size(grid_line)
+    try:
+        if workers == 1 or len(bounds) == 1:
+            parsed = [parse_chunk(path, *bound) for bound in bounds]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(min(workers, len(bounds))) as executor:
+                futures = [executor.submit(parse_chunk, path, *b) for b in bounds]
+                parsed = [future.result() for future in futures]
+        if not any(chunk[2] for chunk in parsed):
+            raise ValueError("No cars found in input!")
+        return merge_chunks(grid_size_x, grid_size_y, parsed)
+    except (ValueError, UnicodeDecodeError):
+        return parse_sequential(path)
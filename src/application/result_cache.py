@@ -0,0 +1,189 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+from domain.command_store import RunLengthProgram, encode_commands
+
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def scenario_key(grid_size_x: int, grid_size_y: int, cars: list) -> str:
+    # Car order and whitespace do not change the key: the cached entry keeps
+    # every collided cell, and resolve_entry re-applies the caller's order.
+    normalized = []
+    for car_id, init_state, commands in cars:
+        x, y, direction = init_state.split()
+        normalized.append(
+            (car_id, int(x), int(y), direction.upper(), program_key(commands))
+        )
+    normalized.sort()
+
+    payload = json.dumps(
+        [CACHE_VERSION, int(grid_size_x), int(grid_size_y), normalized],
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def program_key(commands) -> str:
+    # Run-length programs are keyed by their text rather than expanded.
+    if isinstance(commands, RunLengthProgram):
+        return "rle:" + commands.to_text()
+    return encode_commands(commands).hex()
+
+
+def make_entry(result: dict, car_ids: list, positions: list) -> dict:
+    # positions are the cars' final positions, i.e. at the collision step.
+    if not result["collision"]:
+        return {"collision": False}
+
+    cells = {}
+    for car_id, position in zip(car_ids, positions):
+        cells.setdefault(tuple(position), []).append(car_id)
+    collided = [
+        [x, y, sorted(ids)] for (x, y), ids in sorted(cells.items()) if len(ids) > 1
+    ]
+    return {"collision": True, "step": result["step"], "cells": collided}
+
+
+def resolve_entry(entry: dict, car_ids: list) -> dict:
+    # Grid.check_collisions reports the cell reached first in car order.
+    if not entry["collision"]:
+        return {"collision": False}
+
+    order = {car_id: index for index, car_id in enumerate(car_ids)}
+    cells = [(sorted(ids, key=order.get), (x, y)) for x, y, ids in entry["cells"]]
+    ids, position = min(cells, key=lambda cell: order[cell[0][0]])
+    return {"collision": True, "cars": ids, "position": position, "step": entry["step"]}
+
+
+class ResultCache:
+    def __init__(self, cache_dir, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.logger = logging.getLogger(__name__)
+        self.cache_dir = os.fspath(cache_dir)
+        self.max_bytes = max_bytes
+        self._counter = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key[2:] + ".json")
+
+    def get(self, key: str) -> dict | None:
+        # Entries that do not read back as make_entry wrote them are misses.
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                entry = json.loads(file.read())
+            if entry["collision"]:
+                entry["step"], entry["cells"]
+            # The file's mtime is its LRU timestamp.
+            os.utime(path)
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            return None
+        return entry
+
+    def put(self, key: str, entry: dict) -> None:
+        path = self._path(key)
+        data = json.dumps(entry, separators=(",", ":")).encode()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with self._lock:
+            self._counter += 1
+            temp_path = (
+                f"{path}.{os.getpid()}.{threading.get_ident()}.{self._counter}.tmp"
+            )
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        try:
+            replaced = os.stat(path).st_size
+        except FileNotFoundError:
+            replaced = 0
+        # Readers in other processes only ever see whole entries.
+        os.replace(temp_path, path)
+
+        # The running total lives on disk, so that processes writing one
+        # entry each still add up to an eviction.
+        with self._locked():
+            total = self._read_total() + len(data) - replaced
+            if total > self.max_bytes:
+                # Down to 90%, so that a full cache is not scanned per put.
+                total = self._evict_locked(self.max_bytes * 9 // 10)
+            self._write_total(total)
+
+    def lookup(self, grid_size_x: int, grid_size_y: int, cars: list) -> dict | None:
+        entry = self.get(scenario_key(grid_size_x, grid_size_y, cars))
+        if entry is None:
+            return None
+        return resolve_entry(entry, [car[0] for car in cars])
+
+    def store(
+        self, grid_size_x: int, grid_size_y: int, cars: list, result, positions
+    ) -> None:
+        if "error" in result:
+            return
+        entry = make_entry(result, [car[0] for car in cars], positions)
+        self.put(scenario_key(grid_size_x, grid_size_y, cars), entry)
+
+    def entries(self) -> list[tuple[float, int, str]]:
+        found = []
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith(".json"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, stat.st_size, entry.path))
+        return found
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.cache_dir, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _read_total(self) -> int:
+        # Rebuilt from the entries when missing, e.g. in a new cache.
+        try:
+            with open(os.path.join(self.cache_dir, ".size")) as file:
+                return int(file.read())
+        except (FileNotFoundError, ValueError):
+            return self.size()
+
+    def _write_total(self, total: int) -> None:
+        size_path = os.path.join(self.cache_dir, ".size")
+        with open(f"{size_path}.tmp", "w") as file:
+            file.write(str(total))
+        os.replace(f"{size_path}.tmp", size_path)
+
+    def evict(self) -> None:
+        with self._locked():
+            self._write_total(self._evict_locked(self.max_bytes))
+
+    def _evict_locked(self, target: int) -> int:
+        # The entries' actual size also corrects the total for entries
+        # written concurrently.
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.logger.debug(f"Result cache holds {total} bytes after eviction")
+        return total
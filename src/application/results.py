@@ -0,0 +1,46 @@
+def format_result(result: dict) -> str:
+    if "error" in result:
+        return f"ERROR: Simulation failed: {result['error']}"
+    if "stopped" in result:
+        return (
+            f"no collision up to step {result['step']} (stopped: {result['stopped']})"
+        )
+    if not result["collision"]:
+        return "no collision"
+    car_ids = "".join(f"{car_id} " for car_id in result["cars"])
+    position = result["position"]
+    return f"{car_ids}\n{position[0]} {position[1]}\n{result['step']}"
+
+
+def format_collisions(collisions) -> str:
+    if not collisions:
+        return "no collision"
+    return "\n".join(
+        format_result({"collision": True, **collision}) for collision in collisions
+    )
+
+
+def pose_record(car_id: str, x: int, y: int, direction) -> list:
+    return [car_id, x, y, direction.name[0]]
+
+
+def start_record(grid) -> dict:
+    # Trajectory output opens with every car where it starts.
+    return {
+        "step": 0,
+        "cars": [
+            pose_record(car_id, car.x, car.y, car.direction)
+            for car_id, car in grid.cars.items()
+        ],
+    }
+
+
+def step_record(view) -> dict:
+    # The cars that moved or turned at a step, and its collision if any.
+    record = {"step": view.step, "cars": [pose_record(*pose) for pose in view.changed]}
+    if view.collision is not None and view.collision["collision"]:
+        record["collision"] = {
+            "cars": view.collision["cars"],
+            "position": list(view.collision["position"]),
+        }
+    return record
@@ -0,0 +1,82 @@
+import threading
+import time
+
+CANCELLED = "cancelled"
+DEADLINE = "deadline"
+MAX_STEPS = "max_steps"
+
+
+def stopped_result(reason: str, step: int) -> dict:
+    # Partial result of a run that was stopped: no collision up to step.
+    return {"collision": False, "stopped": reason, "step": step}
+
+
+class CancellationToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+class RunControl:
+    # Limits and progress reporting for a run. deadline is a time.monotonic()
+    # value. progress(step, total) is called at most once per progress_every
+    # steps or progress_interval seconds, whichever comes first (on every
+    # check when neither is set).
+    def __init__(
+        self,
+        deadline: float | None = None,
+        max_steps: int | None = None,
+        token: CancellationToken | None = None,
+        progress=None,
+        progress_every: int | None = None,
+        progress_interval: float | None = None,
+    ):
+        if max_steps is not None and max_steps < 0:
+            raise ValueError("max_steps must be non-negative")
+        self.deadline = deadline
+        self.max_steps = max_steps
+        self.token = token
+        self.progress = progress
+        self.progress_every = progress_every
+        self.progress_interval = progress_interval
+        self._reported_step = 0
+        self._reported_at = time.monotonic()
+
+    @classmethod
+    def with_timeout(cls, seconds: float, **kwargs) -> "RunControl":
+        return cls(deadline=time.monotonic() + seconds, **kwargs)
+
+    def step_limit(self, steps: int) -> int:
+        if self.max_steps is None:
+            return steps
+        return min(steps, self.max_steps)
+
+    def stop_reason(self) -> str | None:
+        if self.token is not None and self.token.cancelled:
+            return CANCELLED
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return DEADLINE
+        return None
+
+    def report(self, step: int, total: int) -> None:
+        if self.progress is None:
+            return
+        now = time.monotonic()
+        throttled = (
+            self.progress_every is not None or self.progress_interval is not None
+        )
+        due = not throttled
+        if self.progress_every is not None:
+            due |= step - self._reported_step >= self.progress_every
+        if self.progress_interval is not None:
+            due |= now - self._reported_at >= self.progress_interval
+        if due:
+            self._reported_step = step
+            self._reported_at = now
+            self.progress(step, total)
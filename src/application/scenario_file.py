@@ -0,0 +1,219 @@
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from contextlib import contextmanager
+from functools import cached_property
+
+from constants import Direction
+from domain.command_store import CommandStore, encode_commands
+
+from .compressed_io import detect_compression, open_input
+
+# Layout after the header, each column packed little-endian:
+#   program offsets  q[car_count + 1]   into the program blob
+#   id offsets       q[car_count + 1]   into the id blob
+#   xs, ys           i[car_count] each
+#   directions       B[car_count]       index into DIRECTION_LETTERS
+#   id blob          UTF-8
+#   program blob     one command code per byte, as in CommandStore
+SCENARIO_MAGIC = b"GICSCN01"
+SCENARIO_HEADER = struct.Struct("<8sIIQQ")
+OFFSET = struct.Struct("<q")
+DIRECTION_LETTERS = "NESW"
+DIRECTIONS = (Direction.NORTH, Direction.EAST, Direction.SOUTH, Direction.WEST)
+CODE_TEXT = bytes.maketrans(b"\x00\x01\x02", b"FLR")
+
+
+def is_scenario_file(path) -> bool:
+    with open_input(path, "rb") as file:
+        return file.read(len(SCENARIO_MAGIC)) == SCENARIO_MAGIC
+
+
+@contextmanager
+def mappable(path, scratch_dir=None):
+    # Scenarios are mapped, so a compressed one is streamed out to a plain
+    # file in scratch_dir for as long as it is in use.
+    if detect_compression(path) is None:
+        yield path
+        return
+    with tempfile.TemporaryDirectory(dir=scratch_dir) as directory:
+        plain_path = os.path.join(directory, "scenario.scn")
+        with open_input(path, "rb") as source, open(plain_path, "wb") as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+        yield plain_path
+
+
+def write_scenario(path, grid_size_x: int, grid_size_y: int, cars: list) -> None:
+    # cars as returned by parse_input. Programs are written first, at their
+    # final position, so each is encoded once and never held all at once.
+    count = len(cars)
+    ids = [car_id.encode() for car_id, _, _ in cars]
+    if len(set(ids)) != count:
+        seen = set()
+        for car_id, _, _ in cars:
+            if car_id in seen:
+                raise ValueError(f"Car with id '{car_id}' already exists")
+            seen.add(car_id)
+    id_offsets = array("q", [0])
+    for car_id in ids:
+        id_offsets.append(id_offsets[-1] + len(car_id))
+
+    xs, ys, directions = array("i"), array("i"), bytearray()
+    for _, init_state, _ in cars:
+        x, y, direction = init_state.split()
+        xs.append(int(x))
+        ys.append(int(y))
+        directions.append(DIRECTION_LETTERS.index(direction.upper()))
+
+    def write_programs(file) -> array:
+        program_offsets = array("q", [0])
+        for _, _, commands in cars:
+            program = encode_commands(commands)
+            file.write(program)
+            program_offsets.append(program_offsets[-1] + len(program))
+        return program_offsets
+
+    write_columns(
+        path,
+        grid_size_x,
+        grid_size_y,
+        (b"".join(ids), id_offsets),
+        (xs, ys, directions),
+        write_programs,
+    )
+
+
+def write_columns(
+    path, grid_size_x: int, grid_size_y: int, ids, poses, write_programs
+) -> None:
+    # ids is (UTF-8 blob, offsets) and poses (xs, ys, directions), already
+    # packed; write_programs(file) writes the program blob at its final
+    # position and returns the program offsets.
+    id_blob, id_offsets = ids
+    xs, ys, directions = poses
+    count = len(xs)
+    table_size = 16 * (count + 1) + 9 * count
+    programs_start = SCENARIO_HEADER.size + table_size + len(id_blob)
+
+    temp_path = f"{path}.tmp{os.getpid()}"
+    with open(temp_path, "wb") as file:
+        file.seek(programs_start)
+        program_offsets = write_programs(file)
+
+        file.seek(0)
+        file.write(
+            SCENARIO_HEADER.pack(
+                SCENARIO_MAGIC, grid_size_x, grid_size_y, count, len(id_blob)
+            )
+        )
+        for column in (program_offsets, id_offsets, xs, ys, directions):
+            file.write(column)
+        file.write(id_blob)
+    os.replace(temp_path, path)
+
+
+class ScenarioFile:
+    # A binary scenario mapped into memory. Positions and programs are read
+    # straight from the mapping, and programs is a CommandStore over it, so
+    # loading does not touch the commands at all.
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size < SCENARIO_HEADER.size:
+                raise ValueError(f"'{path}' is truncated or not a scenario file")
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.size_x, self.size_y, count, id_bytes = SCENARIO_HEADER.unpack_from(
+            self._mmap
+        )
+        if magic != SCENARIO_MAGIC:
+            self._mmap.close()
+            raise ValueError(f"'{path}' is not a scenario file")
+        if not self._consistent(count, id_bytes):
+            self._mmap.close()
+            raise ValueError(f"'{path}' is truncated or not a scenario file")
+
+        view = memoryview(self._mmap)
+        start = SCENARIO_HEADER.size
+        columns = []
+        for size, code in ((8 * (count + 1), "q"), (8 * (count + 1), "q")):
+            columns.append(view[start : start + size].cast(code))
+            start += size
+        for size, code in ((4 * count, "i"), (4 * count, "i"), (count, "B")):
+            columns.append(view[start : start + size].cast(code))
+            start += size
+        program_offsets, id_offsets, self.xs, self.ys, self.directions = columns
+
+        self.program_offsets = program_offsets
+        self.program_codes = view[start + id_bytes :]
+        self._ids = view[start : start + id_bytes]
+        self._id_offsets = id_offsets
+        self._count = count
+        self.programs = CommandStore(buffer=self.program_codes, offsets=program_offsets)
+        self.programs._mmap = self._mmap
+
+    def _consistent(self, count: int, id_bytes: int) -> bool:
+        # Whether the columns the header describes fit the file, checked
+        # before they are cast: each offset column runs from 0 to the size of
+        # its blob, and every direction code is below 4.
+        data = self._mmap
+        ids_start = SCENARIO_HEADER.size + 16 * (count + 1) + 9 * count
+        programs_start = ids_start + id_bytes
+        if programs_start > len(data):
+            return False
+
+        def ends(column: int) -> tuple[int, int]:
+            first = SCENARIO_HEADER.size + 8 * (count + 1) * column
+            return (
+                OFFSET.unpack_from(data, first)[0],
+                OFFSET.unpack_from(data, first + 8 * count)[0],
+            )
+
+        if ends(0) != (0, len(data) - programs_start) or ends(1) != (0, id_bytes):
+            return False
+        directions = data[ids_start - count : ids_start]
+        return not directions.translate(None, bytes(range(len(DIRECTIONS))))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def car_id(self, index: int) -> str:
+        return str(
+            self._ids[self._id_offsets[index] : self._id_offsets[index + 1]], "utf-8"
+        )
+
+    @cached_property
+    def car_ids(self) -> list[str]:
+        # Decoded on first use; out-of-core runs only look up the few ids
+        # they report, through car_id().
+        return [sys.intern(self.car_id(i)) for i in range(self._count)]
+
+    @property
+    def max_step(self) -> int:
+        return max(map(self.programs.program_length, range(len(self))), default=0)
+
+    def parsed_cars(self) -> list[tuple]:
+        # Same shape as parse_cars, with programs left in the mapping.
+        return [
+            (
+                car_id,
+                self.xs[i],
+                self.ys[i],
+                DIRECTIONS[self.directions[i]],
+                self.programs.program(i),
+            )
+            for i, car_id in enumerate(self.car_ids)
+        ]
+
+    def write_text(self, file) -> None:
+        file.write(f"{self.size_x} {self.size_y}\n")
+        for i, car_id in enumerate(self.car_ids):
+            file.write(
+                f"\n{car_id}\n{self.xs[i]} {self.ys[i]} "
+                f"{DIRECTION_LETTERS[self.directions[i]]}\n"
+            )
+            program = self.programs.program(i).to_bytes()
+            file.write(program.translate(CODE_TEXT).decode() + "\n")
@@ -0,0 +1,354 @@
+import asyncio
+import io
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+
+from domain.command_store import RunLengthProgram, is_run_length, parse_run_length
+from domain.metrics import Metrics, get_metrics
+
+from .batch_simulation import BatchSimulation
+from .input_parser import parse_input
+from .results import format_result
+from .run_control import RunControl
+from .simulation import Simulation
+
+
+def parse_commands(car_id: str, commands):
+    if not isinstance(commands, str):
+        raise ValueError(f"Car '{car_id}' commands must be a string")
+    if is_run_length(commands):
+        return parse_run_length(commands)
+    invalid = commands.encode().translate(None, b"FLR")
+    if invalid:
+        raise ValueError(
+            f"Car '{car_id}' has invalid command '{invalid[:1].decode(errors='replace')}' "
+            f"in '{commands}'. Commands must contain only F (Forward), L (Left), R (Right)"
+        )
+    return commands
+
+
+def parse_count(name: str, value, minimum: int) -> int:
+    # JSON numbers only: no floats, booleans or numeric strings.
+    if type(value) is not int or value < minimum:
+        raise ValueError(f"'{name}' must be an integer of at least {minimum}")
+    return value
+
+
+def parse_car(car: dict) -> list:
+    car_id = car["id"]
+    if not isinstance(car_id, (str, int)) or not str(car_id).strip():
+        raise ValueError("Car 'id' must be a non-empty string")
+    car_id = str(car_id)
+    x = parse_count("x", car["x"], 0)
+    y = parse_count("y", car["y"], 0)
+    direction = car["direction"]
+    if not isinstance(direction, str) or direction.upper() not in ("N", "E", "S", "W"):
+        raise ValueError(f"Car '{car_id}' direction must be N, E, S or W")
+    return [
+        car_id,
+        f"{x} {y} {direction}",
+        parse_commands(car_id, car.get("commands", "")),
+    ]
+
+
+def parse_request(request: dict) -> tuple:
+    # Everything a request can get wrong is a ValueError here, so that the
+    # scenarios reaching a batch are well formed.
+    if "input" in request:
+        if not isinstance(request["input"], str):
+            raise ValueError("'input' must be the scenario text")
+        return parse_input(request["input"])
+
+    scenario = request.get("scenario")
+    if not isinstance(scenario, dict):
+        raise ValueError("Request must contain an 'input' text or a 'scenario' object")
+
+    try:
+        grid_size_x, grid_size_y = scenario["grid"]
+        grid_size_x = parse_count("grid", grid_size_x, 1)
+        grid_size_y = parse_count("grid", grid_size_y, 1)
+        cars = [parse_car(car) for car in scenario["cars"]]
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid scenario object: {e}")
+
+    if not cars:
+        raise ValueError("No cars found in input!")
+    return grid_size_x, grid_size_y, cars
+
+
+def to_request(scenario: tuple) -> dict:
+    # The scenario object that parse_request reads back.
+    grid_size_x, grid_size_y, cars = scenario
+    objects = []
+    for car_id, pose, commands in cars:
+        x, y, direction = pose.split()
+        objects.append(
+            {
+                "id": car_id,
+                "x": int(x),
+                "y": int(y),
+                "direction": direction,
+                "commands": (
+                    commands.to_text()
+                    if isinstance(commands, RunLengthProgram)
+                    else commands
+                ),
+            }
+        )
+    return {"scenario": {"grid": [grid_size_x, grid_size_y], "cars": objects}}
+
+
+def to_response(result: dict) -> dict:
+    response = dict(result)
+    if "position" in response:
+        response["position"] = list(response["position"])
+    response["output"] = format_result(result)
+    return response
+
+
+def from_response(response: dict) -> dict:
+    result = {
+        key: value for key, value in response.items() if key not in ("id", "output")
+    }
+    if "position" in result:
+        result["position"] = tuple(result["position"])
+    return result
+
+
+def run_scenarios(
+    scenarios: list,
+    timeout: float | None = None,
+    max_steps: int | None = None,
+    metrics: Metrics | None = None,
+) -> list[dict]:
+    # The timeout is counted from when the worker starts on the batch.
+    control = None
+    if timeout is not None:
+        control = RunControl.with_timeout(timeout, max_steps=max_steps)
+    elif max_steps is not None:
+        control = RunControl(max_steps=max_steps)
+
+    # BatchSimulation expands every program; scenarios with run-length
+    # programs go to Simulation, which keeps their trajectories as segments.
+    segmented = [
+        any(isinstance(commands, RunLengthProgram) for _, _, commands in cars)
+        for _, _, cars in scenarios
+    ]
+    batch = [scenario for scenario, ok in zip(scenarios, segmented) if not ok]
+    batch_results = iter(BatchSimulation(batch, metrics).run(control) if batch else [])
+    results = [
+        run_segmented(scenario, control, metrics) if ok else next(batch_results)
+        for scenario, ok in zip(scenarios, segmented)
+    ]
+    return [to_response(result) for result in results]
+
+
+def run_segmented(
+    scenario: tuple, control: RunControl | None, metrics: Metrics | None
+) -> dict:
+    try:
+        simulation = Simulation(*scenario, metrics=metrics)
+    except ValueError as e:
+        return {"error": str(e)}
+    # BatchSimulation does not log blocked moves either, and there may be a
+    # billion of them.
+    simulation.grid.warn_blocked = False
+    with redirect_stdout(io.StringIO()):
+        return simulation.run(control)
+
+
+def run_scenarios_counted(
+    scenarios: list, timeout: float | None = None, max_steps: int | None = None
+) -> tuple[list[dict], dict]:
+    # For worker processes: also returns the batch's metrics, to be merged
+    # into the service's.
+    metrics = Metrics()
+    responses = run_scenarios(scenarios, timeout, max_steps, metrics)
+    return responses, metrics.snapshot()
+
+
+def warm_worker() -> None:
+    # Pays for imports and first-call costs before any request arrives.
+    run_scenarios([(2, 2, [["A", "0 0 N", "FRF"], ["B", "1 1 S", "F"]])])
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        executor,
+        max_batch: int = 64,
+        max_delay: float = 0.002,
+        timeout: float | None = None,
+        max_steps: int | None = None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.max_steps = max_steps
+        self._queue = asyncio.Queue()
+        self._tasks = set()
+
+    async def submit(self, scenario: tuple) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((scenario, future))
+        return await future
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            task = asyncio.create_task(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch: list) -> None:
+        self.logger.debug(f"Dispatching batch of {len(batch)} scenarios")
+        loop = asyncio.get_running_loop()
+        try:
+            results, counts = await loop.run_in_executor(
+                self.executor,
+                run_scenarios_counted,
+                [scenario for scenario, _ in batch],
+                self.timeout,
+                self.max_steps,
+            )
+            get_metrics().merge(counts, counts["active_cars"])
+        except Exception as e:
+            if len(batch) == 1:
+                results = [to_response({"error": f"Worker failed: {e}"})]
+            else:
+                # One bad scenario must not fail the requests batched with it.
+                self.logger.warning(f"Batch failed ({e!r}), running it one by one")
+                results = await asyncio.gather(
+                    *(self._dispatch_one(scenario) for scenario, _ in batch)
+                )
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _dispatch_one(self, scenario: tuple) -> dict:
+        loop = asyncio.get_running_loop()
+        try:
+            (result,), counts = await loop.run_in_executor(
+                self.executor,
+                run_scenarios_counted,
+                [scenario],
+                self.timeout,
+                self.max_steps,
+            )
+        except Exception as e:
+            return to_response({"error": f"Worker failed: {e}"})
+        get_metrics().merge(counts, counts["active_cars"])
+        return result
+
+
+class SimulationService:
+    def __init__(
+        self,
+        workers: int | None = None,
+        max_batch: int = 64,
+        max_delay=0.002,
+        timeout: float | None = None,
+        max_steps: int | None = None,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.workers = workers or os.cpu_count() or 1
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.max_steps = max_steps
+        self.executor = None
+        self.batcher = None
+        self._batcher_task = None
+
+    async def start(self) -> None:
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=warm_worker
+        )
+        # Start every worker now instead of on the first requests.
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(self.executor, warm_worker)
+                for _ in range(self.workers)
+            )
+        )
+        self.batcher = MicroBatcher(
+            self.executor,
+            self.max_batch,
+            self.max_delay,
+            timeout=self.timeout,
+            max_steps=self.max_steps,
+        )
+        self._batcher_task = asyncio.create_task(self.batcher.run())
+        self.logger.info(f"Simulation service started with {self.workers} workers")
+
+    async def close(self) -> None:
+        if self._batcher_task is not None:
+            self._batcher_task.cancel()
+        if self.executor is not None:
+            # Waiting for the workers to exit must not stall the event loop.
+            await asyncio.to_thread(
+                self.executor.shutdown, wait=True, cancel_futures=True
+            )
+
+    async def handle(self, request: dict) -> dict:
+        try:
+            scenario = parse_request(request)
+        except ValueError as e:
+            response = to_response({"error": str(e)})
+        else:
+            response = await self.batcher.submit(scenario)
+
+        if "id" in request:
+            response = {"id": request["id"], **response}
+        return response
+
+    async def handle_connection(self, reader, writer) -> None:
+        lock = asyncio.Lock()
+        pending = set()
+
+        async def respond(line: bytes) -> None:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("Request must be a JSON object")
+            except ValueError as e:
+                response = to_response({"error": f"Invalid request: {e}"})
+            else:
+                response = await self.handle(request)
+
+            async with lock:
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(respond(line))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+        finally:
+            writer.close()
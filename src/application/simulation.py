@@ -1,7 +1,20 @@
+import asyncio
 import logging
+from collections.abc import AsyncIterator, Iterator
+from contextlib import closing
 
-from constants import Direction
-from domain import Grid
+from constants import CollisionPolicy, Direction
+from domain import CollisionTable, Grid, StepView
+from domain.command_store import RunLengthProgram
+from domain.metrics import Metrics
+from domain.trajectory import TrajectoryMemo, first_divergence, get_trajectory_memo
+
+from .run_control import MAX_STEPS, RunControl, stopped_result
+
+# Steps between handing control back to the event loop in aiter_steps.
+ASYNC_YIELD_EVERY = 64
+# Car-steps of trajectories computed at a time when programs are longer.
+WINDOW_WORK = 16384
 
 
 def parse_direction(direction_str):
@@ -14,40 +27,282 @@ def parse_direction(direction_str):
     return direction_map[direction_str.upper()]
 
 
+def parse_cars(cars: list) -> tuple[int, list[tuple]]:
+    max_step = 0
+
+    parsed_cars = []
+    for car in cars:
+        car_id, init_state, commands = car
+        init_state = init_state.split()
+
+        max_step = max(max_step, len(commands))
+
+        parsed_cars.append(
+            (
+                car_id,
+                int(init_state[0]),
+                int(init_state[1]),
+                parse_direction(init_state[2]),
+                commands,
+            )
+        )
+
+    return max_step, parsed_cars
+
+
 class Simulation:
-    def __init__(self, grid_size_x: int, grid_size_y: int, cars: list):
+    def __init__(
+        self,
+        grid_size_x: int,
+        grid_size_y: int,
+        cars: list,
+        memo: TrajectoryMemo | None = None,
+        metrics: Metrics | None = None,
+    ):
         self.logger = logging.getLogger(__name__)
         self.grid = Grid(size_x=grid_size_x, size_y=grid_size_y)
+        # Counted into the process-wide metrics unless given its own.
+        if metrics is not None:
+            self.grid.metrics = metrics
+        # Trajectories are shared by every simulation in the process.
+        self.memo = memo if memo is not None else get_trajectory_memo()
 
-        self.max_step = 0
+        self.max_step, self.parsed_cars = parse_cars(cars)
+        self.grid.add_cars(self.parsed_cars)
 
-        for car in cars:
-            car_id, init_state, commands = car
-            init_state = init_state.split()
+        # Recorded by run() so that rerun() can skip work for unchanged cars.
+        self._trajectories = None
+        self._clear_steps = 0
 
-            self.max_step = max(self.max_step, len(commands))
+    @classmethod
+    def from_scenario(
+        cls,
+        scenario,
+        memo: TrajectoryMemo | None = None,
+        metrics: Metrics | None = None,
+    ):
+        # From a ScenarioFile, without copying its programs out of the mapping.
+        simulation = cls(scenario.size_x, scenario.size_y, [], memo, metrics)
+        simulation.max_step = scenario.max_step
+        simulation.parsed_cars = scenario.parsed_cars()
+        simulation.grid.add_cars(simulation.parsed_cars)
+        return simulation
 
-            self.grid.add_car(
-                id=car_id,
-                x=int(init_state[0]),
-                y=int(init_state[1]),
-                direction=parse_direction(init_state[2]),
-                commands=commands,
-            )
+    @property
+    def metrics(self) -> Metrics:
+        return self.grid.metrics
 
-    def run(self):
-        collision_detected = False
+    def run(self, control: RunControl | None = None) -> dict:
         self.logger.info("Starting simulation...")
+        if self.max_step <= self._window():
+            return self._join(self.grid.trajectories(self.memo), 1, control)
+
+        # Longer programs are joined a window at a time, so that only one
+        # window of trajectories is held and none past the first collision
+        # or a stop is computed. rerun() then starts afresh.
+        limit = self._limit(control)
+        steps = self._windows(limit, sync=False, every_step=False)
+        return self._finish(steps, limit, control)
+
+    def _window(self) -> int:
+        # Run-length trajectories are kept as segments, whatever their length.
+        dense = sum(
+            not isinstance(car.program, RunLengthProgram)
+            for car in self.grid.cars.values()
+        )
+        if not dense:
+            return max(1, self.max_step)
+        return max(1, WINDOW_WORK // dense)
+
+    def _windows(
+        self, steps: int, sync: bool, every_step: bool = True
+    ) -> Iterator[StepView]:
+        # iter_trajectories over the next window of every program at a time,
+        # up to steps and the first collision.
+        window = self._window()
+        done = 0
+        while done < steps:
+            count = min(window, steps - done)
+            trajectories = self.grid.trajectories(self.memo, count)
+            with closing(
+                self.grid.iter_trajectories(trajectories, count, 1, sync, every_step)
+            ) as views:
+                for view in views:
+                    yield view
+                    if view.collision is not None:
+                        return
+            done += count
+
+    def iter_steps(self, sync: bool = True) -> Iterator[StepView]:
+        # Lazily yields a StepView per step, up to and including the first
+        # collision. With sync the grid can be rendered or queried between
+        # steps; without it cars only move once iteration ends, or at the end
+        # of each window of a long run.
+        self._trajectories = None
+        if self.max_step > self._window():
+            return self._windows(self.max_step, sync)
+        return self.grid.iter_trajectories(
+            self.grid.trajectories(self.memo), self.max_step, sync=sync
+        )
+
+    async def aiter_steps(
+        self, sync: bool = True, yield_every: int = ASYNC_YIELD_EVERY
+    ) -> AsyncIterator[StepView]:
+        with closing(self.iter_steps(sync)) as steps:
+            for count, view in enumerate(steps, start=1):
+                yield view
+                if count % yield_every == 0:
+                    await asyncio.sleep(0)
+
+    def traffic_stats(self, steps: int | None = None):
+        # Visits, dwell, blocked moves and distance per car of the last run
+        # or iteration, up to the step the grid is at unless steps is given.
+        # Collided cars are not frozen, so this does not describe run_all.
+        from .analytics import memo_program, traffic_stats
+
+        trajectories = [
+            self.memo.trajectory(
+                x,
+                y,
+                direction,
+                memo_program(commands),
+                self.grid.size_x,
+                self.grid.size_y,
+            )
+            for _, x, y, direction, commands in self.parsed_cars
+        ]
+        return traffic_stats(
+            trajectories,
+            [car[0] for car in self.parsed_cars],
+            self.grid.size_x,
+            self.grid.size_y,
+            self.grid.current_step if steps is None else steps,
+        )
+
+    def run_all(
+        self, policy: CollisionPolicy = CollisionPolicy.FREEZE
+    ) -> CollisionTable:
+        # Simulates every step instead of stopping at the first collision.
+        self.logger.info(f"Starting simulation ({policy.value} collided cars)...")
+        collisions = self.grid.collect_collisions(
+            self.grid.trajectories(self.memo), self.max_step, policy
+        )
+        # The grid no longer matches a plain run, so rerun() starts afresh.
+        self._trajectories = None
+
+        self.logger.info(f"Simulation complete with {len(collisions)} collisions.")
+        return collisions
+
+    def rerun(self, cars: list) -> dict:
+        # Runs an edited version of the previous input on the same grid. Cars
+        # that did not change keep their recorded trajectories, and collisions
+        # are only re-checked from the first step where a changed car's path
+        # diverges from its previous one.
+        if self._trajectories is None:
+            self._trajectories = {}
+            self._clear_steps = 0
+
+        max_step, parsed_cars = parse_cars(cars)
+        Grid(size_x=self.grid.size_x, size_y=self.grid.size_y).validate_cars(
+            parsed_cars
+        )
+
+        previous_cars = {car[0]: car for car in self.parsed_cars}
+        kept = {}
+        changed = []
+        for car in parsed_cars:
+            car_id = car[0]
+            if previous_cars.get(car_id) == car and car_id in self._trajectories:
+                kept[car_id] = self.grid.cars[car_id]
+                kept[car_id].x, kept[car_id].y, kept[car_id].direction = (
+                    self._trajectories[car_id].state(0)
+                )
+            else:
+                changed.append(car)
+
+        self.grid.cars = dict(kept)
+        self.grid.reindex()
+        self.grid.current_step = 0
+        self.grid.add_cars(changed, trusted=True)
+        self.grid.cars = {car[0]: self.grid.cars[car[0]] for car in parsed_cars}
+        if not kept and max_step > self._window():
+            # Nothing to reuse: a fresh run, joined in windows.
+            self.max_step, self.parsed_cars = max_step, parsed_cars
+            return self.run()
+
+        # Removing or reordering cars cannot create a collision in steps that
+        # were collision-free, so only changed paths move the restart point.
+        first_step = self._clear_steps + 1
+        trajectories = []
+        for car_id, car in self.grid.cars.items():
+            if car_id in kept:
+                trajectories.append(self._trajectories[car_id])
+                continue
+            trajectory = self.grid.trajectory(car, self.memo)
+            trajectories.append(trajectory)
+            previous = self._trajectories.get(car_id)
+            diverges = 0 if previous is None else first_divergence(previous, trajectory)
+            if diverges is not None:
+                first_step = min(first_step, max(diverges, 1))
+
+        self.max_step, self.parsed_cars = max_step, parsed_cars
+        self.logger.info(f"Re-running simulation from step {first_step}...")
+        return self._join(trajectories, first_step)
+
+    def _limit(self, control: RunControl | None) -> int:
+        return self.max_step if control is None else control.step_limit(self.max_step)
+
+    def _join(
+        self, trajectories: list, first_step: int, control: RunControl | None = None
+    ) -> dict:
+        limit = self._limit(control)
+        steps = self.grid.iter_trajectories(
+            trajectories, limit, first_step, False, every_step=False
+        )
+        return self._finish(steps, limit, control, trajectories)
+
+    def _finish(
+        self,
+        steps: Iterator[StepView],
+        limit: int,
+        control: RunControl | None,
+        trajectories: list | None = None,
+    ) -> dict:
+        # Runs steps to the first collision or a stop. A stopped run returns
+        # a partial result with the last completed step. The trajectories, if
+        # whole, are recorded for rerun().
+        collision_result = {"collision": False}
+        stopped = None if control is None else control.stop_reason()
 
-        for step in range(self.max_step):
-            self.logger.debug(f"Step {step + 1}:")
-            collision_result = self.grid.next_step()
-            collision_detected = collision_result["collision"]
-            self.logger.debug("-" * 20)
-            if collision_detected:
-                break
+        with closing(steps):
+            for view in steps if stopped is None else ():
+                if view.collision is not None:
+                    collision_result = view.collision
+                    break
+                if control is not None:
+                    control.report(view.step, self.max_step)
+                    stopped = control.stop_reason()
+                    if stopped is not None:
+                        break
+        if (
+            stopped is None
+            and limit < self.max_step
+            and not collision_result["collision"]
+        ):
+            stopped = MAX_STEPS
 
-        if not collision_detected:
+        self._trajectories = None
+        if trajectories is not None:
+            self._trajectories = dict(zip(self.grid.cars, trajectories))
+        self._clear_steps = self.grid.current_step
+        if collision_result["collision"]:
+            collision_result["step"] = self.grid.current_step
+            self._clear_steps -= 1
+        elif stopped is not None:
+            self.logger.info(f"Simulation stopped ({stopped}).")
+            return stopped_result(stopped, self.grid.current_step)
+        else:
             print("no collision")
 
         self.logger.info("Simulation complete.")
+        return collision_result
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+from collections import deque
+from collections.abc import Iterable, Sequence
+
+from domain import Grid
+from domain.command_store import CODE_COMMANDS, TEXT_CODES, command_text
+
+from .simulation import parse_cars
+
+DEFAULT_MAX_BUFFERED = 4096
+END_OF_PROGRAM = "."
+
+
+def parse_chunk(line: str) -> tuple[str, str | None] | None:
+    # "<car_id> <commands>" appends commands, "<car_id> ." ends the car's
+    # program. Blank lines carry nothing.
+    parts = line.split(maxsplit=1)
+    if not parts:
+        return None
+    car_id = parts[0]
+    commands = parts[1].strip() if len(parts) > 1 else ""
+    if commands == END_OF_PROGRAM:
+        return car_id, None
+    return car_id, commands
+
+
+class StreamProgram(Sequence):
+    # A car's program as it arrives. It is indexed by absolute step like any
+    # other program, but executed commands are dropped, so memory is bounded
+    # by what is buffered ahead of the simulation.
+    def __init__(self):
+        self.complete = False
+        self._offset = 0
+        self._preloaded = 0
+        self._pending = deque()
+
+    def __len__(self) -> int:
+        return self._offset + len(self._pending)
+
+    def __getitem__(self, step):
+        if not self._offset <= step < len(self):
+            raise IndexError("command index out of range")
+        return self._pending[step - self._offset]
+
+    @property
+    def buffered(self) -> int:
+        return len(self._pending)
+
+    @property
+    def live_buffered(self) -> int:
+        # Pending commands that were fed live rather than preloaded.
+        return len(self) - max(self._offset, self._preloaded)
+
+    def preload(self, commands: str) -> None:
+        # The program given with the car, before any live input.
+        self.extend(commands)
+        self._preloaded = len(self)
+
+    def extend(self, commands: str) -> None:
+        self._pending.extend(
+            CODE_COMMANDS[code] for code in commands.encode().translate(TEXT_CODES)
+        )
+
+    def advance(self) -> None:
+        self._pending.popleft()
+        self._offset += 1
+
+
+class StreamingSimulation:
+    # Steps as soon as every car whose program has not ended has a command
+    # for the next step, so results and output match Simulation.run on the
+    # concatenated programs.
+    def __init__(
+        self,
+        grid_size_x: int,
+        grid_size_y: int,
+        cars: list,
+        max_buffered: int = DEFAULT_MAX_BUFFERED,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.grid = Grid(size_x=grid_size_x, size_y=grid_size_y)
+        self.max_buffered = max_buffered
+        self.result = None
+
+        _, parsed_cars = parse_cars(cars)
+        self.programs = {car[0]: StreamProgram() for car in parsed_cars}
+        self.grid.add_cars(
+            (car_id, x, y, direction, self.programs[car_id])
+            for car_id, x, y, direction, _ in parsed_cars
+        )
+        self._waiting = set(self.programs)
+        self._buffered = 0
+
+        # Programs from the input are not live input, so max_buffered does
+        # not apply to them.
+        for car_id, _, _, _, commands in parsed_cars:
+            if commands:
+                program = self.programs[car_id]
+                program.preload(command_text(commands))
+                self._buffered += program.buffered
+                self._waiting.discard(car_id)
+        self._advance()
+
+    def _program(self, car_id: str) -> StreamProgram:
+        if car_id not in self.programs:
+            raise ValueError(f"Car with id '{car_id}' does not exist")
+        return self.programs[car_id]
+
+    def feed(self, car_id: str, commands: str) -> dict | None:
+        program = self._program(car_id)
+        if self.result is not None:
+            return self.result
+        if program.complete:
+            raise ValueError(f"Program of car '{car_id}' has already ended")
+        for command in commands:
+            if command not in "FLR":
+                raise ValueError(
+                    f"Car '{car_id}' has invalid command '{command}' in '{commands}'"
+                )
+        if program.live_buffered + len(commands) > self.max_buffered:
+            raise ValueError(
+                f"Car '{car_id}' would buffer more than {self.max_buffered} commands"
+            )
+
+        program.extend(commands)
+        self._buffered += len(commands)
+        if commands:
+            self._waiting.discard(car_id)
+        return self._advance()
+
+    def end(self, car_id: str) -> dict | None:
+        self._program(car_id).complete = True
+        self._waiting.discard(car_id)
+        return self._advance()
+
+    def close(self) -> dict:
+        # Ends every program and runs what is left.
+        for car_id in self.programs:
+            self.end(car_id)
+        if self.result is None:
+            print("no collision")
+            self.result = {"collision": False}
+        self.logger.info("Simulation complete.")
+        return self.result
+
+    def _advance(self) -> dict | None:
+        while self.result is None and not self._waiting and self._buffered:
+            step = self.grid.current_step
+            collision_result = self.grid.next_step()
+
+            for car_id, program in self.programs.items():
+                if len(program) > step:
+                    program.advance()
+                    self._buffered -= 1
+                    if not program.buffered and not program.complete:
+                        self._waiting.add(car_id)
+
+            if collision_result["collision"]:
+                collision_result["step"] = self.grid.current_step
+                self.result = collision_result
+        return self.result
+
+    def apply(self, car_id: str, commands: str | None) -> dict | None:
+        if commands is None:
+            return self.end(car_id)
+        return self.feed(car_id, commands)
+
+    def consume(self, lines: Iterable[str]) -> dict:
+        # For stdin or a pipe: one chunk per line, see parse_chunk.
+        for line in lines:
+            chunk = parse_chunk(line)
+            if chunk is not None and self.apply(*chunk) is not None:
+                return self.result
+        return self.close()
+
+    async def consume_queue(self, queue: asyncio.Queue) -> dict:
+        # Items are (car_id, commands) chunks, (car_id, None) to end a car's
+        # program, and None to end the stream. A bounded queue gives the
+        # producers backpressure.
+        while True:
+            item = await queue.get()
+            if item is None:
+                return self.close()
+            if self.apply(*item) is not None:
+                return self.result
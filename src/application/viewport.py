@@ -0,0 +1,86 @@
+import numpy as np
+
+# Tiles drawn along each side of a view whatever the grid size and zoom, so
+# that rendering costs the same on any grid.
+MAX_TILES = 32
+
+
+class Viewport:
+    # A window of the grid drawn as columns x rows tiles of tile x tile cells,
+    # starting at (x_min, y_min). At tile 1 every cell is drawn in full;
+    # above it each tile shows how many cars it holds.
+    def __init__(
+        self,
+        size_x: int,
+        size_y: int,
+        center_x: int | None = None,
+        center_y: int | None = None,
+        tile: int = 1,
+        max_tiles: int = MAX_TILES,
+    ):
+        if tile < 1 or max_tiles < 1:
+            raise ValueError("Viewport tile and tile count must be positive")
+        self.size_x, self.size_y = size_x, size_y
+        self.tile = tile
+        self.columns = min(max_tiles, -(-size_x // tile))
+        self.rows = min(max_tiles, -(-size_y // tile))
+        self.x_min = self._origin(center_x, size_x, self.columns)
+        self.y_min = self._origin(center_y, size_y, self.rows)
+
+    @classmethod
+    def fit(cls, size_x: int, size_y: int, max_tiles: int = MAX_TILES) -> "Viewport":
+        # The smallest tile that shows the whole grid.
+        tile = max(1, -(-max(size_x, size_y) // max_tiles))
+        return cls(size_x, size_y, tile=tile, max_tiles=max_tiles)
+
+    def _origin(self, center: int | None, size: int, tiles: int) -> int:
+        span = tiles * self.tile
+        if center is None:
+            center = size // 2
+        # Kept on the grid, so panning past an edge stops at it.
+        return max(0, min(center - span // 2, size - span))
+
+    @property
+    def detailed(self) -> bool:
+        return self.tile == 1
+
+    @property
+    def x_max(self) -> int:
+        return min(self.x_min + self.columns * self.tile, self.size_x) - 1
+
+    @property
+    def y_max(self) -> int:
+        return min(self.y_min + self.rows * self.tile, self.size_y) - 1
+
+    def tile_starts(self) -> tuple[list[int], list[int]]:
+        # The first cell of each column and of each row, for axis labels.
+        return (
+            [self.x_min + column * self.tile for column in range(self.columns)],
+            [self.y_min + row * self.tile for row in range(self.rows)],
+        )
+
+    def cells(self, grid) -> dict[tuple[int, int], str]:
+        # The cars in view by cell. Where cars share a cell the first one
+        # added is kept, as the full grid view did.
+        cells = {}
+        for car_id in grid.cars_in_rect(self.x_min, self.y_min, self.x_max, self.y_max):
+            car = grid.cars[car_id]
+            cells.setdefault((car.x, car.y), car_id)
+        return cells
+
+    def car_counts(self, grid) -> list[list[int]]:
+        # Cars per tile as counts[row][column], from the spatial index.
+        return grid.tile_counts(
+            self.x_min, self.y_min, self.columns, self.rows, self.tile
+        )
+
+    def tile_sums(self, counts: np.ndarray) -> np.ndarray:
+        # Per-cell counts indexed [y, x], summed over each tile in view.
+        window = np.zeros(
+            (self.rows * self.tile, self.columns * self.tile), dtype=counts.dtype
+        )
+        view = counts[self.y_min : self.y_max + 1, self.x_min : self.x_max + 1]
+        window[: view.shape[0], : view.shape[1]] = view
+        return window.reshape(self.rows, self.tile, self.columns, self.tile).sum(
+            axis=(1, 3)
+        )
@@ -0,0 +1,100 @@
+import argparse
+import logging
+import sys
+
+from application.batch_simulation import BatchSimulation
+from application.compressed_io import open_input, open_output, write_ndjson
+from application.input_parser import parse_input
+from application.result_cache import ResultCache
+from application.results import format_result
+from settings import settings
+
+
+def load_scenarios(paths: list[str]) -> tuple[list, dict]:
+    scenarios = []
+    errors = {}
+    for index, path in enumerate(paths):
+        try:
+            with open_input(path) as file:
+                scenarios.append(parse_input(file.read()))
+        except (OSError, ValueError) as e:
+            errors[index] = {"error": str(e)}
+            scenarios.append(None)
+    return scenarios, errors
+
+
+def run_batch(paths: list[str], cache=None) -> list[dict]:
+    scenarios, results = load_scenarios(paths)
+    if cache is not None:
+        for index, scenario in enumerate(scenarios):
+            if scenario is not None and index not in results:
+                cached = cache.lookup(*scenario)
+                if cached is not None:
+                    results[index] = cached
+
+    pending = [index for index in range(len(paths)) if index not in results]
+    batch = BatchSimulation([scenarios[index] for index in pending])
+    for row, (index, result) in enumerate(zip(pending, batch.run())):
+        results[index] = result
+        if cache is not None:
+            cache.store(*scenarios[index], result, batch.final_positions(row))
+
+    return [results[index] for index in range(len(paths))]
+
+
+def write_results(paths: list[str], results: list[dict], output=None) -> None:
+    # As text on stdout, or one JSON object per input to output, compressed
+    # by its suffix.
+    if output is None:
+        for path, result in zip(paths, results):
+            print(f"==> {path} <==")
+            print(format_result(result))
+        return
+
+    from application.service import to_response
+
+    with open_output(output) as file:
+        write_ndjson(
+            file,
+            (
+                {"input": path, **to_response(result)}
+                for path, result in zip(paths, results)
+            ),
+        )
+
+
+def main():
+    logging.basicConfig(
+        level=getattr(logging, settings.log_level.upper()),
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%H:%M:%S",
+    )
+
+    parser = argparse.ArgumentParser(prog="batch.py")
+    parser.add_argument("input_files", nargs="*")
+    parser.add_argument("--cache-dir", help="Reuse results of identical scenarios")
+    parser.add_argument("--cache-max-mb", type=int, default=256)
+    parser.add_argument(
+        "--ndjson",
+        metavar="PATH",
+        help="Write results as NDJSON here; .gz, .bz2 or .xz compress it",
+    )
+    args = parser.parse_args()
+
+    paths = args.input_files
+    if not paths:
+        print("ERROR: Missing input files!")
+        print(
+            "Usage: python batch.py [--cache-dir DIR] <input_file> [<input_file> ...]"
+        )
+        sys.exit(1)
+
+    cache = None
+    if args.cache_dir:
+        cache = ResultCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+
+    write_results(paths, run_batch(paths, cache), args.ndjson)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import itertools
+import json
+import socket
+import sys
+
+
+class SimulationClient:
+    def __init__(self, socket_path=None, host="127.0.0.1", port=8765, timeout=30):
+        if socket_path:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.settimeout(timeout)
+            self._socket.connect(socket_path)
+        else:
+            self._socket = socket.create_connection((host, port), timeout=timeout)
+        self._file = self._socket.makefile("rb")
+        self._ids = itertools.count()
+
+    def close(self) -> None:
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def request(self, request: dict) -> dict:
+        request = {"id": next(self._ids), **request}
+        self._socket.sendall(json.dumps(request).encode() + b"\n")
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Simulation service closed the connection")
+        return json.loads(line)
+
+    def simulate(self, input_text: str) -> dict:
+        return self.request({"input": input_text})
+
+    def simulate_scenario(self, grid_size_x: int, grid_size_y: int, cars) -> dict:
+        return self.request(
+            {"scenario": {"grid": [grid_size_x, grid_size_y], "cars": cars}}
+        )
+
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python client.py <input_file> [<unix_socket_path>]")
+        sys.exit(1)
+
+    with open(sys.argv[1], "r") as file:
+        input_text = file.read()
+
+    socket_path = sys.argv[2] if len(sys.argv) == 3 else None
+    with SimulationClient(socket_path=socket_path) as client:
+        print(client.simulate(input_text)["output"])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,3 @@
+from .collision_policy import CollisionPolicy
 from .commands import Command
 from .directions import Direction, DirectionMap
@@ -0,0 +1,6 @@
+from enum import Enum
+
+
+class CollisionPolicy(Enum):
+    FREEZE = "freeze"
+    REMOVE = "remove"
@@ -0,0 +1,48 @@
+import argparse
+import sys
+
+from application.compressed_io import compression_for, open_output
+from application.parallel_parser import parse_file
+from application.scenario_file import ScenarioFile, is_scenario_file, mappable
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="convert.py",
+        description="Convert a scenario between the text input format and the "
+        "binary scenario format; the direction follows the input file. gzip, "
+        "bz2 and xz inputs are read as they are, and text output is "
+        "compressed by its suffix.",
+    )
+    parser.add_argument("input_file")
+    parser.add_argument("output_file")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Processes parsing a text input, one per core by default",
+    )
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    try:
+        if is_scenario_file(args.input_file):
+            with (
+                mappable(args.input_file) as path,
+                open_output(args.output_file) as file,
+            ):
+                ScenarioFile(path).write_text(file)
+        elif compression_for(args.output_file) is not None:
+            raise ValueError(
+                "Binary scenarios are mapped, so they are written uncompressed"
+            )
+        else:
+            parse_file(args.input_file, args.workers).write(args.output_file)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import logging
+import sys
+
+from application.cluster import Coordinator
+from batch import load_scenarios, write_results
+from settings import settings
+
+
+def run_cluster(paths: list[str], coordinator: Coordinator, split=False) -> list[dict]:
+    scenarios, results = load_scenarios(paths)
+    pending = [index for index in range(len(paths)) if index not in results]
+    if split:
+        for index in pending:
+            results[index] = coordinator.run_split(scenarios[index])
+    else:
+        ran = coordinator.run([scenarios[index] for index in pending])
+        results.update(zip(pending, ran))
+    return [results[index] for index in range(len(paths))]
+
+
+def main():
+    logging.basicConfig(
+        level=getattr(logging, settings.log_level.upper()),
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%H:%M:%S",
+    )
+
+    parser = argparse.ArgumentParser(prog="coordinator.py")
+    parser.add_argument("input_files", nargs="*")
+    parser.add_argument(
+        "--node",
+        action="append",
+        default=[],
+        help="host:port of a simulation service; repeat for every worker node",
+    )
+    parser.add_argument("--unit-size", type=int, default=64)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument(
+        "--ndjson",
+        metavar="PATH",
+        help="Write results as NDJSON here; .gz, .bz2 or .xz compress it",
+    )
+    parser.add_argument(
+        "--split",
+        action="store_true",
+        help="Run each file's independent car groups on the nodes",
+    )
+    args = parser.parse_args()
+
+    paths = args.input_files
+    if not paths or not args.node:
+        print("ERROR: Missing input files or worker nodes!")
+        print(
+            "Usage: python coordinator.py --node HOST:PORT [--node HOST:PORT ...] "
+            "[--split] <input_file> [<input_file> ...]"
+        )
+        sys.exit(1)
+
+    coordinator = Coordinator(args.node, args.unit_size, args.retries, args.timeout)
+    write_results(paths, run_cluster(paths, coordinator, args.split), args.ndjson)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,25 @@
-from .car import Car
-from .grid import Grid
-from .interfaces import CommandParser, MovementStrategy
+# Exports resolve lazily so that importing a light submodule (for example
+# domain.kernel on the CLI fast path) does not pull in pydantic.
+_EXPORTS = {
+    "Car": ".car",
+    "CollisionTable": ".collisions",
+    "CommandProgram": ".command_store",
+    "CommandStore": ".command_store",
+    "Grid": ".grid",
+    "CommandParser": ".interfaces",
+    "MovementStrategy": ".interfaces",
+    "SpatialIndex": ".spatial_index",
+    "StepView": ".step_view",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -1,3 +1,5 @@
+from collections.abc import Sequence
+
 from pydantic import BaseModel, ConfigDict, PrivateAttr, field_validator
 
 from constants import Command, Direction
@@ -14,7 +16,7 @@ class Car(BaseModel):
     command_parser: CommandParser
     forward_strategy: MovementStrategy
     turn_strategy: MovementStrategy
-    _commands: list[Command] = PrivateAttr(default_factory=list)
+    _commands: Sequence[Command] = PrivateAttr(default_factory=list)
 
     @field_validator("x", "y")
     def must_be_non_negative(cls, value):
@@ -28,18 +30,38 @@ class Car(BaseModel):
             raise ValueError("Invalid direction")
         return value
 
+    @classmethod
+    def trusted_construct(cls, **values) -> "Car":
+        # Skips validation entirely, even the lighter model_construct path;
+        # callers must pass already-validated field values.
+        car = cls.__new__(cls)
+        object.__setattr__(car, "__dict__", values)
+        object.__setattr__(car, "__pydantic_fields_set__", set(values))
+        object.__setattr__(car, "__pydantic_extra__", None)
+        object.__setattr__(car, "__pydantic_private__", {"_commands": []})
+        return car
+
     @property
     def position(self) -> tuple[int, int]:
         return (self.x, self.y)
 
+    @property
+    def program(self) -> Sequence[Command]:
+        return self._commands
+
     @property
     def movement_vector(self) -> tuple[int, int]:
         return self.direction.value
 
     def add_commands(self, command_string: str) -> None:
         parsed_commands = self.command_parser.parse(command_string)
+        if not isinstance(self._commands, list):
+            self._commands = list(self._commands)
         self._commands.extend(parsed_commands)
 
+    def load_program(self, program: Sequence[Command]) -> None:
+        self._commands = program
+
     def get_next_command(self, current_step: int) -> Command:
         if current_step < len(self._commands):
             return self._commands[current_step]
@@ -0,0 +1,40 @@
+from array import array
+from collections.abc import Sequence
+
+
+class CollisionTable(Sequence):
+    # Columnar record of every collision in a run: one row per collided cell
+    # and step, with the car ids of each row packed behind car_offsets.
+    def __init__(self):
+        self.steps = array("i")
+        self.xs = array("i")
+        self.ys = array("i")
+        self.car_offsets = array("q", [0])
+        self.car_ids = []
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("collision index out of range")
+        start, end = self.car_offsets[row], self.car_offsets[row + 1]
+        return {
+            "step": self.steps[row],
+            "position": (self.xs[row], self.ys[row]),
+            "cars": self.car_ids[start:end],
+        }
+
+    def __repr__(self) -> str:
+        return f"CollisionTable({list(self)!r})"
+
+    def append(self, step: int, x: int, y: int, car_ids: list[str]) -> None:
+        self.steps.append(step)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.car_ids.extend(car_ids)
+        self.car_offsets.append(len(self.car_ids))
@@ -0,0 +1,339 @@
+import mmap
+import struct
+from array import array
+from bisect import bisect_right
+from collections.abc import Sequence
+from typing import Iterable
+
+from constants import Command
+
+CODE_COMMANDS = (Command.F, Command.L, Command.R)
+COMMAND_CODES = {command: code for code, command in enumerate(CODE_COMMANDS)}
+TEXT_CODES = bytes.maketrans(b"FLR", b"\x00\x01\x02")
+NON_COMMAND_BYTES = bytes(b for b in range(256) if b not in b"FLR")
+CODE_TEXT = bytes.maketrans(b"\x00\x01\x02", b"FLR")
+
+STORE_MAGIC = b"GICCMDS1"
+STORE_HEADER = struct.Struct("<8sQ")
+
+
+# Characters that only appear in run-length programs such as "F1000(FFR)50".
+RUN_LENGTH_CHARS = frozenset("0123456789()")
+
+
+def encode_commands(commands: str | Iterable[Command]) -> bytes:
+    if isinstance(commands, str):
+        return commands.encode().translate(TEXT_CODES, NON_COMMAND_BYTES)
+    if isinstance(commands, RunLengthProgram):
+        return commands.to_bytes()
+    return bytes(COMMAND_CODES[command] for command in commands)
+
+
+def command_text(commands: str | Iterable[Command]) -> str:
+    # The plain "FLR" text of a program, for engines that step over text.
+    if isinstance(commands, str):
+        return commands
+    return encode_commands(commands).translate(CODE_TEXT).decode()
+
+
+def is_run_length(text: str) -> bool:
+    return not RUN_LENGTH_CHARS.isdisjoint(text)
+
+
+def parse_run_length(text: str) -> "RunLengthProgram":
+    # Commands, each optionally followed by a repeat count, and groups in
+    # parentheses that may be repeated and nested: "F1000", "(FFR)50L".
+    # Top-level items stay compressed; a group is expanded once into the
+    # pattern that is repeated.
+    segments, stack, position = [], [], 0
+    while position < len(text):
+        char = text[position]
+        position += 1
+        if char == "(":
+            stack.append(segments)
+            segments = []
+            continue
+        if char == ")":
+            if not stack:
+                raise ValueError(f"Unmatched ')' in '{text}'")
+            pattern = b"".join(code * repeats for code, repeats in segments)
+            if not pattern:
+                raise ValueError(f"Empty group in '{text}'")
+            segments = stack.pop()
+        elif char in "FLR":
+            pattern = bytes([COMMAND_CODES[Command[char]]])
+        elif char.isspace():
+            continue
+        else:
+            raise ValueError(
+                f"Invalid command '{char}' in '{text}'. Commands must contain "
+                "only F, L, R, repeat counts and parentheses"
+            )
+
+        end = position
+        while end < len(text) and text[end].isdigit():
+            end += 1
+        repeats = int(text[position:end]) if end > position else 1
+        if repeats <= 0:
+            raise ValueError(f"Repeat count must be positive in '{text}'")
+        position = end
+        segments.append((pattern, repeats))
+
+    if stack:
+        raise ValueError(f"Unmatched '(' in '{text}'")
+    return RunLengthProgram(segments)
+
+
+class CommandProgram(Sequence):
+    __slots__ = ("_store", "_start", "_length")
+
+    def __init__(self, store: "CommandStore", start: int, length: int):
+        self._store = store
+        self._start = start
+        self._length = length
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, step):
+        if isinstance(step, slice):
+            return [self[i] for i in range(*step.indices(self._length))]
+        if step < 0:
+            step += self._length
+        if not 0 <= step < self._length:
+            raise IndexError("command index out of range")
+        return CODE_COMMANDS[self._store._buffer[self._start + step]]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f"CommandProgram({list(self)!r})"
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._store._buffer[self._start : self._start + self._length])
+
+    def window(self, start: int, stop: int | None = None) -> bytes:
+        # Codes of commands start:stop, copying only those.
+        stop = self._length if stop is None else min(stop, self._length)
+        return bytes(self._store._buffer[self._start + start : self._start + stop])
+
+
+class RunLengthProgram(Sequence):
+    # A program as segments (pattern, repeats): pattern is command codes run
+    # repeats times in a row. "F1000(FFR)50" is (b"\0", 1000), (b"\0\0\2", 50)
+    # whatever its expanded length. Lookups start from the segment of the
+    # previous one, so stepping through the program never searches.
+    __slots__ = ("_segments", "_starts", "_length", "_cursor")
+
+    def __init__(self, segments: Iterable[tuple[bytes, int]]):
+        self._segments = [
+            (bytes(pattern), repeats)
+            for pattern, repeats in segments
+            if pattern and repeats > 0
+        ]
+        self._starts = []
+        self._length = 0
+        for pattern, repeats in self._segments:
+            self._starts.append(self._length)
+            self._length += len(pattern) * repeats
+        self._cursor = 0
+
+    @classmethod
+    def compress(cls, commands: str | Iterable[Command]) -> "RunLengthProgram":
+        # Runs of the same command as single segments.
+        segments = []
+        for code in encode_commands(commands):
+            if segments and segments[-1][0][0] == code:
+                segments[-1][1] += 1
+            else:
+                segments.append([bytes([code]), 1])
+        return cls(segments)
+
+    @property
+    def segments(self) -> list[tuple[bytes, int]]:
+        return self._segments
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, step):
+        if isinstance(step, slice):
+            return [self[i] for i in range(*step.indices(self._length))]
+        if step < 0:
+            step += self._length
+        if not 0 <= step < self._length:
+            raise IndexError("command index out of range")
+
+        segment = self._cursor
+        if not self._starts[segment] <= step < self._end(segment):
+            segment += 1
+            if segment == len(self._starts) or not (
+                self._starts[segment] <= step < self._end(segment)
+            ):
+                segment = bisect_right(self._starts, step) - 1
+            self._cursor = segment
+        pattern = self._segments[segment][0]
+        return CODE_COMMANDS[pattern[(step - self._starts[segment]) % len(pattern)]]
+
+    def _end(self, segment: int) -> int:
+        if segment + 1 < len(self._starts):
+            return self._starts[segment + 1]
+        return self._length
+
+    def __iter__(self):
+        for pattern, repeats in self._segments:
+            commands = [CODE_COMMANDS[code] for code in pattern]
+            for _ in range(repeats):
+                yield from commands
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, RunLengthProgram) and self._segments == other._segments:
+            return True
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f"RunLengthProgram({self.to_text()!r})"
+
+    def count(self, command: Command) -> int:
+        code = COMMAND_CODES[command]
+        return sum(pattern.count(code) * repeats for pattern, repeats in self._segments)
+
+    def after(self, step: int) -> "RunLengthProgram":
+        # The program from step on, still compressed.
+        segments = []
+        for (pattern, repeats), start in zip(self._segments, self._starts):
+            end = start + len(pattern) * repeats
+            if end <= step:
+                continue
+            if start < step:
+                skipped, offset = divmod(step - start, len(pattern))
+                if offset:
+                    segments.append((pattern[offset:], 1))
+                    skipped += 1
+                repeats -= skipped
+                if not repeats:
+                    continue
+            segments.append((pattern, repeats))
+        return RunLengthProgram(segments)
+
+    def window(self, start: int, stop: int | None = None) -> "RunLengthProgram":
+        # Commands start:stop, still compressed.
+        program = self.after(start)
+        if stop is None or stop - start >= len(program):
+            return program
+        segments, left = [], max(0, stop - start)
+        for pattern, repeats in program.segments:
+            if not left:
+                break
+            whole = min(repeats, left // len(pattern))
+            if whole:
+                segments.append((pattern, whole))
+                left -= whole * len(pattern)
+            if whole < repeats and left:
+                segments.append((pattern[:left], 1))
+                left = 0
+        return RunLengthProgram(segments)
+
+    def to_bytes(self) -> bytes:
+        return b"".join(pattern * repeats for pattern, repeats in self._segments)
+
+    def to_text(self) -> str:
+        # The compact form that parse_run_length reads back.
+        parts = []
+        for pattern, repeats in self._segments:
+            text = pattern.translate(CODE_TEXT).decode()
+            if len(text) > 1:
+                text = f"({text})"
+            parts.append(text if repeats == 1 else f"{text}{repeats}")
+        return "".join(parts)
+
+
+class CommandStore:
+    def __init__(self, buffer=None, offsets=None):
+        self._buffer = bytearray() if buffer is None else buffer
+        self._offsets = array("q", [0]) if offsets is None else offsets
+        self._path = None
+        self._mmap = None
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._buffer) + self._offsets.itemsize * len(self._offsets)
+
+    @property
+    def read_only(self) -> bool:
+        return not isinstance(self._buffer, bytearray)
+
+    def append(self, commands: str | Iterable[Command]) -> int:
+        if self.read_only:
+            raise ValueError("Cannot append to a shared command store")
+        self._buffer += encode_commands(commands)
+        self._offsets.append(len(self._buffer))
+        return len(self) - 1
+
+    def program_length(self, index: int) -> int:
+        return self._offsets[index + 1] - self._offsets[index]
+
+    def program(self, index: int) -> CommandProgram:
+        start = self._offsets[index]
+        return CommandProgram(self, start, self._offsets[index + 1] - start)
+
+    def command_at(self, index: int, step: int) -> Command | None:
+        position = self._offsets[index] + step
+        if step < 0 or position >= self._offsets[index + 1]:
+            return None
+        return CODE_COMMANDS[self._buffer[position]]
+
+    def save(self, path) -> None:
+        with open(path, "wb") as file:
+            file.write(STORE_HEADER.pack(STORE_MAGIC, len(self)))
+            file.write(self._offsets.tobytes())
+            file.write(self._buffer)
+
+    @classmethod
+    def open(cls, path) -> "CommandStore":
+        with open(path, "rb") as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count = STORE_HEADER.unpack_from(mapped)
+        if magic != STORE_MAGIC:
+            mapped.close()
+            raise ValueError(f"'{path}' is not a command store file")
+
+        view = memoryview(mapped)
+        offsets_start = STORE_HEADER.size
+        buffer_start = offsets_start + 8 * (count + 1)
+        store = cls(
+            buffer=view[buffer_start:],
+            offsets=view[offsets_start:buffer_start].cast("q"),
+        )
+        store._path = path
+        store._mmap = mapped
+        return store
+
+    def share(self) -> "CommandStore":
+        # Moves the programs into an anonymous shared mapping in place, so
+        # forked workers read the same pages instead of copying them.
+        if self._mmap is not None:
+            return self
+        size = len(self._buffer)
+        mapped = mmap.mmap(-1, max(size, 1))
+        mapped[:size] = self._buffer
+        self._buffer = memoryview(mapped)[:size].toreadonly()
+        self._mmap = mapped
+        return self
+
+    def __reduce__(self):
+        if self._path is not None:
+            return (CommandStore.open, (self._path,))
+        return (
+            CommandStore,
+            (bytearray(self._buffer), array("q", self._offsets)),
+        )
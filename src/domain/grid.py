@@ -1,20 +1,41 @@
+import heapq
 import logging
+import time
+from collections.abc import Sequence
+from itertools import repeat
+from typing import Iterable, Iterator
 
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
 
-from constants import Direction
+from constants import CollisionPolicy, Command, Direction
 from settings import settings
 
 from .car import Car
+from .collisions import CollisionTable
+from .command_store import (
+    CommandProgram,
+    CommandStore,
+    RunLengthProgram,
+    encode_commands,
+)
+from .metrics import Metrics, get_metrics
 from .movement_strategies import ForwardMovementStrategy, TurnMovementStrategy
+from .occupancy import SparseOccupancy, occupancy_for
 from .parser import SimpleCommandParser
+from .spatial_index import SpatialIndex
+from .step_view import StepView
+from .trajectory import Trajectory, TrajectoryMemo, compute_program_trajectory
 
 
 class Grid(BaseModel):
-    size_x: int = settings.max_grid_size_x
-    size_y: int = settings.max_grid_size_y
+    size_x: int = Field(default_factory=lambda: settings.max_grid_size_x)
+    size_y: int = Field(default_factory=lambda: settings.max_grid_size_y)
     cars: dict = {}
     current_step: int = 0
+    _command_store: CommandStore = PrivateAttr(default_factory=CommandStore)
+    _spatial_index: SpatialIndex | None = PrivateAttr(default=None)
+    _metrics: Metrics = PrivateAttr(default_factory=get_metrics)
+    _warn_blocked: bool = PrivateAttr(default=True)
 
     @property
     def logger(self):
@@ -36,50 +57,154 @@ class Grid(BaseModel):
             raise ValueError(f"Grid size_y cannot exceed {settings.max_grid_size_y}")
         return value
 
+    @property
+    def command_store(self) -> CommandStore:
+        return self._command_store
+
+    @property
+    def metrics(self) -> Metrics:
+        # The process-wide metrics unless a Simulation gives the grid its own.
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, metrics: Metrics) -> None:
+        self._metrics = metrics
+
+    @property
+    def warn_blocked(self) -> bool:
+        # Whether joined runs log each move rejected at the edge.
+        return self._warn_blocked
+
+    @warn_blocked.setter
+    def warn_blocked(self, warn_blocked: bool) -> None:
+        self._warn_blocked = warn_blocked
+
+    @property
+    def spatial_index(self) -> SpatialIndex:
+        # Built on the first query, then kept up to date by the Grid methods
+        # that add, remove or move cars.
+        if self._spatial_index is None:
+            self._spatial_index = SpatialIndex.build(self.cars)
+        return self._spatial_index
+
+    def reindex(self) -> None:
+        # Needed after changing self.cars or car positions directly.
+        self._spatial_index = None
+
+    def cars_in_rect(self, x_min: int, y_min: int, x_max: int, y_max: int) -> list[str]:
+        return self.spatial_index.in_rect(x_min, y_min, x_max, y_max)
+
+    def cars_near(self, x: int, y: int, radius: float) -> list[str]:
+        return self.spatial_index.near(x, y, radius)
+
+    def tile_counts(
+        self, x_min: int, y_min: int, columns: int, rows: int, tile: int
+    ) -> list[list[int]]:
+        return self.spatial_index.tile_counts(x_min, y_min, columns, rows, tile)
+
     def is_within_bounds(self, x, y):
         return 0 <= x < self.size_x and 0 <= y < self.size_y
 
     def add_car(
         self, id: str, x: int, y: int, direction: Direction, commands: str
     ) -> None:
-        if len(self.cars.keys()) >= self.size_x * self.size_y:
-            raise ValueError("Cannot add more cars than the grid can hold")
-
-        for car_id, car in self.cars.items():
-            if car.position == (x, y):
-                raise ValueError(
-                    f"Position ({x}, {y}) is already occupied by car {car_id}"
-                )
-
-        if id in self.cars.keys():
-            raise ValueError(f"Car with id '{id}' already exists")
+        self.add_cars([(id, x, y, direction, commands)])
 
-        if not self.is_within_bounds(x, y):
-            raise ValueError(
-                f"Car position ({x}, {y}) is out of bounds on grid size {self.size_x}x{self.size_y}"
-            )
+    def add_cars(self, cars: Iterable[tuple], trusted: bool = False) -> None:
+        cars = list(cars)
+        if not trusted:
+            self.validate_cars(cars)
 
         command_parser = SimpleCommandParser()
         forward_strategy = ForwardMovementStrategy()
         turn_strategy = TurnMovementStrategy()
+        build_car = Car.trusted_construct if trusted else Car
+
+        for id, x, y, direction, commands in cars:
+            car_obj = build_car(
+                x=x,
+                y=y,
+                direction=direction,
+                command_parser=command_parser,
+                forward_strategy=forward_strategy,
+                turn_strategy=turn_strategy,
+            )
+            car_obj.load_program(self._program_for(commands))
+            self.cars[id] = car_obj
+            if self._spatial_index is not None:
+                self._spatial_index.insert(id, x, y)
 
-        car_obj = Car(
-            x=x,
-            y=y,
-            direction=direction,
-            command_parser=command_parser,
-            forward_strategy=forward_strategy,
-            turn_strategy=turn_strategy,
+    def _program_for(self, commands: str | Sequence[Command]) -> Sequence[Command]:
+        if not isinstance(commands, str):
+            return commands
+        return self._command_store.program(self._command_store.append(commands))
+
+    def validate_cars(self, cars: list[tuple]) -> None:
+        capacity = self.size_x * self.size_y
+        occupancy = self.occupancy(len(self.cars) + len(cars))
+        for car in self.cars.values():
+            occupancy.add(occupancy.index(car.x, car.y))
+        ids = set(self.cars)
+
+        xs = [car[1] for car in cars]
+        ys = [car[2] for car in cars]
+        in_bounds = (
+            not cars
+            or min(xs) >= 0
+            and max(xs) < self.size_x
+            and min(ys) >= 0
+            and max(ys) < self.size_y
         )
-        car_obj.add_commands(commands)
-        self.cars[id] = car_obj
+
+        for count, (id, x, y, _, _) in enumerate(cars, start=len(self.cars)):
+            if count >= capacity:
+                raise ValueError("Cannot add more cars than the grid can hold")
+
+            inside = in_bounds or self.is_within_bounds(x, y)
+            if inside and occupancy.add(occupancy.index(x, y)) > 1:
+                raise ValueError(
+                    f"Position ({x}, {y}) is already occupied by car {self._occupant(cars, x, y)}"
+                )
+
+            if id in ids:
+                raise ValueError(f"Car with id '{id}' already exists")
+
+            if not inside:
+                raise ValueError(
+                    f"Car position ({x}, {y}) is out of bounds on grid size {self.size_x}x{self.size_y}"
+                )
+
+            ids.add(id)
+
+    def _occupant(self, cars: list[tuple], x: int, y: int) -> str:
+        for car_id, car in self.cars.items():
+            if car.position == (x, y):
+                return car_id
+        for car in cars:
+            if (car[1], car[2]) == (x, y):
+                return car[0]
+
+    def occupancy(self, car_count: int | None = None) -> SparseOccupancy:
+        if car_count is None:
+            car_count = len(self.cars)
+        return occupancy_for(self.size_x, self.size_y, car_count)
 
     def remove_car(self, id: str) -> None:
         if id not in self.cars:
             raise ValueError(f"Car with id '{id}' does not exist")
         del self.cars[id]
+        if self._spatial_index is not None:
+            self._spatial_index.remove(id)
 
     def check_collisions(self):
+        occupancy = self.occupancy()
+        if all(
+            occupancy.add(occupancy.index(car.x, car.y)) == 1
+            for car in self.cars.values()
+        ):
+            self.logger.debug("No collisions detected")
+            return {"collision": False}
+
         positions = {}
         for car_id, car in self.cars.items():
             pos = car.position
@@ -105,27 +230,296 @@ class Grid(BaseModel):
         return {"collision": False}
 
     def next_step(self) -> None:
+        started = time.perf_counter()
+        logger = logging.getLogger(__name__)
+        debug = logger.isEnabledFor(logging.DEBUG)
+        active = blocked = 0
         for car_id, car in self.cars.items():
             command = car.get_next_command(self.current_step)
             if command is None:
-                logging.getLogger(__name__).debug(
-                    f"Car {car_id} has no more commands to execute"
-                )
+                if debug:
+                    logger.debug(f"Car {car_id} has no more commands to execute")
                 continue
+            active += 1
             new_x, new_y, new_direction = car.calculate_command(command)
             if self.is_within_bounds(new_x, new_y):
                 car.move(command)
-                logging.getLogger(__name__).debug(
-                    f"Executing command {command} for car {car_id} at step {self.current_step}"
-                )
-                logging.getLogger(__name__).debug(
-                    f"Car {car_id} moved to ({new_x}, {new_y}) facing {new_direction}"
-                )
+                if self._spatial_index is not None:
+                    self._spatial_index.move(car_id, new_x, new_y)
+                if debug:
+                    logger.debug(
+                        f"Executing command {command} for car {car_id} at step {self.current_step}"
+                    )
+                    logger.debug(
+                        f"Car {car_id} moved to ({new_x}, {new_y}) facing {new_direction}"
+                    )
             else:
-                logging.getLogger(__name__).warning(
+                blocked += 1
+                logger.warning(
                     f"Car {car_id} cannot move to ({new_x}, {new_y}) - out of bounds"
                 )
 
         self.current_step += 1
 
-        return self.check_collisions()
+        collision_result = self.check_collisions()
+        recorder = self._metrics.recorder()
+        recorder.step(active, len(self.cars), time.perf_counter() - started)
+        recorder.flush(blocked, active)
+        return collision_result
+
+    def run_trajectories(self, steps: int, memo: TrajectoryMemo) -> dict:
+        # Same outcome as calling next_step up to steps times and stopping at
+        # the first collision, but joins memoized per-car trajectories.
+        return self.join_trajectories(self.trajectories(memo), steps)
+
+    def trajectories(
+        self, memo: TrajectoryMemo, steps: int | None = None
+    ) -> list[Trajectory]:
+        return [self.trajectory(car, memo, steps) for car in self.cars.values()]
+
+    def trajectory(
+        self, car: Car, memo: TrajectoryMemo, steps: int | None = None
+    ) -> Trajectory:
+        # Covers the rest of the car's program, or only its next steps. Such
+        # a window is not memoized: holding every window of a long program
+        # would hold its whole path again.
+        pose = (car.x, car.y, car.direction)
+        program = self._remaining_program(car, steps)
+        if steps is None:
+            return memo.trajectory(*pose, program, self.size_x, self.size_y)
+        return compute_program_trajectory(*pose, program, self.size_x, self.size_y)
+
+    def join_trajectories(
+        self, trajectories: list[Trajectory], steps: int, first_step: int = 1
+    ) -> dict:
+        collision_result = {"collision": False}
+        for view in self.iter_trajectories(
+            trajectories, steps, first_step, False, every_step=False
+        ):
+            if view.collision is not None:
+                collision_result = view.collision
+        return collision_result
+
+    def iter_trajectories(
+        self,
+        trajectories: list[Trajectory],
+        steps: int,
+        first_step: int = 1,
+        sync: bool = True,
+        every_step: bool = True,
+    ) -> Iterator[StepView]:
+        # The stepping loop: yields a StepView per step up to steps, stopping
+        # after the first collision. Steps before first_step must already be
+        # known to be collision-free. With sync the grid is at the step just
+        # yielded; otherwise cars are only moved once the iterator is
+        # exhausted or closed, and at a collision. Without every_step, steps
+        # at which no car can change cell are passed over without a view.
+        car_ids = list(self.cars)
+        cars = list(self.cars.items())
+        start = self.current_step
+        order = sorted(range(len(trajectories)), key=lambda i: -len(trajectories[i]))
+        occupancy = self.occupancy(len(trajectories))
+        for trajectory in trajectories:
+            occupancy.add(trajectory.cells[min(first_step, len(trajectory)) - 1])
+
+        # Cars are at synced_step, or at the start when it is None.
+        last = min(first_step - 1, steps)
+        synced_step = None
+        recorder = self._metrics.recorder()
+        active = len(order)
+        try:
+            if sync and last:
+                self._set_states(cars, trajectories, range(len(cars)), last)
+                synced_step = last
+            step = first_step
+            while step <= steps:
+                started = time.perf_counter()
+                while active and len(trajectories[order[active - 1]]) <= step:
+                    active -= 1
+                moves = self._moves(trajectories, order, step)
+                for old, _ in moves:
+                    occupancy.remove(old)
+                collided = False
+                for _, new in moves:
+                    if occupancy.add(new) > 1:
+                        collided = True
+                recorder.step(active, len(moves), time.perf_counter() - started)
+                last = step
+
+                view = StepView(start + step, car_ids, trajectories, order, step)
+                if collided:
+                    self._set_states(cars, trajectories, range(len(cars)), step)
+                    self.current_step = start + step
+                    synced_step = step
+                    view.collision = self.check_collisions()
+                elif sync:
+                    self._set_states(cars, trajectories, view.changed_indices(), step)
+                    self.current_step = start + step
+                    synced_step = step
+                yield view
+                if collided:
+                    return
+                step += 1
+                if not every_step and not moves and step <= steps:
+                    until = self._still_until(trajectories, order, active, step)
+                    until = min(until, steps + 1)
+                    if until > step:
+                        recorder.step(active * (until - step), 0, 0.0, until - step)
+                        step, last = until, until - 1
+            last = steps
+        finally:
+            self._log_blocked(trajectories, [last] * len(trajectories))
+            recorder.flush(
+                self._count_blocked(trajectories, first_step, [last] * len(order)),
+                active,
+            )
+            if synced_step != last and (synced_step is not None or last):
+                self._set_states(cars, trajectories, range(len(cars)), last)
+            self.current_step = start + last
+
+    def collect_collisions(
+        self, trajectories: list[Trajectory], steps: int, policy: CollisionPolicy
+    ) -> CollisionTable:
+        # Keeps stepping past collisions and records all of them. Collided
+        # cars stop where they collided: FREEZE leaves them there as obstacles,
+        # REMOVE takes them off the grid.
+        table = CollisionTable()
+        car_ids = list(self.cars)
+        ends = [steps] * len(trajectories)
+        active = sorted(range(len(trajectories)), key=lambda i: -len(trajectories[i]))
+        frozen = {}
+
+        occupancy = self.occupancy(len(trajectories))
+        for trajectory in trajectories:
+            occupancy.add(trajectory.cells[0])
+
+        recorder = self._metrics.recorder()
+        running = len(active)
+        for step in range(1, steps + 1):
+            started = time.perf_counter()
+            while running and len(trajectories[active[running - 1]]) <= step:
+                running -= 1
+            moves = self._moves(trajectories, active, step)
+            for old, _ in moves:
+                occupancy.remove(old)
+            arrived = {new for _, new in moves if occupancy.add(new) > 1}
+            recorder.step(running, len(moves), time.perf_counter() - started)
+            if not arrived:
+                continue
+
+            cells = {}
+            for i in active:
+                if (
+                    trajectories[i].cells[min(step, len(trajectories[i]) - 1)]
+                    in arrived
+                ):
+                    cells.setdefault(trajectories[i].position(step), []).append(i)
+            rows = sorted(
+                (sorted(frozen.get(cell, []) + indices), cell)
+                for cell, indices in cells.items()
+            )
+
+            collided = set()
+            for indices, (x, y) in rows:
+                table.append(
+                    self.current_step + step, x, y, [car_ids[i] for i in indices]
+                )
+                for i in cells[(x, y)]:
+                    ends[i] = step
+                    collided.add(i)
+                if policy is CollisionPolicy.FREEZE:
+                    frozen[(x, y)] = indices
+                else:
+                    for _ in cells[(x, y)]:
+                        occupancy.remove(occupancy.index(x, y))
+            active = [i for i in active if i not in collided]
+            running = len(active)
+
+        self._log_blocked(trajectories, ends)
+        recorder.flush(self._count_blocked(trajectories, 1, ends), running)
+
+        for car, trajectory, end in zip(self.cars.values(), trajectories, ends):
+            car.x, car.y, car.direction = trajectory.state(end)
+        if policy is CollisionPolicy.REMOVE:
+            removed = set(range(len(trajectories))) - set(active)
+            for i in removed:
+                self.remove_car(car_ids[i])
+        self._sync_spatial_index()
+        self.current_step += steps
+
+        return table
+
+    @staticmethod
+    def _moves(
+        trajectories: list[Trajectory], order: list[int], step: int
+    ) -> list[tuple[int, int]]:
+        # Cell index changes of the cars that move at this step. order is
+        # sorted by trajectory length, longest first, so finished cars are a
+        # suffix that is never scanned.
+        moves = []
+        for i in order:
+            cells = trajectories[i].cells
+            if step >= len(cells):
+                break
+            if cells[step] != cells[step - 1]:
+                moves.append((cells[step - 1], cells[step]))
+        return moves
+
+    @staticmethod
+    def _still_until(
+        trajectories: list[Trajectory], order: list[int], active: int, step: int
+    ) -> int:
+        # The first step from step at which a running car may change cell.
+        until = len(trajectories[order[0]]) if active else step
+        for i in order[:active]:
+            until = min(until, trajectories[i].still_until(step))
+            if until <= step:
+                break
+        return until
+
+    def _set_states(
+        self, cars: list[tuple[str, Car]], trajectories: list[Trajectory], indices, step
+    ) -> None:
+        for i in indices:
+            car_id, car = cars[i]
+            car.x, car.y, car.direction = trajectories[i].state(step)
+            if self._spatial_index is not None:
+                self._spatial_index.move(car_id, car.x, car.y)
+
+    def _sync_spatial_index(self) -> None:
+        if self._spatial_index is not None:
+            for car_id, car in self.cars.items():
+                self._spatial_index.move(car_id, car.x, car.y)
+
+    def _log_blocked(self, trajectories: list[Trajectory], ends: list[int]) -> None:
+        if not self._warn_blocked or not self.logger.isEnabledFor(logging.WARNING):
+            return
+        blocked = heapq.merge(
+            *(
+                zip(trajectory.blocked_steps(end), repeat(index))
+                for index, (trajectory, end) in enumerate(zip(trajectories, ends))
+            ),
+            key=lambda event: (event[0][0], event[1]),
+        )
+        car_ids = list(self.cars)
+        for (_, x, y), index in blocked:
+            self.logger.warning(
+                f"Car {car_ids[index]} cannot move to ({x}, {y}) - out of bounds"
+            )
+
+    @staticmethod
+    def _count_blocked(trajectories: list[Trajectory], first_step, ends) -> int:
+        return sum(
+            trajectory.blocked_count(first_step, end)
+            for trajectory, end in zip(trajectories, ends)
+        )
+
+    def _remaining_program(
+        self, car: Car, steps: int | None = None
+    ) -> bytes | RunLengthProgram:
+        # The rest of the program from the current step, or its next steps.
+        program = car.program
+        stop = None if steps is None else self.current_step + steps
+        if isinstance(program, (CommandProgram, RunLengthProgram)):
+            return program.window(self.current_step, stop)
+        return encode_commands(program[self.current_step : stop])
@@ -0,0 +1,101 @@
+from settings import settings
+
+from .command_store import RunLengthProgram, command_text
+
+# Pydantic-free stepping kernel with the exact semantics of Grid.next_step and
+# Grid.check_collisions, for one-shot runs where model start-up dominates.
+# Directions are clockwise codes so a right turn is +1 and a left turn is -1.
+DIRECTION_CODES = {"N": 0, "E": 1, "S": 2, "W": 3}
+MOVES = ((0, 1), (1, 0), (0, -1), (-1, 0))
+TURNS = {"L": (3, 0, 1, 2), "R": (1, 2, 3, 0)}
+
+
+def load_kernel_cars(grid_size_x: int, grid_size_y: int, cars: list):
+    # Returns None for anything the Grid would reject, so callers can fall
+    # back to the reference path and report its exact error.
+    if not 0 < grid_size_x <= settings.max_grid_size_x:
+        return None
+    if not 0 < grid_size_y <= settings.max_grid_size_y:
+        return None
+
+    car_ids, xs, ys, directions, programs = [], [], [], [], []
+    for car_id, init_state, commands in cars:
+        # Expanding a run-length program could take more memory than the
+        # Simulation, which keeps its trajectory as segments.
+        if isinstance(commands, RunLengthProgram):
+            return None
+        parts = init_state.split()
+        if len(parts) != 3 or parts[2].upper() not in DIRECTION_CODES:
+            return None
+        try:
+            x, y = int(parts[0]), int(parts[1])
+        except ValueError:
+            return None
+        if not (0 <= x < grid_size_x and 0 <= y < grid_size_y):
+            return None
+
+        car_ids.append(car_id)
+        xs.append(x)
+        ys.append(y)
+        directions.append(DIRECTION_CODES[parts[2].upper()])
+        programs.append(
+            "".join(command for command in command_text(commands) if command in "FLR")
+        )
+
+    if len(set(car_ids)) != len(car_ids) or len(set(zip(xs, ys))) != len(xs):
+        return None
+    return car_ids, xs, ys, directions, programs
+
+
+def run_kernel(grid_size_x: int, grid_size_y: int, cars: list) -> dict | None:
+    outcome = kernel_outcome(grid_size_x, grid_size_y, cars)
+    return None if outcome is None else outcome[0]
+
+
+def kernel_outcome(grid_size_x: int, grid_size_y: int, cars: list):
+    # Like run_kernel, but also returns every car's final position.
+    loaded = load_kernel_cars(grid_size_x, grid_size_y, cars)
+    if loaded is None:
+        return None
+
+    car_ids, xs, ys, directions, programs = loaded
+    indices = range(len(car_ids))
+    max_step = max(map(len, programs), default=0)
+
+    for step in range(max_step):
+        moved = False
+        for i in indices:
+            program = programs[i]
+            if step >= len(program):
+                continue
+            command = program[step]
+            if command == "F":
+                dx, dy = MOVES[directions[i]]
+                x, y = xs[i] + dx, ys[i] + dy
+                if 0 <= x < grid_size_x and 0 <= y < grid_size_y:
+                    xs[i], ys[i] = x, y
+                    moved = True
+            else:
+                directions[i] = TURNS[command][directions[i]]
+
+        # Turns alone cannot create a collision the previous step lacked.
+        if not moved:
+            continue
+
+        positions = {}
+        for i in indices:
+            positions.setdefault((xs[i], ys[i]), []).append(car_ids[i])
+        if len(positions) == len(car_ids):
+            continue
+
+        for pos, ids in positions.items():
+            if len(ids) > 1:
+                result = {
+                    "collision": True,
+                    "cars": ids,
+                    "position": pos,
+                    "step": step + 1,
+                }
+                return result, list(zip(xs, ys))
+
+    return {"collision": False}, list(zip(xs, ys))
@@ -0,0 +1,134 @@
+import threading
+from bisect import bisect_left
+from functools import cache
+
+# Upper bounds of the step latency buckets, in seconds; a last bucket
+# catches everything slower.
+LATENCY_BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 1e-1, 1.0)
+COUNTERS = ("steps", "car_steps", "blocked_moves", "collision_probes")
+HELP = {
+    "steps": "Simulation steps executed",
+    "car_steps": "Commands executed, summed over cars",
+    "blocked_moves": "Forward moves rejected at the grid edge",
+    "collision_probes": "Occupancy probes made while checking collisions",
+    "active_cars": "Cars with commands left at the last step executed",
+    "step_latency_seconds": "Time spent executing one step",
+}
+
+
+class StepRecorder:
+    # Accumulates one run's counts without locking; flush() adds them to the
+    # Metrics it came from.
+    __slots__ = (
+        "metrics",
+        "steps",
+        "car_steps",
+        "collision_probes",
+        "latency",
+        "seconds",
+    )
+
+    def __init__(self, metrics: "Metrics"):
+        self.metrics = metrics
+        self.steps = 0
+        self.car_steps = 0
+        self.collision_probes = 0
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.seconds = 0.0
+
+    def step(self, cars: int, probes: int, seconds: float, steps: int = 1) -> None:
+        # Several steps recorded at once each count at their mean latency, so
+        # that the histogram counts as many steps as steps_total.
+        self.steps += steps
+        self.car_steps += cars
+        self.collision_probes += probes
+        self.latency[bisect_left(LATENCY_BUCKETS, seconds / steps)] += steps
+        self.seconds += seconds
+
+    def flush(self, blocked_moves: int = 0, active_cars: int | None = None) -> None:
+        self.metrics.merge(
+            {
+                "steps": self.steps,
+                "car_steps": self.car_steps,
+                "blocked_moves": blocked_moves,
+                "collision_probes": self.collision_probes,
+                "step_latency": self.latency,
+                "step_seconds": self.seconds,
+            },
+            active_cars,
+        )
+        self.steps = self.car_steps = self.collision_probes = 0
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.seconds = 0.0
+
+
+class Metrics:
+    # Counters of the stepping loops. Runs record into a StepRecorder and
+    # merge once at the end, so the loops themselves never take the lock.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            for name in COUNTERS:
+                setattr(self, name, 0)
+            self.active_cars = 0
+            self.step_latency = [0] * (len(LATENCY_BUCKETS) + 1)
+            self.step_seconds = 0.0
+
+    def recorder(self) -> StepRecorder:
+        return StepRecorder(self)
+
+    def merge(self, counts: dict, active_cars: int | None = None) -> None:
+        # counts as returned by snapshot(), e.g. from a worker process.
+        with self._lock:
+            for name in COUNTERS:
+                setattr(self, name, getattr(self, name) + counts.get(name, 0))
+            for bucket, count in enumerate(counts.get("step_latency", ())):
+                self.step_latency[bucket] += count
+            self.step_seconds += counts.get("step_seconds", 0.0)
+            if active_cars is not None:
+                self.active_cars = active_cars
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = {name: getattr(self, name) for name in COUNTERS}
+            counts["active_cars"] = self.active_cars
+            counts["step_latency"] = list(self.step_latency)
+            counts["step_seconds"] = self.step_seconds
+        return counts
+
+    def to_prometheus(self, prefix: str = "car_simulation") -> str:
+        counts = self.snapshot()
+        lines = []
+        for name in COUNTERS:
+            lines += [
+                f"# HELP {prefix}_{name}_total {HELP[name]}",
+                f"# TYPE {prefix}_{name}_total counter",
+                f"{prefix}_{name}_total {counts[name]}",
+            ]
+        lines += [
+            f"# HELP {prefix}_active_cars {HELP['active_cars']}",
+            f"# TYPE {prefix}_active_cars gauge",
+            f"{prefix}_active_cars {counts['active_cars']}",
+        ]
+
+        name = f"{prefix}_step_latency_seconds"
+        lines += [
+            f"# HELP {name} {HELP['step_latency_seconds']}",
+            f"# TYPE {name} histogram",
+        ]
+        cumulative = 0
+        bounds = [repr(bound) for bound in LATENCY_BUCKETS] + ["+Inf"]
+        for bound, count in zip(bounds, counts["step_latency"]):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum {counts['step_seconds']!r}")
+        lines.append(f"{name}_count {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+@cache
+def get_metrics() -> Metrics:
+    return Metrics()
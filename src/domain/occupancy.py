@@ -0,0 +1,66 @@
+# Grids with at least one car per this many cells use the dense backend.
+DENSE_CELLS_PER_CAR = 4
+
+
+class SparseOccupancy:
+    # Car counts of occupied cells only, keyed by y * size_x + x.
+    def __init__(self, size_x: int, size_y: int):
+        self.size_x = size_x
+        self.size_y = size_y
+        self._counts = {}
+
+    def index(self, x: int, y: int) -> int:
+        return y * self.size_x + x
+
+    def count(self, index: int) -> int:
+        return self._counts.get(index, 0)
+
+    def add(self, index: int) -> int:
+        count = self._counts.get(index, 0) + 1
+        self._counts[index] = count
+        return count
+
+    def remove(self, index: int) -> None:
+        count = self._counts[index] - 1
+        if count:
+            self._counts[index] = count
+        else:
+            del self._counts[index]
+
+
+class DenseOccupancy(SparseOccupancy):
+    # One bit per cell; when most cells hold a car this is smaller and faster
+    # than hashing every occupied cell. The few cells holding more than one
+    # car, which FREEZE keeps around, have their counts in a side dict.
+    def __init__(self, size_x: int, size_y: int):
+        self.size_x = size_x
+        self.size_y = size_y
+        self._bits = bytearray((size_x * size_y + 7) >> 3)
+        self._counts = {}
+
+    def count(self, index: int) -> int:
+        if self._bits[index >> 3] >> (index & 7) & 1:
+            return self._counts.get(index, 1)
+        return 0
+
+    def add(self, index: int) -> int:
+        mask = 1 << (index & 7)
+        if self._bits[index >> 3] & mask:
+            count = self._counts.get(index, 1) + 1
+            self._counts[index] = count
+            return count
+        self._bits[index >> 3] |= mask
+        return 1
+
+    def remove(self, index: int) -> None:
+        count = self._counts.pop(index, 1) - 1
+        if count > 1:
+            self._counts[index] = count
+        elif not count:
+            self._bits[index >> 3] &= ~(1 << (index & 7))
+
+
+def occupancy_for(size_x: int, size_y: int, car_count: int) -> SparseOccupancy:
+    if car_count * DENSE_CELLS_PER_CAR >= size_x * size_y:
+        return DenseOccupancy(size_x, size_y)
+    return SparseOccupancy(size_x, size_y)
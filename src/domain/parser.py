@@ -2,16 +2,9 @@ from constants import Command
 
 from .interfaces import CommandParser
 
+COMMAND_LOOKUP = {"F": Command.F, "L": Command.L, "R": Command.R}
+
 
 class SimpleCommandParser(CommandParser):
     def parse(self, command_string: str) -> list[Command]:
-        commands = []
-        for cmd in command_string:
-            if cmd == "F":
-                commands.append(Command.F)
-            elif cmd == "L":
-                commands.append(Command.L)
-            elif cmd == "R":
-                commands.append(Command.R)
-
-        return commands
+        return [COMMAND_LOOKUP[cmd] for cmd in command_string if cmd in COMMAND_LOOKUP]
@@ -0,0 +1,145 @@
+import math
+
+DEFAULT_BUCKET_SIZE = 4
+
+
+class SpatialIndex:
+    # Cars bucketed by bucket_size x bucket_size blocks of cells; a query
+    # only visits the buckets overlapping its area. Results are in the order
+    # cars were inserted, which matches Grid.cars.
+    def __init__(self, bucket_size: int = DEFAULT_BUCKET_SIZE):
+        if bucket_size <= 0:
+            raise ValueError("Bucket size must be a positive integer")
+        self.bucket_size = bucket_size
+        self._buckets = {}
+        self._positions = {}
+        self._ranks = {}
+        self._next_rank = 0
+
+    @classmethod
+    def build(cls, cars: dict, bucket_size: int = DEFAULT_BUCKET_SIZE):
+        index = cls(bucket_size)
+        for car_id, car in cars.items():
+            index.insert(car_id, car.x, car.y)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, car_id) -> bool:
+        return car_id in self._positions
+
+    def _bucket(self, x: int, y: int) -> tuple[int, int]:
+        return x // self.bucket_size, y // self.bucket_size
+
+    def insert(self, car_id: str, x: int, y: int) -> None:
+        if car_id in self._positions:
+            raise ValueError(f"Car with id '{car_id}' is already indexed")
+        self._positions[car_id] = (x, y)
+        self._ranks[car_id] = self._next_rank
+        self._next_rank += 1
+        self._buckets.setdefault(self._bucket(x, y), set()).add(car_id)
+
+    def remove(self, car_id: str) -> None:
+        if car_id not in self._positions:
+            raise ValueError(f"Car with id '{car_id}' is not indexed")
+        bucket = self._bucket(*self._positions.pop(car_id))
+        del self._ranks[car_id]
+        self._buckets[bucket].discard(car_id)
+        if not self._buckets[bucket]:
+            del self._buckets[bucket]
+
+    def move(self, car_id: str, x: int, y: int) -> None:
+        old_bucket = self._bucket(*self._positions[car_id])
+        self._positions[car_id] = (x, y)
+        new_bucket = self._bucket(x, y)
+        if new_bucket != old_bucket:
+            self._buckets[old_bucket].discard(car_id)
+            if not self._buckets[old_bucket]:
+                del self._buckets[old_bucket]
+            self._buckets.setdefault(new_bucket, set()).add(car_id)
+
+    def position(self, car_id: str) -> tuple[int, int]:
+        return self._positions[car_id]
+
+    def in_rect(self, x_min: int, y_min: int, x_max: int, y_max: int) -> list[str]:
+        # Bounds are inclusive.
+        return self._query(x_min, y_min, x_max, y_max, lambda x, y: True)
+
+    def near(self, x: int, y: int, radius: float) -> list[str]:
+        # Euclidean distance, inclusive of the radius.
+        if radius < 0:
+            raise ValueError("Radius must be non-negative")
+        reach = math.floor(radius)
+        limit = radius * radius
+        return self._query(
+            x - reach,
+            y - reach,
+            x + reach,
+            y + reach,
+            lambda cx, cy: (cx - x) ** 2 + (cy - y) ** 2 <= limit,
+        )
+
+    def tile_counts(
+        self, x_min: int, y_min: int, columns: int, rows: int, tile: int
+    ) -> list[list[int]]:
+        # Cars per tile x tile block of cells, for columns x rows blocks from
+        # (x_min, y_min), as counts[row][column]. Buckets that fall inside one
+        # block are counted whole, so the cost follows the number of buckets
+        # rather than the number of cars.
+        counts = [[0] * columns for _ in range(rows)]
+        x_max = x_min + columns * tile - 1
+        y_max = y_min + rows * tile - 1
+        size = self.bucket_size
+        for (bx, by), cars in self._buckets_in(x_min, y_min, x_max, y_max):
+            left, bottom = bx * size, by * size
+            right, top = left + size - 1, bottom + size - 1
+            column = (left - x_min) // tile
+            row = (bottom - y_min) // tile
+            if (
+                x_min <= left
+                and right <= x_max
+                and y_min <= bottom
+                and top <= y_max
+                and column == (right - x_min) // tile
+                and row == (top - y_min) // tile
+            ):
+                counts[row][column] += len(cars)
+                continue
+            for car_id in cars:
+                cx, cy = self._positions[car_id]
+                if x_min <= cx <= x_max and y_min <= cy <= y_max:
+                    counts[(cy - y_min) // tile][(cx - x_min) // tile] += 1
+        return counts
+
+    def _buckets_in(self, x_min, y_min, x_max, y_max) -> list[tuple]:
+        if x_min > x_max or y_min > y_max:
+            return []
+        (bx_min, by_min), (bx_max, by_max) = (
+            self._bucket(x_min, y_min),
+            self._bucket(x_max, y_max),
+        )
+        # Visit whichever is smaller: the overlapping buckets, or the
+        # non-empty buckets.
+        if (bx_max - bx_min + 1) * (by_max - by_min + 1) > len(self._buckets):
+            return [
+                (key, cars)
+                for key, cars in self._buckets.items()
+                if bx_min <= key[0] <= bx_max and by_min <= key[1] <= by_max
+            ]
+        return [
+            ((bx, by), self._buckets[(bx, by)])
+            for bx in range(bx_min, bx_max + 1)
+            for by in range(by_min, by_max + 1)
+            if (bx, by) in self._buckets
+        ]
+
+    def _query(self, x_min, y_min, x_max, y_max, accept) -> list[str]:
+        found = []
+        for _, cars in self._buckets_in(x_min, y_min, x_max, y_max):
+            for car_id in cars:
+                cx, cy = self._positions[car_id]
+                if x_min <= cx <= x_max and y_min <= cy <= y_max and accept(cx, cy):
+                    found.append(car_id)
+        found.sort(key=self._ranks.__getitem__)
+        return found
@@ -0,0 +1,60 @@
+from .trajectory import Trajectory
+
+
+class StepView:
+    # One step of a run, read off the trajectories being joined rather than
+    # copied from the grid. changed lists (car_id, x, y, direction) for the
+    # cars whose pose changed at this step, in grid order; it is only worked
+    # out when read. collision is the collision result of this step, if any.
+    __slots__ = (
+        "step",
+        "collision",
+        "_car_ids",
+        "_trajectories",
+        "_order",
+        "_index",
+        "_changed",
+    )
+
+    def __init__(
+        self,
+        step: int,
+        car_ids: list[str],
+        trajectories: list[Trajectory],
+        order: list[int],
+        index: int,
+    ):
+        self.step = step
+        self.collision = None
+        self._car_ids = car_ids
+        self._trajectories = trajectories
+        self._order = order
+        self._index = index
+        self._changed = None
+
+    def changed_indices(self) -> list[int]:
+        step = self._index
+        indices = []
+        for i in self._order:
+            trajectory = self._trajectories[i]
+            if step >= len(trajectory):
+                break
+            if (
+                trajectory.cells[step] != trajectory.cells[step - 1]
+                or trajectory.directions[step] != trajectory.directions[step - 1]
+            ):
+                indices.append(i)
+        indices.sort()
+        return indices
+
+    @property
+    def changed(self) -> tuple:
+        if self._changed is None:
+            self._changed = tuple(
+                (self._car_ids[i], *self._trajectories[i].state(self._index))
+                for i in self.changed_indices()
+            )
+        return self._changed
+
+    def __repr__(self) -> str:
+        return f"StepView(step={self.step}, collision={self.collision!r})"
@@ -0,0 +1,495 @@
+import hashlib
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from collections.abc import Iterator, Sequence
+from functools import cache
+from itertools import groupby, takewhile
+from operator import itemgetter
+
+from constants import Command, Direction, DirectionMap
+from settings import settings
+
+from .command_store import CODE_COMMANDS, RunLengthProgram
+
+DIRECTIONS = tuple(Direction)
+DIRECTION_INDEX = {direction: index for index, direction in enumerate(DIRECTIONS)}
+# Cost of a cached entry beyond its arrays: key tuple, digest, object headers.
+ENTRY_OVERHEAD = 400
+# Cost of a RunTrajectory segment beyond its offsets and directions.
+SEGMENT_OVERHEAD = 160
+# Sort key of blocked moves, by step.
+step_of = itemgetter(0)
+
+
+class Trajectory:
+    # Pose after each step of a car's program, ignoring every other car;
+    # index 0 is the start pose. Cells are flat y * size_x + x indices, as
+    # used by the occupancy backends. Moves that would leave the grid are
+    # recorded in blocked as (step, x, y) with the rejected target cell.
+    __slots__ = ("size_x", "cells", "directions", "blocked")
+
+    def __init__(self, size_x: int, cells: array, directions: bytes, blocked: tuple):
+        self.size_x = size_x
+        self.cells = cells
+        self.directions = directions
+        self.blocked = blocked
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.cells.itemsize * len(self.cells)
+            + len(self.directions)
+            + 24 * len(self.blocked)
+            + ENTRY_OVERHEAD
+        )
+
+    def position(self, step: int) -> tuple[int, int]:
+        y, x = divmod(self.cells[min(step, len(self.cells) - 1)], self.size_x)
+        return x, y
+
+    def state(self, step: int) -> tuple[int, int, Direction]:
+        index = min(step, len(self.cells) - 1)
+        y, x = divmod(self.cells[index], self.size_x)
+        return x, y, DIRECTIONS[self.directions[index]]
+
+    def still_until(self, step: int) -> int:
+        # An index up to which the car stays in its cell from step on; the
+        # cells of a stepped program are not looked ahead.
+        return step
+
+    def blocked_steps(self, end: int | None = None) -> Iterator[tuple]:
+        # (step, x, y) of each blocked move up to end, in step order.
+        if end is None:
+            return iter(self.blocked)
+        return iter(self.blocked[: bisect_right(self.blocked, end, key=step_of)])
+
+    def blocked_count(self, first_step: int, last_step: int) -> int:
+        return bisect_right(self.blocked, last_step, key=step_of) - bisect_left(
+            self.blocked, first_step, key=step_of
+        )
+
+    def cell_array(self, length: int) -> array:
+        # Cells of the first length indices, as int32.
+        return self.cells if length >= len(self.cells) else self.cells[:length]
+
+
+class SegmentColumn(Sequence):
+    # Cells or direction indices of a RunTrajectory, looked up per index.
+    __slots__ = ("_length", "_lookup")
+
+    def __init__(self, length: int, lookup):
+        self._length = length
+        self._lookup = lookup
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: int) -> int:
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("trajectory index out of range")
+        return self._lookup(index)
+
+
+class RunTrajectory:
+    # A Trajectory kept as segments, for run-length programs whose expanded
+    # length need not fit in memory. Segment (start, base, offsets, drift,
+    # directions, still) covers the indices from start to the next one's: k
+    # steps in, the car is in cell base + drift * (k // len(offsets)) +
+    # offsets[k % len(offsets)], facing directions[k % len(directions)].
+    # Still segments stay in one cell. Blocked moves are kept as runs
+    # (first, count, period, x, y), at steps first + period * j for j below
+    # count, with the rejected target cell.
+    __slots__ = (
+        "size_x",
+        "segments",
+        "starts",
+        "length",
+        "blocked_runs",
+        "cells",
+        "directions",
+        "_cursor",
+    )
+
+    def __init__(self, size_x: int, segments: list, length: int, blocked_runs: tuple):
+        self.size_x = size_x
+        self.segments = segments
+        self.starts = [segment[0] for segment in segments]
+        self.length = length
+        self.blocked_runs = blocked_runs
+        self.cells = SegmentColumn(length, self.cell)
+        self.directions = SegmentColumn(length, self.direction_index)
+        self._cursor = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            ENTRY_OVERHEAD
+            + sum(
+                SEGMENT_OVERHEAD + 8 * (len(segment[2]) + len(segment[4]))
+                for segment in self.segments
+            )
+            + 8 * len(self.starts)
+            + 80 * len(self.blocked_runs)
+        )
+
+    def _segment(self, index: int) -> tuple:
+        # Lookups start from the segment of the previous one.
+        cursor = self._cursor
+        starts = self.starts
+        if not starts[cursor] <= index or (
+            cursor + 1 < len(starts) and starts[cursor + 1] <= index
+        ):
+            cursor = bisect_right(starts, index) - 1
+            self._cursor = cursor
+        return self.segments[cursor]
+
+    def cell(self, index: int) -> int:
+        start, base, offsets, drift, _, _ = self._segment(index)
+        k = index - start
+        return base + drift * (k // len(offsets)) + offsets[k % len(offsets)]
+
+    def direction_index(self, index: int) -> int:
+        segment = self._segment(index)
+        return segment[4][(index - segment[0]) % len(segment[4])]
+
+    def position(self, step: int) -> tuple[int, int]:
+        y, x = divmod(self.cell(min(step, self.length - 1)), self.size_x)
+        return x, y
+
+    def state(self, step: int) -> tuple[int, int, Direction]:
+        index = min(step, self.length - 1)
+        y, x = divmod(self.cell(index), self.size_x)
+        return x, y, DIRECTIONS[self.direction_index(index)]
+
+    def still_until(self, step: int) -> int:
+        # Skips whole still segments in the cell the car is in before step.
+        if step >= self.length:
+            return self.length
+        cell = self.cell(step - 1)
+        number = bisect_right(self.starts, step) - 1
+        while number < len(self.segments):
+            segment = self.segments[number]
+            if not segment[5] or segment[1] + segment[2][0] != cell:
+                return max(step, segment[0])
+            number += 1
+        return self.length
+
+    def blocked_steps(self, end: int | None = None) -> Iterator[tuple]:
+        runs = [
+            (
+                takewhile(lambda event: event[0] <= end, run_events(blocked_run))
+                if end is not None
+                else run_events(blocked_run)
+            )
+            for blocked_run in self.blocked_runs
+        ]
+        return heapq.merge(*runs)
+
+    def blocked_count(self, first_step: int, last_step: int) -> int:
+        count = 0
+        for first, events, period, _, _ in self.blocked_runs:
+            low = max(0, -((first - first_step) // period))
+            high = min(events - 1, (last_step - first) // period)
+            count += max(0, high - low + 1)
+        return count
+
+    def cell_array(self, length: int) -> array:
+        length = min(length, self.length)
+        segments = self.segments[: bisect_right(self.starts, length - 1)]
+        return array("i", (cell for cell, _ in segment_poses(segments, 0, length)))
+
+
+def compute_trajectory(
+    x: int, y: int, direction: Direction, program: bytes, size_x: int, size_y: int
+) -> Trajectory:
+    # Same moves as ForwardMovementStrategy/TurnMovementStrategy and the
+    # bounds rule of Grid.next_step.
+    cells = array("i", [y * size_x + x])
+    directions = bytearray([DIRECTION_INDEX[direction]])
+    blocked = []
+
+    for step, code in enumerate(program, start=1):
+        command = CODE_COMMANDS[code]
+        if command in DirectionMap.turn_map[direction]:
+            direction = DirectionMap.turn_map[direction][command]
+        else:
+            dx, dy = direction.value
+            if 0 <= x + dx < size_x and 0 <= y + dy < size_y:
+                x, y = x + dx, y + dy
+            else:
+                blocked.append((step, x + dx, y + dy))
+        cells.append(y * size_x + x)
+        directions.append(DIRECTION_INDEX[direction])
+
+    return Trajectory(size_x, cells, bytes(directions), tuple(blocked))
+
+
+def compute_run_trajectory(
+    x: int,
+    y: int,
+    direction: Direction,
+    program: RunLengthProgram,
+    size_x: int,
+    size_y: int,
+) -> RunTrajectory:
+    # compute_trajectory by segments rather than by command. A run of moves
+    # is one segment up to the edge and one parked against it, and a run of
+    # turns cycles through four directions. A repeated pattern, four times
+    # over if it turns the car, is one segment while it stays inside the
+    # grid. Near the edges it is laid down a run at a time until the car is
+    # back in a state it was in before a repeat; the repeats in between then
+    # recur, as one segment, for as long as the pattern does.
+    segments = [(0, y * size_x + x, (0,), 0, (DIRECTION_INDEX[direction],), True)]
+    blocked = []
+    shapes = {}
+    index = 1
+
+    def lay(count: int, base: int, offsets: tuple, drift: int, directions: tuple):
+        nonlocal index
+        still = not drift and offsets.count(offsets[0]) == len(offsets)
+        segments.append((index, base, offsets, drift, directions, still))
+        index += count
+
+    def run(code: int, count: int) -> None:
+        nonlocal x, y, direction
+        cell = y * size_x + x
+        if CODE_COMMANDS[code] is Command.F:
+            dx, dy = direction.value
+            room = min(
+                size_x - 1 - x if dx > 0 else x if dx < 0 else count,
+                size_y - 1 - y if dy > 0 else y if dy < 0 else count,
+            )
+            moves = min(count, room)
+            facing = (DIRECTION_INDEX[direction],)
+            if moves:
+                stride = dy * size_x + dx
+                lay(moves, cell + stride, (0,), stride, facing)
+                x, y = x + dx * moves, y + dy * moves
+            if moves < count:
+                blocked.append((index, count - moves, 1, x + dx, y + dy))
+                lay(count - moves, y * size_x + x, (0,), 0, facing)
+            return
+
+        cycle = []
+        for _ in range(min(count, 4)):
+            direction = DirectionMap.turn_map[direction][CODE_COMMANDS[code]]
+            cycle.append(DIRECTION_INDEX[direction])
+        lay(count, cell, (0,), 0, tuple(cycle))
+        direction = DIRECTIONS[cycle[(count - 1) % len(cycle)]]
+
+    def shape(unit: bytes) -> tuple:
+        key = (unit, direction)
+        if key not in shapes:
+            shapes[key] = pattern_shape(unit, direction, size_x)
+        return shapes[key]
+
+    for pattern, repeats in program.segments:
+        if pattern.count(pattern[0]) == len(pattern):
+            run(pattern[0], len(pattern) * repeats)
+            continue
+
+        unit, units, tail = pattern, repeats, 0
+        if shape(pattern)[2] is not direction:
+            unit, (units, tail) = pattern * 4, divmod(repeats, 4)
+        seen = {}
+        while units:
+            offsets, box, _, unit_directions, runs = shape(unit)
+            fits = fitting(x, y, box, size_x, size_y, units)
+            if fits:
+                dx, dy = box[4:]
+                base, drift = y * size_x + x, dy * size_x + dx
+                lay(fits * len(unit), base, offsets, drift, unit_directions)
+                x, y, units = x + dx * fits, y + dy * fits, units - fits
+                # Repeats recur only between states at the edges.
+                seen.clear()
+                continue
+
+            state = (x, y, direction)
+            if state in seen:
+                first_units, first_segment, first_index, first_blocked = seen.pop(state)
+                cycles = units // (first_units - units)
+                if cycles:
+                    period = index - first_index
+                    poses = list(
+                        segment_poses(segments[first_segment:], first_index, index)
+                    )
+                    events = [
+                        event
+                        for blocked_run in blocked[first_blocked:]
+                        for event in run_events(blocked_run)
+                    ]
+                    cells, cycle_directions = zip(*poses)
+                    lay(cycles * period, 0, cells, 0, cycle_directions)
+                    blocked.extend(
+                        (step + period, cycles, period, bx, by)
+                        for step, bx, by in events
+                    )
+                    units -= cycles * (first_units - units)
+                    seen.clear()
+                    continue
+            seen[state] = (units, len(segments), index, len(blocked))
+            for code, count in runs:
+                run(code, count)
+            units -= 1
+
+        for _ in range(tail):
+            for code, count in shape(pattern)[4]:
+                run(code, count)
+
+    return RunTrajectory(size_x, segments, index, tuple(blocked))
+
+
+def fitting(x: int, y: int, box: tuple, size_x: int, size_y: int, units: int) -> int:
+    # How many of the next units of a pattern, each starting where the last
+    # one ended, stay inside the grid whole.
+    limit = units
+    for position, low, high, step, size in (
+        (x, box[0], box[2], box[4], size_x),
+        (y, box[1], box[3], box[5], size_y),
+    ):
+        if position + low < 0 or position + high >= size:
+            return 0
+        if step > 0:
+            limit = min(limit, (size - 1 - position - high) // step + 1)
+        elif step < 0:
+            limit = min(limit, (position + low) // -step + 1)
+    return limit
+
+
+def segment_poses(segments: list, first: int, stop: int):
+    # (cell, direction index) at each index from first to stop, given the
+    # segments that cover them in order.
+    for number, (start, base, offsets, drift, directions, _) in enumerate(segments):
+        end = segments[number + 1][0] if number + 1 < len(segments) else stop
+        period = len(offsets)
+        for k in range(max(first, start) - start, min(end, stop) - start):
+            yield (
+                base + drift * (k // period) + offsets[k % period],
+                directions[k % len(directions)],
+            )
+
+
+def run_events(blocked_run: tuple):
+    first, count, period, x, y = blocked_run
+    return ((first + period * j, x, y) for j in range(count))
+
+
+def pattern_shape(pattern: bytes, direction: Direction, size_x: int) -> tuple:
+    # A pattern's path from (0, 0) facing direction, ignoring the edges: flat
+    # cell offsets, the box it spans with its end point, the final
+    # direction, the directions after each command and its runs.
+    dx = dy = 0
+    offsets, pattern_directions = [], bytearray()
+    min_dx = min_dy = max_dx = max_dy = 0
+    for code in pattern:
+        command = CODE_COMMANDS[code]
+        if command in DirectionMap.turn_map[direction]:
+            direction = DirectionMap.turn_map[direction][command]
+        else:
+            dx, dy = dx + direction.value[0], dy + direction.value[1]
+            min_dx, max_dx = min(min_dx, dx), max(max_dx, dx)
+            min_dy, max_dy = min(min_dy, dy), max(max_dy, dy)
+        offsets.append(dy * size_x + dx)
+        pattern_directions.append(DIRECTION_INDEX[direction])
+
+    runs = [(code, len(list(group))) for code, group in groupby(pattern)]
+    box = (min_dx, min_dy, max_dx, max_dy, dx, dy)
+    return offsets, box, direction, bytes(pattern_directions), runs
+
+
+def compute_program_trajectory(
+    x: int,
+    y: int,
+    direction: Direction,
+    program: bytes | RunLengthProgram,
+    size_x: int,
+    size_y: int,
+) -> Trajectory | RunTrajectory:
+    if isinstance(program, RunLengthProgram):
+        return compute_run_trajectory(x, y, direction, program, size_x, size_y)
+    return compute_trajectory(x, y, direction, program, size_x, size_y)
+
+
+def first_divergence(old: Trajectory, new: Trajectory) -> int | None:
+    # First step at which the two paths are in different cells, if any.
+    for step, (old_cell, new_cell) in enumerate(zip(old.cells, new.cells)):
+        if old_cell != new_cell:
+            return step
+    for step in range(min(len(old), len(new)), max(len(old), len(new))):
+        if old.position(step) != new.position(step):
+            return step
+    return None
+
+
+class TrajectoryMemo:
+    # A car's path does not depend on the other cars, so trajectories keyed by
+    # (start pose, program digest, grid size) are shared between simulations.
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def trajectory(
+        self,
+        x: int,
+        y: int,
+        direction: Direction,
+        program: bytes | RunLengthProgram,
+        size_x,
+        size_y,
+    ) -> Trajectory | RunTrajectory:
+        if isinstance(program, RunLengthProgram):
+            key_bytes = b"rle:" + program.to_text().encode()
+        else:
+            key_bytes = program
+        digest = hashlib.blake2b(key_bytes, digest_size=16).digest()
+        key = (x, y, direction, digest, size_x, size_y)
+        with self._lock:
+            trajectory = self._entries.get(key)
+            if trajectory is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return trajectory
+            self.misses += 1
+
+        trajectory = compute_program_trajectory(
+            x, y, direction, program, size_x, size_y
+        )
+        if trajectory.nbytes > self.max_bytes:
+            return trajectory
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = trajectory
+                self.nbytes += trajectory.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return trajectory
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+@cache
+def get_trajectory_memo() -> TrajectoryMemo:
+    return TrajectoryMemo(settings.trajectory_memo_mb * 1024 * 1024)
@@ -1,7 +1,13 @@
+import argparse
 import logging
+import os
 import sys
 
-from application import Simulation
+from application.compressed_io import detect_compression, open_input
+from application.input_parser import parse_input
+from application.results import format_result
+from application.scenario_file import is_scenario_file
+from domain.kernel import kernel_outcome
 from settings import settings
 
 
@@ -30,6 +36,191 @@ def show_format_help():
     print("")
     print("\nDirections: N (North), S (South), E (East), W (West)")
     print("Commands: F (Forward), L (Left turn), R (Right turn)")
+    print("Repeats: F1000 or (FFR)50 run a command or a group that many times")
+
+
+def show_input_error(message: str) -> None:
+    # parse_input speaks of the input, not the file, and keeps the hint on
+    # the error line.
+    if message in ("Empty input!", "No cars found in input!"):
+        message = message.replace("input!", "input file!")
+    for hint in ("Expected", "Commands must"):
+        error, found, rest = message.rpartition(". " + hint)
+        if found:
+            print(f"ERROR: {error}")
+            print(hint + rest)
+            break
+    else:
+        print(f"ERROR: {message}")
+    show_format_help()
+
+
+def parse_args(argv: list[str]):
+    parser = argparse.ArgumentParser(prog="main.py")
+    parser.add_argument("input_file", nargs="?")
+    parser.add_argument(
+        "--cache-dir", help="Reuse results of identical scenarios from this directory"
+    )
+    parser.add_argument(
+        "--cache-max-mb", type=int, default=256, help="Size bound of the result cache"
+    )
+    parser.add_argument(
+        "--all-collisions",
+        choices=["freeze", "remove"],
+        help="Report every collision, freezing or removing collided cars",
+    )
+    parser.add_argument(
+        "--paged",
+        action="store_true",
+        help="Run a binary scenario out of core, whatever its size",
+    )
+    parser.add_argument(
+        "--scratch-dir", help="Directory for the car blocks of out-of-core runs"
+    )
+    parser.add_argument(
+        "--trajectory-out",
+        metavar="PATH",
+        help="Write the cars moving at each step as NDJSON; .gz, .bz2 or .xz "
+        "compress it",
+    )
+    return parser.parse_args(argv)
+
+
+def run_simulation(grid_size_x: int, grid_size_y: int, cars: list, cache=None) -> None:
+    if cache is not None:
+        result = cache.lookup(grid_size_x, grid_size_y, cars)
+        if result is not None:
+            print(format_result(result))
+            return
+
+    # The kernel skips model start-up, but it does not log; keep the
+    # reference Simulation whenever its warnings or debug output could show.
+    if not logging.getLogger().isEnabledFor(logging.WARNING):
+        outcome = kernel_outcome(grid_size_x, grid_size_y, cars)
+        if outcome is not None:
+            result, positions = outcome
+            print(format_result(result))
+            if cache is not None:
+                cache.store(grid_size_x, grid_size_y, cars, result, positions)
+            return
+
+    from application import Simulation
+
+    simulation = Simulation(grid_size_x=grid_size_x, grid_size_y=grid_size_y, cars=cars)
+    result = simulation.run()
+    if cache is not None:
+        positions = [car.position for car in simulation.grid.cars.values()]
+        cache.store(grid_size_x, grid_size_y, cars, result, positions)
+
+
+def run_all_collisions(
+    grid_size_x: int, grid_size_y: int, cars: list, policy: str
+) -> None:
+    from application import Simulation
+
+    simulation = Simulation(grid_size_x=grid_size_x, grid_size_y=grid_size_y, cars=cars)
+    print_all_collisions(simulation, policy)
+
+
+def print_all_collisions(simulation, policy: str) -> None:
+    from application.results import format_collisions
+    from constants import CollisionPolicy
+
+    print(format_collisions(simulation.run_all(CollisionPolicy(policy))))
+
+
+def write_trajectory(simulation, path) -> None:
+    # Runs the simulation, streaming each step to path as it is joined. Grid
+    # prints the collision itself, as in Simulation.run.
+    from contextlib import closing
+
+    from application.compressed_io import open_output, write_ndjson
+    from application.results import start_record, step_record
+
+    collided = False
+    with open_output(path) as file:
+        write_ndjson(file, [start_record(simulation.grid)])
+        with closing(simulation.iter_steps(sync=False)) as steps:
+            for view in steps:
+                write_ndjson(file, [step_record(view)])
+                collided = bool(view.collision and view.collision["collision"])
+    if not collided:
+        print("no collision")
+
+
+def run_scenario_file(
+    path,
+    policy: str | None = None,
+    paged: bool = False,
+    scratch_dir=None,
+    trajectory=None,
+) -> None:
+    # Binary scenarios (see convert.py) are large by nature, so they skip the
+    # kernel and the result cache and run with their programs mapped. Past
+    # PAGED_MIN_CARS cars, car state is paged from disk as well, unless the
+    # trajectory is written.
+    from application.scenario_file import mappable
+
+    with mappable(path, scratch_dir) as plain_path:
+        run_mapped_scenario(plain_path, policy, paged, scratch_dir, trajectory)
+
+
+def run_mapped_scenario(
+    path, policy: str | None, paged: bool, scratch_dir, trajectory
+) -> None:
+    from application.paged_simulation import PAGED_MIN_CARS
+    from application.scenario_file import ScenarioFile
+
+    scenario = ScenarioFile(path)
+    paged = paged or len(scenario) >= PAGED_MIN_CARS
+    if not policy and not trajectory and paged:
+        from application.paged_simulation import PagedSimulation
+
+        simulation = PagedSimulation(scenario, scratch_dir)
+        try:
+            simulation.run()
+        finally:
+            simulation.close()
+        return
+
+    from application import Simulation
+
+    simulation = Simulation.from_scenario(scenario)
+    if policy:
+        print_all_collisions(simulation, policy)
+    elif trajectory:
+        write_trajectory(simulation, trajectory)
+    else:
+        simulation.run()
+
+
+def run_text_file(
+    path,
+    policy: str | None = None,
+    paged: bool = False,
+    scratch_dir=None,
+    trajectory=None,
+) -> bool:
+    # Uncompressed text inputs of PARALLEL_MIN_BYTES and more are parsed on
+    # every core and run as a binary scenario. False when the input does not
+    # parse, which parse_input in main then reports.
+    import tempfile
+
+    from application.parallel_parser import PARALLEL_MIN_BYTES, parse_file
+
+    if os.path.getsize(path) < PARALLEL_MIN_BYTES or detect_compression(path):
+        return False
+    try:
+        scenario = parse_file(path, validate=False)
+    except ValueError:
+        return False
+    scenario.validate()
+    with tempfile.TemporaryDirectory(dir=scratch_dir) as directory:
+        scenario_path = os.path.join(directory, "scenario.scn")
+        scenario.write(scenario_path)
+        del scenario
+        run_scenario_file(scenario_path, policy, paged, scratch_dir, trajectory)
+    return True
 
 
 def main():
@@ -40,124 +231,59 @@ def main():
     )
     logger = logging.getLogger(__name__)
 
-    if len(sys.argv) != 2:
+    args = parse_args(sys.argv[1:])
+    if args.input_file is None:
         print("ERROR: Missing input file!")
-        print("Usage: python main.py <input_file>")
+        print(
+            "Usage: python main.py [--cache-dir DIR] [--cache-max-mb MB] "
+            "[--all-collisions {freeze,remove}] [--paged] [--scratch-dir DIR] "
+            "[--trajectory-out PATH] <input_file>"
+        )
+        sys.exit(1)
+    if args.all_collisions and args.trajectory_out:
+        print("ERROR: --trajectory-out follows a run to its first collision only")
+        sys.exit(1)
+    if args.cache_dir and (args.all_collisions or args.trajectory_out):
+        print("ERROR: --cache-dir caches first-collision results only")
         sys.exit(1)
 
     try:
-        with open(sys.argv[1], "r") as file:
-            lines = [line.strip() for line in file.readlines()]
+        binary = is_scenario_file(args.input_file)
     except FileNotFoundError:
-        print(f"ERROR: File '{sys.argv[1]}' not found!")
+        print(f"ERROR: File '{args.input_file}' not found!")
         sys.exit(1)
     except Exception as e:
-        print(f"ERROR: Could not read file '{sys.argv[1]}': {e}")
+        print(f"ERROR: Could not read file '{args.input_file}': {e}")
         sys.exit(1)
 
-    # Remove leading/trailing empty lines
-    while lines and not lines[0]:
-        lines.pop(0)
-    while lines and not lines[-1]:
-        lines.pop()
-
-    if not lines:
-        print("ERROR: Empty input file!")
-        show_format_help()
+    file_options = (
+        args.all_collisions,
+        args.paged,
+        args.scratch_dir,
+        args.trajectory_out,
+    )
+    try:
+        if binary:
+            run_scenario_file(args.input_file, *file_options)
+            return
+        # Cached runs need the cars as parsed, so they stay sequential.
+        if not args.cache_dir and run_text_file(args.input_file, *file_options):
+            return
+    except Exception as e:
+        print(f"ERROR: Simulation failed: {e}")
         sys.exit(1)
 
-    # Parse grid size
     try:
-        grid_parts = lines[0].split()
-        if len(grid_parts) != 2:
-            raise ValueError("Grid size must have exactly 2 numbers")
-        grid_size_x, grid_size_y = map(int, grid_parts)
-        if grid_size_x <= 0 or grid_size_y <= 0:
-            raise ValueError("Grid dimensions must be positive")
-    except (ValueError, IndexError) as e:
-        print(f"ERROR: Invalid grid size format: '{lines[0]}'")
-        print(f"Expected: two positive integers (e.g., '10 10')")
-        show_format_help()
+        with open_input(args.input_file) as file:
+            text = file.read()
+    except Exception as e:
+        print(f"ERROR: Could not read file '{args.input_file}': {e}")
         sys.exit(1)
 
-    # Parse cars
-    cars = []
-    i = 1
-    car_number = 1
-
-    while i < len(lines):
-        # Skip empty lines between cars
-        while i < len(lines) and not lines[i]:
-            i += 1
-
-        if i >= len(lines):
-            break
-
-        # Car ID
-        car_id = lines[i]
-        if not car_id:
-            print(f"ERROR: Car {car_number} has empty ID at line {i+1}")
-            show_format_help()
-            sys.exit(1)
-        i += 1
-
-        # Position and direction
-        if i >= len(lines):
-            print(
-                f"ERROR: Car {car_number} ('{car_id}') missing position and direction"
-            )
-            show_format_help()
-            sys.exit(1)
-
-        try:
-            pos_parts = lines[i].split()
-            if len(pos_parts) != 3:
-                raise ValueError("Position must have exactly 3 parts: x y direction")
-            x, y, direction = int(pos_parts[0]), int(pos_parts[1]), pos_parts[2].upper()
-            if x < 0 or y < 0:
-                raise ValueError("Coordinates must be non-negative")
-            if direction not in ["N", "S", "E", "W"]:
-                raise ValueError("Direction must be N, S, E, or W")
-        except (ValueError, IndexError) as e:
-            print(
-                f"ERROR: Car {car_number} ('{car_id}') has invalid position/direction: '{lines[i]}'"
-            )
-            print(f"Expected format: 'x y direction' (e.g., '1 2 N')")
-            show_format_help()
-            sys.exit(1)
-
-        position_direction = lines[i]
-        i += 1
-
-        # Commands (could be empty)
-        commands = ""
-        if i < len(lines) and lines[i]:
-            # Check if this line looks like a car ID (next line would be position)
-            is_next_car = (
-                i + 1 < len(lines) and lines[i + 1] and len(lines[i + 1].split()) == 3
-            )
-
-            if not is_next_car:
-                commands = lines[i]
-                # Validate commands contain only F, L, R
-                for cmd in commands:
-                    if cmd not in "FLR":
-                        print(
-                            f"ERROR: Car {car_number} ('{car_id}') has invalid command '{cmd}' in '{commands}'"
-                        )
-                        print(
-                            "Commands must contain only F (Forward), L (Left), R (Right)"
-                        )
-                        show_format_help()
-                        sys.exit(1)
-                i += 1
-
-        cars.append([car_id, position_direction, commands])
-        car_number += 1
-
-    if not cars:
-        print("ERROR: No cars found in input file!")
-        show_format_help()
+    try:
+        grid_size_x, grid_size_y, cars = parse_input(text)
+    except ValueError as e:
+        show_input_error(str(e))
         sys.exit(1)
 
     logger.info(f"Grid size: {grid_size_x}x{grid_size_y}")
@@ -165,11 +291,20 @@ def main():
         logger.info(f"Car data: {car}")
 
     try:
-        simulation = Simulation(
-            grid_size_x=grid_size_x, grid_size_y=grid_size_y, cars=cars
-        )
+        if args.all_collisions:
+            run_all_collisions(grid_size_x, grid_size_y, cars, args.all_collisions)
+        elif args.trajectory_out:
+            from application import Simulation
 
-        simulation.run()
+            simulation = Simulation(grid_size_x, grid_size_y, cars)
+            write_trajectory(simulation, args.trajectory_out)
+        else:
+            cache = None
+            if args.cache_dir:
+                from application.result_cache import ResultCache
+
+                cache = ResultCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+            run_simulation(grid_size_x, grid_size_y, cars, cache)
     except Exception as e:
         print(f"ERROR: Simulation failed: {e}")
         sys.exit(1)
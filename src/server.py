@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import logging
+
+from application.metrics_export import serve_metrics, write_prometheus
+from application.service import SimulationService
+from domain.metrics import get_metrics
+from settings import settings
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the simulation service.")
+    endpoint = parser.add_mutually_exclusive_group()
+    endpoint.add_argument("--socket", help="Unix socket path to listen on")
+    endpoint.add_argument("--port", type=int, default=8765, help="TCP port")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument(
+        "--batch-window-ms",
+        type=float,
+        default=2.0,
+        help="How long to wait for more requests to fill a micro-batch",
+    )
+    parser.add_argument(
+        "--timeout-ms",
+        type=float,
+        default=None,
+        help="Stop a batch's simulations this long after a worker starts it",
+    )
+    parser.add_argument(
+        "--max-steps",
+        type=int,
+        default=None,
+        help="Stop each simulation after this many steps",
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, help="Serve Prometheus metrics on this port"
+    )
+    parser.add_argument(
+        "--metrics-file", help="Write Prometheus metrics to this file periodically"
+    )
+    parser.add_argument("--metrics-interval", type=float, default=10.0)
+    return parser.parse_args(argv)
+
+
+async def serve(args) -> None:
+    logger = logging.getLogger(__name__)
+    service = SimulationService(
+        workers=args.workers,
+        max_batch=args.max_batch,
+        max_delay=args.batch_window_ms / 1000,
+        timeout=None if args.timeout_ms is None else args.timeout_ms / 1000,
+        max_steps=args.max_steps,
+    )
+    await service.start()
+
+    metrics_server = None
+    if args.metrics_port is not None:
+        metrics_server = serve_metrics(get_metrics(), args.host, args.metrics_port)
+        logger.info(f"Serving metrics on {args.host}:{args.metrics_port}/metrics")
+    metrics_task = None
+    if args.metrics_file:
+        metrics_task = asyncio.create_task(
+            write_metrics_periodically(args.metrics_file, args.metrics_interval)
+        )
+
+    if args.socket:
+        server = await asyncio.start_unix_server(
+            service.handle_connection, path=args.socket
+        )
+        logger.info(f"Listening on unix socket {args.socket}")
+    else:
+        server = await asyncio.start_server(
+            service.handle_connection, host=args.host, port=args.port
+        )
+        logger.info(f"Listening on {args.host}:{args.port}")
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if metrics_task is not None:
+            metrics_task.cancel()
+            write_prometheus(get_metrics(), args.metrics_file)
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        await service.close()
+
+
+async def write_metrics_periodically(path, interval: float) -> None:
+    while True:
+        write_prometheus(get_metrics(), path)
+        await asyncio.sleep(interval)
+
+
+def main():
+    logging.basicConfig(
+        level=getattr(logging, settings.log_level.upper()),
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    try:
+        asyncio.run(serve(parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,63 @@
 # settings.py
+import os
+import tomllib
+from functools import cache
 from pathlib import Path
 
-import tomli
-from pydantic_settings import BaseSettings
+TOML_PATH = Path(__file__).parent / "settings.toml"
 
 
-class Settings(BaseSettings):
+# A plain class rather than pydantic-settings (or even dataclasses) keeps
+# settings off the import-time critical path of the CLI. Precedence matches
+# the old BaseSettings(**toml): settings.toml, then environment, then defaults.
+class Settings:
     max_grid_size: int = 20
     max_grid_size_x: int = 20
     max_grid_size_y: int = 20
     log_level: str = "info"
+    trajectory_memo_mb: int = 64
+    paged_cache_mb: int = 256
 
+    def __init__(self, **values):
+        fields = type(self).__annotations__
+        unknown = set(values) - set(fields)
+        if unknown:
+            raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}")
+        for name, value in values.items():
+            setattr(self, name, fields[name](value))
 
-def load_settings():
-    toml_path = Path(__file__).parent / "settings.toml"
-    if toml_path.exists():
-        with open(toml_path, "rb") as f:
-            config = tomli.load(f)
-        return Settings(**config)
-    return Settings()
+    def __repr__(self) -> str:
+        values = ", ".join(
+            f"{name}={getattr(self, name)!r}" for name in type(self).__annotations__
+        )
+        return f"Settings({values})"
 
+    @classmethod
+    def from_config(cls, config: dict) -> "Settings":
+        environment = {key.lower(): value for key, value in os.environ.items()}
+        values = {
+            name: environment[name]
+            for name in cls.__annotations__
+            if name in environment
+        }
+        values.update(config)
+        return cls(**values)
 
-settings = load_settings()
+
+def load_settings() -> Settings:
+    if TOML_PATH.exists():
+        with open(TOML_PATH, "rb") as f:
+            config = tomllib.load(f)
+        return Settings.from_config(config)
+    return Settings.from_config({})
+
+
+@cache
+def get_settings() -> Settings:
+    return load_settings()
+
+
+def __getattr__(name):
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
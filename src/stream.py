@@ -0,0 +1,61 @@
+import argparse
+import logging
+import sys
+
+from application.compressed_io import open_input
+from application.input_parser import parse_input
+from application.metrics_export import write_prometheus
+from application.streaming import DEFAULT_MAX_BUFFERED, StreamingSimulation
+from domain.metrics import get_metrics
+from settings import settings
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="stream.py",
+        description="Run a simulation whose commands arrive on stdin, one "
+        "'<car_id> <commands>' chunk per line ('<car_id> .' ends a car).",
+    )
+    parser.add_argument("input_file", help="Grid and starting cars")
+    parser.add_argument(
+        "--max-buffered",
+        type=int,
+        default=DEFAULT_MAX_BUFFERED,
+        help="Most commands a car may have waiting to be executed",
+    )
+    parser.add_argument(
+        "--metrics-file", help="Write Prometheus metrics to this file at the end"
+    )
+    return parser.parse_args(argv)
+
+
+def main():
+    logging.basicConfig(
+        level=getattr(logging, settings.log_level.upper()),
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%H:%M:%S",
+    )
+
+    args = parse_args()
+    try:
+        with open_input(args.input_file) as file:
+            grid_size_x, grid_size_y, cars = parse_input(file.read())
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+    try:
+        simulation = StreamingSimulation(
+            grid_size_x, grid_size_y, cars, max_buffered=args.max_buffered
+        )
+        simulation.consume(sys.stdin)
+    except Exception as e:
+        print(f"ERROR: Simulation failed: {e}")
+        sys.exit(1)
+    finally:
+        if args.metrics_file:
+            write_prometheus(get_metrics(), args.metrics_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,17 @@ from contextlib import redirect_stderr, redirect_stdout
 import streamlit as st
 
 from application import Simulation
+from application.input_parser import parse_input
+from application.viewport import MAX_TILES, Viewport
 from constants import Direction
 from domain import Grid
 
+HEATMAP_METRICS = {
+    "Dwell (car-steps)": "dwell",
+    "Visits": "visits",
+    "Blocked moves": "blocked",
+}
+
 
 class OutputCapture:
     def __init__(self):
@@ -63,108 +71,48 @@ def parse_direction(direction_str):
     return direction_map[direction_str.upper()]
 
 
-def parse_input(input_text):
-    lines = [line.strip() for line in input_text.split("\n")]
-
-    while lines and not lines[0]:
-        lines.pop(0)
-    while lines and not lines[-1]:
-        lines.pop()
-
-    if not lines:
-        raise ValueError("Empty input!")
-
-    try:
-        grid_parts = lines[0].split()
-        if len(grid_parts) != 2:
-            raise ValueError("Grid size must have exactly 2 numbers")
-        grid_size_x, grid_size_y = map(int, grid_parts)
-        if grid_size_x <= 0 or grid_size_y <= 0:
-            raise ValueError("Grid dimensions must be positive")
-    except (ValueError, IndexError) as e:
-        raise ValueError(
-            f"Invalid grid size format: '{lines[0]}'. Expected: two positive integers (e.g., '10 10')"
-        )
-
-    cars = []
-    i = 1
-    car_number = 1
-
-    while i < len(lines):
-        while i < len(lines) and not lines[i]:
-            i += 1
-
-        if i >= len(lines):
-            break
-
-        car_id = lines[i]
-        if not car_id:
-            raise ValueError(f"Car {car_number} has empty ID")
-        i += 1
-
-        if i >= len(lines):
-            raise ValueError(
-                f"Car {car_number} ('{car_id}') missing position and direction"
-            )
-
-        try:
-            pos_parts = lines[i].split()
-            if len(pos_parts) != 3:
-                raise ValueError("Position must have exactly 3 parts: x y direction")
-            x, y, direction = int(pos_parts[0]), int(pos_parts[1]), pos_parts[2].upper()
-            if x < 0 or y < 0:
-                raise ValueError("Coordinates must be non-negative")
-            if direction not in ["N", "S", "E", "W"]:
-                raise ValueError("Direction must be N, S, E, or W")
-        except (ValueError, IndexError) as e:
-            raise ValueError(
-                f"Car {car_number} ('{car_id}') has invalid position/direction: '{lines[i]}'. Expected format: 'x y direction' (e.g., '1 2 N')"
-            )
-
-        position_direction = lines[i]
-        i += 1
-
-        commands = ""
-        if i < len(lines) and lines[i]:
-            is_next_car = (
-                i + 1 < len(lines) and lines[i + 1] and len(lines[i + 1].split()) == 3
-            )
-
-            if not is_next_car:
-                commands = lines[i]
-                for cmd in commands:
-                    if cmd not in "FLR":
-                        raise ValueError(
-                            f"Car {car_number} ('{car_id}') has invalid command '{cmd}' in '{commands}'. Commands must contain only F (Forward), L (Left), R (Right)"
-                        )
-                i += 1
-
-        cars.append([car_id, position_direction, commands])
-        car_number += 1
-
-    if not cars:
-        raise ValueError("No cars found in input!")
+def cell_sizes(size_x, size_y):
+    max_dimension = max(size_x, size_y)
+    if max_dimension <= 10:
+        return 40, 16, 12
+    elif max_dimension <= 15:
+        return 30, 14, 10
+    return 25, 12, 8
+
+
+DIRECTION_ARROWS = {
+    Direction.NORTH: "↑",
+    Direction.SOUTH: "↓",
+    Direction.EAST: "→",
+    Direction.WEST: "←",
+}
+
+
+def current_viewport(size_x, size_y):
+    # Built from the viewport controls; the whole grid unless zoomed in.
+    if st.session_state.get("view_fit", True):
+        return Viewport.fit(size_x, size_y)
+    return Viewport(
+        size_x,
+        size_y,
+        st.session_state.get("view_x"),
+        st.session_state.get("view_y"),
+        int(st.session_state.get("view_tile", 1)),
+    )
 
-    return grid_size_x, grid_size_y, cars
 
+def visualize_grid(grid, step_info="", highlighted=(), viewport=None):
+    # Only the cells in view are drawn; zoomed out, tiles show car counts.
+    if viewport is None:
+        viewport = Viewport.fit(grid.size_x, grid.size_y)
+    if not viewport.detailed:
+        return visualize_tiles(viewport, viewport.car_counts(grid), step_info)
 
-def visualize_grid(grid, step_info=""):
-    max_dimension = max(grid.size_x, grid.size_y)
-    if max_dimension <= 10:
-        cell_size = 40
-        font_size = 16
-        index_font_size = 12
-    elif max_dimension <= 15:
-        cell_size = 30
-        font_size = 14
-        index_font_size = 10
-    else:
-        cell_size = 25
-        font_size = 12
-        index_font_size = 8
+    cell_size, font_size, index_font_size = cell_sizes(viewport.columns, viewport.rows)
+    cells = viewport.cells(grid)
 
     container_width = (
-        grid.size_x + 1
+        viewport.columns + 1
     ) * cell_size + 40  # +1 for y-axis labels, +40 for padding
 
     grid_html = f"<div style='font-family: monospace; font-size: 14px; background-color: #1e1e1e; padding: 15px; border-radius: 8px; width: {container_width}px; overflow-x: auto;'>"
@@ -174,28 +122,21 @@ def visualize_grid(grid, step_info=""):
 
     grid_html += "<table style='border-collapse: collapse;'>"
 
-    for y in range(grid.size_y - 1, -1, -1):
+    for y in range(viewport.y_max, viewport.y_min - 1, -1):
         grid_html += "<tr>"
         grid_html += f"<td style='width: {cell_size}px; height: {cell_size}px; text-align: center; color: #888; font-size: {index_font_size}px; font-weight: bold;'>{y}</td>"
 
-        for x in range(grid.size_x):
+        for x in range(viewport.x_min, viewport.x_max + 1):
             cell_content = "."
             cell_color = "#2d2d2d"
             text_color = "#666"
 
-            for car_id, car in grid.cars.items():
-                if car.x == x and car.y == y:
-                    direction_arrows = {
-                        Direction.NORTH: "↑",
-                        Direction.SOUTH: "↓",
-                        Direction.EAST: "→",
-                        Direction.WEST: "←",
-                    }
-                    arrow = direction_arrows.get(car.direction, "?")
-                    cell_content = f"{car_id}{arrow}"
-                    cell_color = "#ffd700"
-                    text_color = "#000"
-                    break
+            car_id = cells.get((x, y))
+            if car_id is not None:
+                arrow = DIRECTION_ARROWS.get(grid.cars[car_id].direction, "?")
+                cell_content = f"{car_id}{arrow}"
+                cell_color = "#4fc3f7" if car_id in highlighted else "#ffd700"
+                text_color = "#000"
 
             grid_html += f"<td style='border: 1px solid #555; width: {cell_size}px; height: {cell_size}px; text-align: center; background-color: {cell_color}; color: {text_color}; font-size: {font_size}px; font-weight: bold;'>{cell_content}</td>"
         grid_html += "</tr>"
@@ -204,7 +145,7 @@ def visualize_grid(grid, step_info=""):
     grid_html += (
         f"<tr><td style='width: {cell_size}px; height: {index_height}px;'></td>"
     )
-    for x in range(grid.size_x):
+    for x in range(viewport.x_min, viewport.x_max + 1):
         grid_html += f"<td style='width: {cell_size}px; height: {index_height}px; text-align: center; color: #888; font-size: {index_font_size}px; font-weight: bold;'>{x}</td>"
     grid_html += "</tr>"
 
@@ -212,6 +153,83 @@ def visualize_grid(grid, step_info=""):
     return grid_html
 
 
+def heat_color(value, peak):
+    # From the empty-cell grey to orange at the busiest cell.
+    share = value / peak if peak else 0
+    low, high = (0x2D, 0x2D, 0x2D), (0xFF, 0x57, 0x22)
+    red, green, blue = (round(a + (b - a) * share) for a, b in zip(low, high))
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+
+def visualize_tiles(viewport, values, title=""):
+    # values[row][column] per tile, labelled with each tile's first cell.
+    cell_size, font_size, index_font_size = cell_sizes(viewport.columns, viewport.rows)
+    xs, ys = viewport.tile_starts()
+    peak = max((int(value) for row in values for value in row), default=0)
+    container_width = (viewport.columns + 1) * cell_size + 40
+
+    tiles_html = f"<div style='font-family: monospace; font-size: 14px; background-color: #1e1e1e; padding: 15px; border-radius: 8px; width: {container_width}px; overflow-x: auto;'>"
+    if title:
+        tiles_html += f"<div style='margin-bottom: 15px; font-weight: bold; color: #ffffff; text-align: center;'>{title}</div>"
+    if not viewport.detailed:
+        tiles_html += f"<div style='margin-bottom: 10px; color: #888; text-align: center;'>{viewport.tile}x{viewport.tile} cells per tile</div>"
+    tiles_html += "<table style='border-collapse: collapse;'>"
+
+    for row in range(viewport.rows - 1, -1, -1):
+        tiles_html += "<tr>"
+        tiles_html += f"<td style='width: {cell_size}px; height: {cell_size}px; text-align: center; color: #888; font-size: {index_font_size}px; font-weight: bold;'>{ys[row]}</td>"
+        for column in range(viewport.columns):
+            value = int(values[row][column])
+            text_color = "#000" if peak and value * 2 >= peak else "#bbb"
+            tiles_html += f"<td style='border: 1px solid #555; width: {cell_size}px; height: {cell_size}px; text-align: center; background-color: {heat_color(value, peak)}; color: {text_color}; font-size: {index_font_size}px;'>{value or ''}</td>"
+        tiles_html += "</tr>"
+
+    tiles_html += f"<tr><td style='width: {cell_size}px;'></td>"
+    for x in xs:
+        tiles_html += f"<td style='width: {cell_size}px; text-align: center; color: #888; font-size: {index_font_size}px; font-weight: bold;'>{x}</td>"
+    tiles_html += "</tr></table></div>"
+    return tiles_html
+
+
+def visualize_heatmap(counts, title="", viewport=None):
+    size_y, size_x = counts.shape
+    if viewport is None:
+        viewport = Viewport.fit(size_x, size_y)
+    return visualize_tiles(viewport, viewport.tile_sums(counts), title)
+
+
+def show_traffic(traffic, metric, traffic_placeholder):
+    counts = getattr(traffic, HEATMAP_METRICS[metric])
+    title = f"{metric} over {traffic.steps} steps ({traffic.car_steps} car-steps)"
+    with traffic_placeholder.container():
+        viewport = current_viewport(counts.shape[1], counts.shape[0])
+        st.markdown(visualize_heatmap(counts, title, viewport), unsafe_allow_html=True)
+        hotspots = traffic.hotspots("blocked", 5)
+        if hotspots:
+            st.markdown(
+                "Blocked-move hotspots: "
+                + ", ".join(f"({x}, {y}): {count}" for x, y, count in hotspots)
+            )
+        st.dataframe(
+            {
+                "Car": traffic.car_ids,
+                "Distance": traffic.distance.tolist(),
+            },
+            hide_index=True,
+        )
+
+
+def find_cars(grid, query, output_capture):
+    if query is None:
+        return []
+    x, y, radius = query
+    found = grid.cars_near(x, y, radius)
+    output_capture.write(
+        f"Cars within {radius} of ({x}, {y}): {', '.join(found) or 'none'}"
+    )
+    return found
+
+
 def run_simulation_step_by_step(
     grid_size_x,
     grid_size_y,
@@ -221,6 +239,7 @@ def run_simulation_step_by_step(
     console_placeholder,
     print_capture,
     print_placeholder,
+    query=None,
 ):
     try:
         print_capture.clear()
@@ -230,7 +249,13 @@ def run_simulation_step_by_step(
                 grid_size_x=grid_size_x, grid_size_y=grid_size_y, cars=cars
             )
 
-        grid_html = visualize_grid(simulation.grid, "Initial State")
+        highlighted = find_cars(simulation.grid, query, output_capture)
+        grid_html = visualize_grid(
+            simulation.grid,
+            "Initial State",
+            highlighted,
+            current_viewport(grid_size_x, grid_size_y),
+        )
         grid_placeholder.markdown(grid_html, unsafe_allow_html=True)
 
         output_capture.write(f"Grid size: {grid_size_x}x{grid_size_y}")
@@ -242,55 +267,48 @@ def run_simulation_step_by_step(
         time.sleep(0.5)
 
         collision_detected = False
+        step_info = "Initial State"
 
-        for step in range(simulation.max_step):
-            output_capture.write(f"Step {step + 1}:")
-
-            for car_id, car in simulation.grid.cars.items():
-                current_command = car.get_next_command(simulation.grid.current_step)
-                if current_command is not None:
-                    output_capture.write(
-                        f"  Car {car_id} at ({car.x}, {car.y}) facing {car.direction.name} - executing command '{current_command}'"
-                    )
-                else:
+        with redirect_stdout(print_capture):
+            for view in simulation.iter_steps():
+                output_capture.write(f"Step {view.step}:")
+                for car_id, x, y, direction in view.changed:
                     output_capture.write(
-                        f"  Car {car_id} at ({car.x}, {car.y}) facing {car.direction.name} - no more commands"
+                        f"  Car {car_id} now at ({x}, {y}) facing {direction.name}"
                     )
-
-            with redirect_stdout(print_capture):
-                collision_result = simulation.grid.next_step()
-                collision_detected = collision_result["collision"]
-
-            output_capture.write("After step:")
-            for car_id, car in simulation.grid.cars.items():
-                output_capture.write(
-                    f"  Car {car_id} now at ({car.x}, {car.y}) facing {car.direction.name}"
+                if not view.changed:
+                    output_capture.write("  No car moved")
+
+                step_info = f"Step {view.step}/{simulation.max_step}"
+                collision_detected = view.collision is not None
+                if collision_detected:
+                    car_ids = ", ".join(view.collision["cars"])
+                    position = view.collision["position"]
+                    step_info += f" - COLLISION: Cars {car_ids} at ({position[0]}, {position[1]})"
+
+                highlighted = find_cars(simulation.grid, query, output_capture)
+                grid_html = visualize_grid(
+                    simulation.grid,
+                    step_info,
+                    highlighted,
+                    current_viewport(grid_size_x, grid_size_y),
                 )
+                grid_placeholder.markdown(grid_html, unsafe_allow_html=True)
 
-            step_info = f"Step {step + 1}/{simulation.max_step}"
-            if collision_detected:
-                car_ids = ", ".join(collision_result["cars"])
-                position = collision_result["position"]
-                step_info += (
-                    f" - COLLISION: Cars {car_ids} at ({position[0]}, {position[1]})"
-                )
+                output_capture.write("-" * 40)
+                console_placeholder.code(output_capture.get_content(), language=None)
 
-            grid_html = visualize_grid(simulation.grid, step_info)
-            grid_placeholder.markdown(grid_html, unsafe_allow_html=True)
-
-            output_capture.write("-" * 40)
-            console_placeholder.code(output_capture.get_content(), language=None)
-
-            print_content = print_capture.get_content()
-            if print_content:
-                print_placeholder.code(print_content, language=None)
-            else:
-                print_placeholder.text("No print output yet...")
+                print_content = print_capture.get_content()
+                if print_content:
+                    print_placeholder.code(print_content, language=None)
+                else:
+                    print_placeholder.text("No print output yet...")
 
-            if collision_detected:
-                break
+                if not collision_detected:
+                    time.sleep(0.5)
 
-            time.sleep(0.5)
+        st.session_state.traffic = simulation.traffic_stats()
+        st.session_state.last_grid = (simulation.grid, step_info, highlighted)
 
         if not collision_detected:
             with redirect_stdout(print_capture):
@@ -312,6 +330,65 @@ def run_simulation_step_by_step(
         print_placeholder.text("Simulation failed - no print output.")
 
 
+def run_simulation_instantly(
+    grid_size_x,
+    grid_size_y,
+    cars,
+    output_capture,
+    grid_placeholder,
+    console_placeholder,
+    print_capture,
+    print_placeholder,
+    query=None,
+):
+    try:
+        print_capture.clear()
+
+        # Keeping the last simulation lets an edit re-run only what changed.
+        simulation = st.session_state.get("simulation")
+        with redirect_stdout(print_capture):
+            if simulation is not None and (
+                simulation.grid.size_x,
+                simulation.grid.size_y,
+            ) == (grid_size_x, grid_size_y):
+                output_capture.write("Re-running changed cars...")
+                collision_result = simulation.rerun(cars)
+            else:
+                simulation = Simulation(
+                    grid_size_x=grid_size_x, grid_size_y=grid_size_y, cars=cars
+                )
+                output_capture.write("Starting simulation...")
+                collision_result = simulation.run()
+        st.session_state.simulation = simulation
+        st.session_state.traffic = simulation.traffic_stats()
+
+        step_info = f"Step {simulation.grid.current_step}/{simulation.max_step}"
+        if collision_result["collision"]:
+            car_ids = ", ".join(collision_result["cars"])
+            position = collision_result["position"]
+            step_info += (
+                f" - COLLISION: Cars {car_ids} at ({position[0]}, {position[1]})"
+            )
+        highlighted = find_cars(simulation.grid, query, output_capture)
+        grid_html = visualize_grid(
+            simulation.grid,
+            step_info,
+            highlighted,
+            current_viewport(grid_size_x, grid_size_y),
+        )
+        grid_placeholder.markdown(grid_html, unsafe_allow_html=True)
+        st.session_state.last_grid = (simulation.grid, step_info, highlighted)
+
+        output_capture.write("Simulation complete.")
+        console_placeholder.code(output_capture.get_content(), language=None)
+        print_placeholder.code(print_capture.get_content(), language=None)
+
+    except Exception as e:
+        output_capture.write(f"ERROR: Simulation failed: {e}")
+        console_placeholder.code(output_capture.get_content(), language=None)
+        print_placeholder.text("Simulation failed - no print output.")
+
+
 def main():
     st.set_page_config(page_title="Car Simulation", layout="wide")
     st.title("Auto-Driving Car Simulation")
@@ -342,6 +419,11 @@ def main():
 
     with col1_content:
         grid_placeholder = st.empty()
+        st.subheader("Traffic")
+        heatmap_metric = st.radio(
+            "Heatmap", list(HEATMAP_METRICS), horizontal=True, key="heatmap_metric"
+        )
+        traffic_placeholder = st.empty()
 
     with col2_content:
         input_text = st.text_area(
@@ -370,8 +452,34 @@ Then for each car:
 - Empty line between cars (optional)
 
 Directions: N (North), S (South), E (East), W (West)
-Commands: F (Forward), L (Left turn), R (Right turn)""",
+Commands: F (Forward), L (Left turn), R (Right turn)
+Repeats: F1000 or (FFR)50 run a command or a group that many times""",
+        )
+
+        animate = st.checkbox(
+            "Animate steps",
+            value=True,
+            help="Without animation, edits re-run only the cars that changed.",
         )
+        with st.expander("Highlight cars near a point"):
+            highlight = st.checkbox("Enable highlighting")
+            query_x = st.number_input("x", min_value=0, value=0, step=1)
+            query_y = st.number_input("y", min_value=0, value=0, step=1)
+            radius = st.number_input("Radius", min_value=0.0, value=2.0, step=0.5)
+        query = (int(query_x), int(query_y), radius) if highlight else None
+        with st.expander("Viewport"):
+            st.checkbox(
+                "Fit whole grid",
+                value=True,
+                key="view_fit",
+                help=f"Large grids are shown as at most {MAX_TILES}x{MAX_TILES} "
+                "tiles counting their cars.",
+            )
+            st.number_input(
+                "Zoom (cells per tile)", min_value=1, value=1, step=1, key="view_tile"
+            )
+            st.number_input("Center x", min_value=0, value=None, step=1, key="view_x")
+            st.number_input("Center y", min_value=0, value=None, step=1, key="view_y")
 
         run_button = st.button("Run Simulation", type="primary")
 
@@ -399,11 +507,14 @@ Commands: F (Forward), L (Left turn), R (Right turn)""",
     if run_button and input_text.strip():
         st.session_state.output_capture = OutputCapture()
         st.session_state.print_capture = PrintCapture()
+        st.session_state.traffic = None
+        st.session_state.last_grid = None
 
         try:
             grid_size_x, grid_size_y, cars = parse_input(input_text)
 
-            run_simulation_step_by_step(
+            run = run_simulation_step_by_step if animate else run_simulation_instantly
+            run(
                 grid_size_x,
                 grid_size_y,
                 cars,
@@ -412,6 +523,7 @@ Commands: F (Forward), L (Left turn), R (Right turn)""",
                 console_placeholder,
                 st.session_state.print_capture,
                 print_placeholder,
+                query,
             )
 
         except Exception as e:
@@ -425,6 +537,24 @@ Commands: F (Forward), L (Left turn), R (Right turn)""",
     elif run_button and not input_text.strip():
         grid_placeholder.warning("Please enter simulation input first!")
 
+    # Kept across reruns, so panning, zooming or switching the heatmap does
+    # not re-simulate.
+    if not run_button and st.session_state.get("last_grid") is not None:
+        grid, step_info, highlighted = st.session_state.last_grid
+        grid_placeholder.markdown(
+            visualize_grid(
+                grid,
+                step_info,
+                highlighted,
+                current_viewport(grid.size_x, grid.size_y),
+            ),
+            unsafe_allow_html=True,
+        )
+    if st.session_state.get("traffic") is not None:
+        show_traffic(st.session_state.traffic, heatmap_metric, traffic_placeholder)
+    else:
+        traffic_placeholder.caption("Run a simulation to see its traffic.")
+
 
 if __name__ == "__main__":
     main()
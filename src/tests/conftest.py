@@ -0,0 +1,2 @@
+# pytest puts this directory on sys.path, so that tests can import the
+# scenarios helper.
@@ -0,0 +1,38 @@
+# Random scenarios (grid_size_x, grid_size_y, cars), with cars as
+# parse_input returns them, for the tests and scripts/fuzz_engines.py.
+
+
+def place_cars(rng, size_x, size_y, count, commands, directions="NESW"):
+    cells = rng.sample([(x, y) for x in range(size_x) for y in range(size_y)], count)
+    return [
+        [f"C{index}", f"{x} {y} {rng.choice(directions)}", commands()]
+        for index, (x, y) in enumerate(cells)
+    ]
+
+
+def random_scenario(rng) -> tuple:
+    size_x, size_y = rng.randint(1, 8), rng.randint(1, 8)
+    count = rng.randint(1, min(5, size_x * size_y))
+    commands = lambda: "".join(rng.choices("FFLR", k=rng.randint(0, 15)))
+    return size_x, size_y, place_cars(rng, size_x, size_y, count, commands)
+
+
+def edge_scenario(rng) -> tuple:
+    # Tiny, crowded grids where moves are often blocked by the edge and cars
+    # swap cells or arrive together.
+    size_x, size_y = rng.randint(1, 4), rng.randint(1, 4)
+    count = rng.randint(1, size_x * size_y)
+    commands = lambda: "".join(rng.choices("FFFLR", k=rng.randint(0, 6)))
+    return size_x, size_y, place_cars(rng, size_x, size_y, count, commands)
+
+
+def large_scenario(rng) -> tuple:
+    # Mostly turning, so that long runs happen before the first collision.
+    count = rng.randint(50, 400)
+    commands = lambda: "".join(
+        rng.choices("FLR", weights=(1, 10, 10), k=rng.randint(0, 200))
+    )
+    return 20, 20, place_cars(rng, 20, 20, count, commands)
+
+
+GENERATORS = {"random": random_scenario, "edge": edge_scenario, "large": large_scenario}
@@ -0,0 +1,81 @@
+import io
+import random
+from contextlib import redirect_stdout
+
+import numpy as np
+import pytest
+
+from application.simulation import Simulation
+from domain import Grid
+from scenarios import random_scenario
+
+
+def replayed(scenario, steps):
+    # The same aggregates from stepping Grid.next_step car by car.
+    size_x, size_y, cars = scenario
+    simulation = Simulation(*scenario)
+    grid = Grid(size_x=size_x, size_y=size_y)
+    grid.add_cars(simulation.parsed_cars)
+
+    visits = np.zeros((size_y, size_x), dtype=int)
+    dwell = np.zeros((size_y, size_x), dtype=int)
+    blocked = np.zeros((size_y, size_x), dtype=int)
+    distance = {car_id: 0 for car_id, _, _ in cars}
+    for car in grid.cars.values():
+        visits[car.y, car.x] += 1
+
+    with redirect_stdout(io.StringIO()):
+        for step in range(steps):
+            before = {car_id: car.position for car_id, car in grid.cars.items()}
+            grid.next_step()
+            for car_id, commands in ((car[0], car[2]) for car in cars):
+                car = grid.cars[car_id]
+                dwell[car.y, car.x] += 1
+                if car.position != before[car_id]:
+                    visits[car.y, car.x] += 1
+                    distance[car_id] += 1
+                elif step < len(commands) and commands[step] == "F":
+                    blocked[car.y, car.x] += 1
+    return visits, dwell, blocked, distance
+
+
+class TestTrafficStats:
+    def test_matches_replay(self):
+        rng = random.Random(45)
+        for _ in range(60):
+            scenario = random_scenario(rng)
+            simulation = Simulation(*scenario)
+            steps = rng.randint(0, simulation.max_step + 3)
+            stats = simulation.traffic_stats(steps)
+            visits, dwell, blocked, distance = replayed(scenario, steps)
+
+            assert (stats.visits == visits).all()
+            assert (stats.dwell == dwell).all()
+            assert (stats.blocked == blocked).all()
+            assert stats.car_distances() == distance
+            assert stats.dwell.sum() == stats.car_steps
+
+    def test_defaults_to_last_run(self):
+        scenario = (10, 20, [["A", "0 0 N", "FFFFF"], ["B", "0 10 S", "FFFFFFFF"]])
+        simulation = Simulation(*scenario)
+        with redirect_stdout(io.StringIO()):
+            simulation.run()
+        stats = simulation.traffic_stats()
+
+        assert stats.steps == 5
+        assert stats.car_distances() == {"A": 5, "B": 5}
+        assert stats.visits[5, 0] == 2
+
+    def test_hotspots(self):
+        scenario = (
+            5,
+            5,
+            [["A", "0 0 S", "FFFLF"], ["B", "4 4 E", "FF"], ["C", "2 2 N", "RRFF"]],
+        )
+        simulation = Simulation(*scenario)
+        stats = simulation.traffic_stats(simulation.max_step)
+
+        assert stats.hotspots("blocked") == [(0, 0, 3), (4, 4, 2)]
+        assert stats.hotspots("dwell", 2) == [(4, 4, 5), (0, 0, 4)]
+        with pytest.raises(ValueError):
+            stats.hotspots("speed")
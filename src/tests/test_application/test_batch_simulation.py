@@ -0,0 +1,71 @@
+import tracemalloc
+
+from application.batch_simulation import BatchSimulation
+from application.results import format_result
+
+
+class TestBatchSimulation:
+    def test_collision_result_format(self):
+        scenarios = [
+            (10, 10, [["A", "1 2 N", "FFRFFFFFRL"], ["B", "7 8 W", "FFLFFFFFFF"]]),
+            (5, 5, [["A", "0 0 N", "F"]]),
+        ]
+
+        results = BatchSimulation(scenarios).run()
+
+        assert results[0] == {
+            "collision": True,
+            "cars": ["A", "B"],
+            "position": (5, 4),
+            "step": 7,
+        }
+        assert format_result(results[0]) == "A B \n5 4\n7"
+        assert format_result(results[1]) == "no collision"
+
+    def test_invalid_scenarios_report_errors(self):
+        scenarios = [
+            (5, 5, [["A", "1 1 N", "F"], ["B", "1 1 S", ""]]),
+            (5, 5, [["A", "9 1 N", "F"]]),
+            (5, 5, [["A", "1 1 N", "F"], ["A", "2 2 N", ""]]),
+            (5, 5, [["A", "1 1 Q", "F"]]),
+            (5, 5, [["A", "1 1 N", "F"]]),
+        ]
+
+        results = BatchSimulation(scenarios).run()
+
+        assert "Position (1, 1) is already occupied by car A" in results[0]["error"]
+        assert "out of bounds" in results[1]["error"]
+        assert "Car with id 'A' already exists" in results[2]["error"]
+        assert "Invalid position/direction" in results[3]["error"]
+        assert results[4] == {"collision": False}
+
+    def test_empty_batch(self):
+        assert BatchSimulation([]).run() == []
+
+    def test_sizes_past_int32_are_errors(self):
+        scenarios = [
+            (2**40, 5, [["A", "0 0 N", "F"]]),
+            (5, 5, [["A", f"{2**40} 0 N", "F"]]),
+            (5, 5, [["A", f"0 {10**30} N", "F"], ["B", "0 4 S", "F"]]),
+            (5, 5, [["A", "0 4 N", "F"]]),
+        ]
+
+        results = BatchSimulation(scenarios).run()
+
+        assert "Grid size_x cannot exceed 20" in results[0]["error"]
+        assert "out of bounds" in results[1]["error"]
+        assert "out of bounds" in results[2]["error"]
+        assert results[3] == {"collision": False}
+
+    def test_long_program_does_not_pad_the_batch(self):
+        scenarios = [(5, 5, [["A", "0 0 N", "F"], ["B", "1 1 N", "R"]])] * 2000
+        scenarios.append((5, 5, [["A", "0 0 E", "LR" * 20_000]]))
+
+        tracemalloc.start()
+        batch = BatchSimulation(scenarios)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results = batch.run()
+
+        assert results == [{"collision": False}] * len(scenarios)
+        assert peak < 8 * 1024 * 1024
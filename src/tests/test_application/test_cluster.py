@@ -0,0 +1,245 @@
+import asyncio
+import io
+import json
+import random
+import socket
+from contextlib import redirect_stdout
+
+import pytest
+
+from application.cluster import (
+    Coordinator,
+    independent_groups,
+    merge_group_results,
+    parse_node,
+)
+from application.service import SimulationService, from_response, run_scenarios
+from application.simulation import Simulation
+from scenarios import large_scenario, random_scenario
+
+
+def simulated(scenario) -> dict:
+    with redirect_stdout(io.StringIO()):
+        return Simulation(*scenario).run()
+
+
+def free_port() -> int:
+    # Nothing listens here, so connecting is refused.
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_services(count: int) -> tuple[list, list]:
+    services, servers = [], []
+    for _ in range(count):
+        service = SimulationService(workers=1, max_delay=0.001)
+        await service.start()
+        services.append(service)
+        servers.append(
+            await asyncio.start_server(service.handle_connection, "127.0.0.1", 0)
+        )
+    return services, servers
+
+
+async def stop_services(services, servers) -> None:
+    for server in servers:
+        server.close()
+    for service in services:
+        await service.close()
+
+
+async def start_hanging_up_node():
+    # Accepts connections and closes them without answering.
+    async def hang_up(reader, writer):
+        await reader.readline()
+        writer.close()
+
+    return await asyncio.start_server(hang_up, "127.0.0.1", 0)
+
+
+async def start_slow_once_node():
+    # Leaves the first connection unanswered, then answers "no collision".
+    connections = []
+
+    async def answer(reader, writer):
+        connections.append(writer)
+        while line := await reader.readline():
+            if len(connections) > 1:
+                response = {"id": json.loads(line)["id"], "collision": False}
+                writer.write(json.dumps(response).encode() + b"\n")
+        writer.close()
+
+    return await asyncio.start_server(answer, "127.0.0.1", 0)
+
+
+async def start_answering_node(answer):
+    # Answers every request line with answer, whatever it asked.
+    async def respond(reader, writer):
+        while await reader.readline():
+            writer.write(json.dumps(answer).encode() + b"\n")
+        writer.close()
+
+    return await asyncio.start_server(respond, "127.0.0.1", 0)
+
+
+def address(server) -> str:
+    return "127.0.0.1:%d" % server.sockets[0].getsockname()[1]
+
+
+class TestIndependentGroups:
+    def test_groups_cars_that_can_meet(self):
+        cars = [
+            ["A", "0 0 N", "FF"],
+            ["B", "9 9 S", "F"],
+            ["C", "0 3 S", "F"],
+            ["D", "5 0 W", "RRL"],
+            ["E", "9 8 N", ""],
+        ]
+        assert independent_groups(10, 10, cars) == [[0, 2], [1, 4], [3]]
+
+    def test_merged_groups_keep_growing(self):
+        # C links A and B, which only reach each other through it.
+        cars = [
+            ["A", "0 0 N", "F"],
+            ["B", "6 0 N", "F"],
+            ["C", "3 0 E", "FF"],
+        ]
+        assert independent_groups(10, 10, cars) == [[0, 1, 2]]
+
+    def test_merged_results_match_whole_run(self):
+        rng = random.Random(47)
+        for generate in [random_scenario] * 150 + [large_scenario] * 20:
+            grid_size_x, grid_size_y, cars = generate(rng)
+            groups = independent_groups(grid_size_x, grid_size_y, cars)
+            assert sorted(sum(groups, [])) == list(range(len(cars)))
+            results = [
+                simulated((grid_size_x, grid_size_y, [cars[i] for i in group]))
+                for group in groups
+            ]
+            car_ids = [car[0] for car in cars]
+            assert merge_group_results(results, car_ids) == simulated(
+                (grid_size_x, grid_size_y, cars)
+            )
+
+    def test_same_step_ties_go_to_first_car_of_the_cell(self):
+        # D and E's group starts with A, which is not in their cell.
+        cars = [
+            ["A", "0 0 N", ""],
+            ["B", "10 10 E", "F"],
+            ["C", "12 10 W", "F"],
+            ["D", "0 1 N", "F"],
+            ["E", "0 3 S", "F"],
+        ]
+        groups = independent_groups(20, 20, cars)
+        assert groups == [[0, 3, 4], [1, 2]]
+        results = [simulated((20, 20, [cars[i] for i in group])) for group in groups]
+        merged = merge_group_results(results, [car[0] for car in cars])
+        assert merged == simulated((20, 20, cars))
+        assert merged["cars"] == ["B", "C"]
+
+    def test_early_stop_hides_later_collisions(self):
+        collision = {"collision": True, "cars": ["A", "B"], "position": (1, 1)}
+        stopped = {"collision": False, "stopped": "max_steps", "step": 4}
+        car_ids = ["A", "B", "C", "D"]
+        assert merge_group_results([{**collision, "step": 4}, stopped], car_ids) == {
+            **collision,
+            "step": 4,
+        }
+        assert merge_group_results([{**collision, "step": 5}, stopped], car_ids) == (
+            stopped
+        )
+
+
+class TestCoordinator:
+    def test_parse_node(self):
+        assert parse_node("10.0.0.2:8765") == ("10.0.0.2", 8765)
+        with pytest.raises(ValueError, match="host:port"):
+            parse_node("10.0.0.2")
+        with pytest.raises(ValueError, match="At least one"):
+            Coordinator([])
+
+    def test_runs_corpus_across_nodes_in_order(self):
+        rng = random.Random(470)
+        scenarios = [random_scenario(rng) for _ in range(60)]
+
+        async def scenario():
+            services, servers = await start_services(2)
+            hanging_up = await start_hanging_up_node()
+            try:
+                coordinator = Coordinator(
+                    [
+                        *map(address, servers),
+                        address(hanging_up),
+                        f"127.0.0.1:{free_port()}",
+                    ],
+                    unit_size=4,
+                )
+                results = await coordinator.run_async(scenarios)
+                split = await coordinator.run_split_async(scenarios[0])
+                return coordinator, results, split
+            finally:
+                hanging_up.close()
+                await stop_services(services, servers)
+
+        coordinator, results, split = asyncio.run(scenario())
+
+        assert results == [from_response(r) for r in run_scenarios(scenarios)]
+        assert split == results[0]
+        assert len(coordinator.failed_nodes) == 2
+        assert coordinator.stolen > 0
+
+    def test_units_fail_after_retries(self):
+        async def scenario():
+            hanging_up = await start_hanging_up_node()
+            try:
+                coordinator = Coordinator([address(hanging_up)] * 2, retries=1)
+                return await coordinator.run_async([(3, 3, [["A", "0 0 N", "F"]])])
+            finally:
+                hanging_up.close()
+
+        (result,) = asyncio.run(scenario())
+        assert result["error"].startswith("Work unit 0 failed")
+
+    @pytest.mark.parametrize(
+        "answer",
+        [
+            {"status": "busy"},
+            [0],
+            {"id": 5, "collision": False},
+            {"id": "0", "collision": False},
+            {"id": 0},
+        ],
+    )
+    def test_node_breaking_the_protocol_is_dropped(self, answer):
+        scenarios = [(3, 3, [["A", "0 0 N", "F"]])] * 4
+
+        async def scenario():
+            services, servers = await start_services(1)
+            broken = await start_answering_node(answer)
+            try:
+                coordinator = Coordinator(
+                    [address(broken), *map(address, servers)], unit_size=1
+                )
+                return coordinator, await coordinator.run_async(scenarios)
+            finally:
+                broken.close()
+                await stop_services(services, servers)
+
+        coordinator, results = asyncio.run(scenario())
+        assert results == [{"collision": False}] * 4
+        assert len(coordinator.failed_nodes) == 1
+
+    def test_slow_unit_keeps_its_node(self):
+        async def scenario():
+            slow_once = await start_slow_once_node()
+            try:
+                coordinator = Coordinator([address(slow_once)], timeout=0.2)
+                scenarios = [(3, 3, [["A", "0 0 N", "F"]])] * 2
+                return coordinator, await coordinator.run_async(scenarios)
+            finally:
+                slow_once.close()
+
+        coordinator, results = asyncio.run(scenario())
+        assert results == [{"collision": False}] * 2
+        assert coordinator.failed_nodes == set()
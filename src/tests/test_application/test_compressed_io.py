@@ -0,0 +1,90 @@
+import bz2
+import gzip
+import lzma
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from application.compressed_io import (
+    compression_for,
+    detect_compression,
+    open_input,
+    open_output,
+    write_ndjson,
+)
+from application.input_parser import parse_input
+from application.parallel_parser import parse_file
+from application.scenario_file import (
+    ScenarioFile,
+    is_scenario_file,
+    mappable,
+    write_scenario,
+)
+
+TEXT = "10 10\nA\n1 2 N\nFFRFFFFFRL\n\nB\n7 8 W\nFFLFFFFFFF\n"
+CODECS = {"gzip": gzip, "bz2": bz2, "xz": lzma}
+
+
+@pytest.fixture
+def directory():
+    with tempfile.TemporaryDirectory() as directory:
+        yield Path(directory)
+
+
+class TestCompressedIO:
+    @pytest.mark.parametrize("compression", [None, *CODECS])
+    def test_inputs_are_read_by_magic_bytes(self, directory, compression):
+        # The suffix says nothing: only the content counts on input.
+        path = directory / "scenario.txt"
+        if compression is None:
+            path.write_text(TEXT)
+        else:
+            path.write_bytes(CODECS[compression].compress(TEXT.encode()))
+
+        assert detect_compression(path) == compression
+        with open_input(path) as file:
+            assert file.read() == TEXT
+        assert parse_file(path, workers=1).cars() == parse_input(TEXT)[2]
+
+    @pytest.mark.parametrize(
+        "suffix, codec", [(".gz", gzip), (".bz2", bz2), (".xz", lzma)]
+    )
+    def test_outputs_are_compressed_by_suffix(self, directory, suffix, codec):
+        path = directory / f"results.ndjson{suffix}"
+        with open_output(path) as file:
+            write_ndjson(file, [{"step": 1, "cars": [["A", 1, 2, "N"]]}, {"step": 2}])
+
+        assert compression_for(path) is not None
+        assert codec.decompress(path.read_bytes()) == (
+            b'{"step":1,"cars":[["A",1,2,"N"]]}\n{"step":2}\n'
+        )
+
+    def test_compressed_binary_scenario(self, directory):
+        path = directory / "scenario.scn"
+        write_scenario(path, *parse_input(TEXT))
+        compressed = directory / "scenario.scn.xz"
+        compressed.write_bytes(lzma.compress(path.read_bytes()))
+
+        assert is_scenario_file(compressed)
+        with mappable(compressed, directory) as plain_path:
+            assert ScenarioFile(plain_path).parsed_cars() == (
+                ScenarioFile(path).parsed_cars()
+            )
+        assert sorted(p.name for p in directory.iterdir()) == [
+            "scenario.scn",
+            "scenario.scn.xz",
+        ]
+
+    def test_corrupt_inputs_raise_value_error(self, directory):
+        truncated = directory / "truncated.txt.gz"
+        truncated.write_bytes(gzip.compress(TEXT.encode())[:-12])
+        corrupt = directory / "corrupt.txt.xz"
+        data = bytearray(lzma.compress(TEXT.encode()))
+        data[24:32] = bytes(byte ^ 0xFF for byte in data[24:32])
+        corrupt.write_bytes(bytes(data))
+
+        for path, message in [(truncated, "Corrupt gzip"), (corrupt, "Corrupt xz")]:
+            with pytest.raises(ValueError, match=message):
+                with open_input(path) as file:
+                    file.read()
@@ -0,0 +1,94 @@
+import pytest
+
+from application.conformance import (
+    ENGINES,
+    check,
+    fuzz,
+    reference_outcome,
+    register_engine,
+    shrink,
+)
+from scenarios import GENERATORS
+
+
+@pytest.fixture
+def broken_engine():
+    # Misses collisions between two cars that start facing each other
+    # on the x axis.
+    def engine(scenario):
+        result, output, positions = ENGINES["trajectory"](scenario)
+        poses = {pose.split()[2] for _, pose, _ in scenario[2]}
+        if result["collision"] and poses >= {"E", "W"}:
+            result = {"collision": False}
+            output = "no collision\n"
+        return result, output, positions
+
+    register_engine("broken", engine)
+    yield "broken"
+    del ENGINES["broken"]
+
+
+class TestConformance:
+    def test_reference_outcome(self):
+        scenario = (10, 10, [["A", "0 0 E", "FFF"], ["B", "4 0 W", "FFF"]])
+        result, output, positions = reference_outcome(scenario)
+        assert result == {
+            "collision": True,
+            "cars": ["A", "B"],
+            "position": (2, 0),
+            "step": 2,
+        }
+        assert output == "A B \n2 0\n2\n"
+        assert positions == [(2, 0), (2, 0)]
+
+    def test_blocked_moves_and_turns(self):
+        scenario = (2, 2, [["A", "1 1 N", "FFRFFRFF"], ["B", "0 0 S", "FL"]])
+        assert reference_outcome(scenario)[2] == [(1, 0), (0, 0)]
+        assert check(scenario) == []
+
+    def test_engines_match_reference(self):
+        assert fuzz(seed=7, count=40, generators=GENERATORS.values()) == []
+
+    def test_register_engine_twice(self):
+        with pytest.raises(ValueError):
+            register_engine("trajectory", ENGINES["trajectory"])
+
+    def test_engine_exception_is_a_mismatch(self):
+        def engine(scenario):
+            raise RuntimeError("boom")
+
+        register_engine("raising", engine)
+        try:
+            (mismatch,) = check((3, 3, [["A", "0 0 N", "F"]]), ["raising"])
+        finally:
+            del ENGINES["raising"]
+        assert mismatch["actual"] == ("raised", "RuntimeError('boom')")
+
+    def test_shrinks_to_minimal_case(self, broken_engine):
+        scenario = (
+            8,
+            6,
+            [
+                ["A", "0 2 E", "FFLRFFRRLF"],
+                ["B", "5 2 W", "FFFLRL"],
+                ["C", "7 5 N", "LLFFR"],
+                ["D", "0 5 S", "FFRRF"],
+            ],
+        )
+        assert check(scenario, [broken_engine])
+        size_x, size_y, cars = shrink(scenario, broken_engine)
+        assert len(cars) == 2
+        assert [commands.count("F") for _, _, commands in cars] == [2, 3]
+        assert size_x <= 6 and size_y == 3
+        assert check((size_x, size_y, cars), [broken_engine])
+
+    def test_fuzz_reports_shrunk_mismatch(self, broken_engine):
+        def facing(rng):
+            return 6, 1, [["A", "0 0 E", "FFFLR"], ["B", "5 0 W", "RLFFF"]]
+
+        (mismatch,) = fuzz(seed=0, count=3, generators=[facing])
+        assert mismatch["engine"] == broken_engine
+        assert mismatch["expected"][0]["collision"]
+        assert not mismatch["actual"][0]["collision"]
+        _, _, cars = mismatch["scenario"]
+        assert sum(len(commands) for _, _, commands in cars) < 10
@@ -0,0 +1,42 @@
+from application.input_parser import parse_input
+from domain.command_store import RunLengthProgram
+
+
+class TestParseInput:
+    def test_parse_cars_with_and_without_commands(self):
+        grid_size_x, grid_size_y, cars = parse_input(
+            "10 10\n\nA\n1 2 N\nFFR\n\nB\n7 8 W\n\nC\n5 4 S\n"
+        )
+
+        assert (grid_size_x, grid_size_y) == (10, 10)
+        assert cars == [["A", "1 2 N", "FFR"], ["B", "7 8 W", ""], ["C", "5 4 S", ""]]
+
+    def test_parse_invalid_command(self):
+        try:
+            parse_input("5 5\nA\n1 1 N\nFFX\n")
+            assert False
+        except ValueError as e:
+            assert "invalid command 'X'" in str(e)
+
+    def test_parse_run_length_commands(self):
+        _, _, cars = parse_input("50 50\nA\n1 1 N\nF1000(FFR)50L\n\nB\n2 2 S\nFFL\n")
+
+        assert cars[0][2] == RunLengthProgram(
+            [(b"\0", 1000), (b"\0\0\2", 50), (b"\1", 1)]
+        )
+        assert len(cars[0][2]) == 1151
+        assert cars[1][2] == "FFL"
+
+    def test_parse_invalid_run_length_commands(self):
+        try:
+            parse_input("5 5\nA\n1 1 N\n(FF3\n")
+            assert False
+        except ValueError as e:
+            assert "Car 1 ('A'): Unmatched '('" in str(e)
+
+    def test_parse_empty_input(self):
+        try:
+            parse_input("\n\n")
+            assert False
+        except ValueError as e:
+            assert "Empty input!" in str(e)
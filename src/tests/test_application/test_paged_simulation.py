@@ -0,0 +1,161 @@
+import io
+import logging
+import tempfile
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import pytest
+
+from application.paged_simulation import PagedSimulation
+from application.run_control import MAX_STEPS, RunControl
+from application.scenario_file import ScenarioFile, write_scenario
+from application.simulation import Simulation
+from domain.metrics import Metrics
+
+# A and B meet at (0, 5) after 5 steps; C keeps turning for 150 steps, past
+# several program windows, then drives into the east edge.
+SCENARIO = (
+    10,
+    20,
+    [
+        ["A", "0 0 N", "FFFFF"],
+        ["B", "0 10 S", "FFFFF"],
+        ["C", "9 9 N", "L" * 150 + "RFF"],
+        ["D", "5 5 E", ""],
+    ],
+)
+CLEAR = (
+    10,
+    20,
+    [
+        ["A", "0 0 N", "FFF"],
+        ["B", "9 19 E", "FFRF"],
+        ["C", "5 5 W", "L" * 100 + "F"],
+    ],
+)
+
+
+@pytest.fixture
+def directory():
+    with tempfile.TemporaryDirectory() as directory:
+        yield Path(directory)
+
+
+def paged(directory, scenario, **kwargs) -> PagedSimulation:
+    path = directory / "scenario.scn"
+    write_scenario(path, *scenario)
+    kwargs.setdefault("block_cars", 1)
+    kwargs.setdefault("cache_bytes", 1)
+    return PagedSimulation(ScenarioFile(path), directory, **kwargs)
+
+
+def run(simulation, control=None):
+    with redirect_stdout(io.StringIO()) as output:
+        result = simulation.run(control)
+    return result, output.getvalue()
+
+
+class TestPagedSimulation:
+    @pytest.mark.parametrize("scenario", [SCENARIO, CLEAR])
+    def test_matches_simulation(self, directory, scenario):
+        with redirect_stdout(io.StringIO()) as expected_output:
+            reference = Simulation(*scenario)
+            expected = reference.run()
+        simulation = paged(directory, scenario)
+
+        assert run(simulation) == (expected, expected_output.getvalue())
+        assert simulation.final_positions() == [
+            car.position for car in reference.grid.cars.values()
+        ]
+        assert simulation.current_step == reference.grid.current_step
+        simulation.close()
+
+    def test_pages_blocks_through_the_cache(self, directory):
+        simulation = paged(directory, CLEAR)
+        run(simulation)
+
+        assert len(simulation.store) == 3
+        assert simulation.store.cache_blocks == 1
+        assert simulation.store.reads > 0 and simulation.store.writes > 0
+        simulation.close()
+
+    def test_parks_finished_cars(self, directory):
+        simulation = paged(directory, CLEAR, block_cars=2)
+        # C starts in the second block; A and B are in the first.
+        assert simulation.store.used == [2, 1]
+        run(simulation)
+
+        assert simulation.store.used == [0, 0]
+        assert simulation.store.parked == 3
+        parked = [
+            (int(car["index"]), int(car["x"]), int(car["y"]))
+            for chunk in simulation.store.iter_parked()
+            for car in chunk
+        ]
+        assert parked == [(0, 0, 3), (1, 9, 18), (2, 4, 5)]
+        simulation.close()
+
+    def test_parks_cars_without_commands_on_load(self, directory):
+        simulation = paged(directory, SCENARIO, block_cars=4)
+        assert simulation.store.used == [3]
+        assert simulation.store.parked == 1
+        simulation.close()
+
+    def test_logs_blocked_moves_like_simulation(self, directory, caplog):
+        scenario = (3, 3, [["A", "2 2 N", "FRF"], ["B", "0 0 W", "FLF"]])
+        with caplog.at_level(logging.WARNING):
+            with redirect_stdout(io.StringIO()):
+                Simulation(*scenario).run()
+            expected = [record.getMessage() for record in caplog.records]
+            caplog.clear()
+            simulation = paged(directory, scenario)
+            run(simulation)
+        simulation.close()
+
+        assert [record.getMessage() for record in caplog.records] == expected
+        assert expected == [
+            "Car A cannot move to (2, 3) - out of bounds",
+            "Car B cannot move to (-1, 0) - out of bounds",
+            "Car A cannot move to (3, 2) - out of bounds",
+            "Car B cannot move to (0, -1) - out of bounds",
+        ]
+
+    def test_counts_metrics(self, directory):
+        metrics = Metrics()
+        simulation = paged(directory, CLEAR, metrics=metrics)
+        run(simulation)
+        simulation.close()
+
+        counts = metrics.snapshot()
+        assert counts["steps"] == 101
+        assert counts["car_steps"] == 3 + 4 + 101
+        assert counts["blocked_moves"] == 2
+
+    def test_stops_at_step_limit(self, directory):
+        simulation = paged(directory, SCENARIO)
+        result, output = run(simulation, RunControl(max_steps=3))
+        simulation.close()
+
+        assert result == {"collision": False, "stopped": MAX_STEPS, "step": 3}
+        assert output == ""
+
+    @pytest.mark.parametrize(
+        "cars, message",
+        [
+            (
+                [["A", "1 1 N", ""], ["B", "4 0 N", ""]],
+                r"Car position \(4, 0\) is out of bounds on grid size 4x4",
+            ),
+            (
+                [["A", "1 1 N", ""], ["B", "2 2 N", ""], ["C", "1 1 S", ""]],
+                r"Position \(1, 1\) is already occupied by car A",
+            ),
+        ],
+    )
+    def test_rejects_invalid_cars(self, directory, cars, message):
+        with pytest.raises(ValueError, match=message):
+            paged(directory, (4, 4, cars))
+
+    def test_rejects_oversized_grid(self, directory):
+        with pytest.raises(ValueError, match="Grid size_x cannot exceed 20"):
+            paged(directory, (21, 4, [["A", "1 1 N", ""]]))
@@ -0,0 +1,110 @@
+import random
+import re
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from application.input_parser import parse_input
+from application.parallel_parser import chunk_bounds, parse_file
+from application.scenario_file import write_scenario
+from domain.command_store import command_text
+
+
+@pytest.fixture
+def directory():
+    with tempfile.TemporaryDirectory() as directory:
+        yield Path(directory)
+
+
+def random_text(rng) -> str:
+    # Layouts parse_input has to tell apart: optional blank lines and
+    # commands, ids that read as commands or have spaces, repeats, CRLF.
+    size_x, size_y = rng.randint(1, 12), rng.randint(1, 12)
+    cells = rng.sample(
+        [(x, y) for x in range(size_x) for y in range(size_y)],
+        rng.randint(1, min(40, size_x * size_y)),
+    )
+    lines = ["", f"{size_x} {size_y}"]
+    for index, (x, y) in enumerate(cells):
+        lines += [""] * rng.randint(0, 2)
+        lines.append(
+            rng.choice([f"C{index}", f"FL{index}", f"car {index}", "é%d" % index])
+        )
+        lines.append(f"{x} {y} {rng.choice('NESWnesw')}")
+        commands = rng.choice(
+            ["", "".join(rng.choices("FLR", k=rng.randint(1, 12))), "F2(LR)3", "R"]
+        )
+        if commands or rng.random() < 0.5:
+            lines.append(commands)
+    newline = rng.choice(["\n", "\r\n"])
+    return newline.join(lines) + newline * rng.randint(0, 2)
+
+
+def expected_cars(text: str) -> list:
+    _, _, cars = parse_input(text)
+    return [
+        [car_id, "%s %s %s" % tuple(pose.upper().split()), command_text(commands)]
+        for car_id, pose, commands in cars
+    ]
+
+
+class TestParallelParser:
+    def test_matches_parse_input_at_any_chunking(self, directory):
+        rng = random.Random(49)
+        path = directory / "scenario.txt"
+        for _ in range(100):
+            text = random_text(rng)
+            path.write_text(text)
+            for chunk_bytes in (1, 7, 40, 1 << 20):
+                scenario = parse_file(path, workers=1, chunk_bytes=chunk_bytes)
+                assert scenario.cars() == expected_cars(text)
+
+    def test_chunks_start_at_records(self, directory):
+        text = "3 3\nA\n0 0 N\nFF\nB\n1 1 E\n\nFL\n2 2 S\nLR\n"
+        path = directory / "scenario.txt"
+        path.write_text(text)
+        data = path.read_bytes()
+        starts = [start for start, _ in chunk_bounds(data, 4, len(data), 20)]
+        assert [data[start:].split(b"\n")[0] for start in starts] == [
+            b"A",
+            b"B",
+            b"FL",
+        ]
+
+    def test_worker_processes_write_the_same_file(self, directory):
+        text = random_text(random.Random(490))
+        path = directory / "scenario.txt"
+        path.write_text(text)
+        scenario = parse_file(path, workers=3, chunk_bytes=16)
+        assert scenario.cars() == expected_cars(text)
+
+        scenario.write(directory / "parallel.scn")
+        write_scenario(directory / "sequential.scn", *parse_input(text))
+        assert (directory / "parallel.scn").read_bytes() == (
+            directory / "sequential.scn"
+        ).read_bytes()
+
+    @pytest.mark.parametrize(
+        "text, message",
+        [
+            (
+                "3 3\nA\n0 0 N\nB\n0 0 E\n",
+                "Position (0, 0) is already occupied by car A",
+            ),
+            ("3 3\nA\n0 0 N\nA\n1 0 E\n", "Car with id 'A' already exists"),
+            ("3 3\nA\n0 0 N\nB\n3 0 E\n", "Car position (3, 0) is out of bounds"),
+            ("1 1\nA\n0 0 N\nB\n0 0 E\n", "Cannot add more cars"),
+            ("3 3\nA\n0 0 X\n", "Car 1 ('A') has invalid position/direction"),
+            ("3 3\nA\n0 0 N\nFX\n", "Car 1 ('A') has invalid command 'X'"),
+            ("3 3\nA\n0 0 N\nF\nB\n", "Car 2 ('B') missing position and direction"),
+            ("3\nA\n0 0 N\n", "Invalid grid size format: '3'"),
+            ("\n\n", "Empty input!"),
+            ("3 3\n\n", "No cars found in input!"),
+        ],
+    )
+    def test_errors(self, directory, text, message):
+        path = directory / "scenario.txt"
+        path.write_text(text)
+        with pytest.raises(ValueError, match=re.escape(message)):
+            parse_file(path, workers=1, chunk_bytes=1)
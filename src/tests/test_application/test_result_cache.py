@@ -0,0 +1,127 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from application.result_cache import (
+    ResultCache,
+    make_entry,
+    resolve_entry,
+    scenario_key,
+)
+from domain.command_store import parse_run_length
+from domain.kernel import kernel_outcome
+
+CARS = [["A", "1 2 N", "FFRFFFFFRL"], ["B", "7 8 W", "FFLFFFFFFF"]]
+
+
+def write_entries(cache_dir, start):
+    cache = ResultCache(cache_dir)
+    for index in range(start, start + 20):
+        cache.put(f"{index:064x}", {"collision": False})
+
+
+class TestScenarioKey:
+    def test_ignores_car_order_and_whitespace(self):
+        reordered = [["B", "7  8 w", "FFLFFFFFFF"], ["A", " 1 2 N", "FFRFFFFFRL"]]
+        assert scenario_key(10, 10, CARS) == scenario_key(10, 10, reordered)
+
+    def test_depends_on_grid_and_programs(self):
+        key = scenario_key(10, 10, CARS)
+        assert key != scenario_key(11, 10, CARS)
+        assert key != scenario_key(10, 10, [CARS[0], ["B", "7 8 W", "FFLFFFFFFR"]])
+
+    def test_run_length_programs_are_keyed_by_text(self, monkeypatch):
+        program = parse_run_length("F1000000000")
+        monkeypatch.setattr(type(program), "to_bytes", None)
+        key = scenario_key(10, 10, [["A", "0 0 N", program]])
+        assert key != scenario_key(10, 10, [["A", "0 0 N", parse_run_length("F999")]])
+
+
+class TestEntries:
+    def test_resolve_uses_caller_car_order(self):
+        # Two cells collide on the same step; the reported one depends on order.
+        cars = [
+            ["A", "0 0 E", "F"],
+            ["B", "2 0 W", "F"],
+            ["C", "0 2 E", "F"],
+            ["D", "2 2 W", "F"],
+        ]
+        result, positions = kernel_outcome(5, 5, cars)
+        entry = make_entry(result, [car[0] for car in cars], positions)
+
+        assert resolve_entry(entry, ["A", "B", "C", "D"]) == result
+        reordered = kernel_outcome(5, 5, [cars[3], cars[2], cars[1], cars[0]])[0]
+        assert resolve_entry(entry, ["D", "C", "B", "A"]) == reordered
+        assert reordered["cars"] == ["D", "C"]
+
+
+class TestResultCache:
+    def test_lookup_after_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(directory)
+            assert cache.lookup(10, 10, CARS) is None
+
+            result, positions = kernel_outcome(10, 10, CARS)
+            cache.store(10, 10, CARS, result, positions)
+
+            assert ResultCache(directory).lookup(10, 10, CARS) == result
+
+    def test_errors_are_not_cached(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(directory)
+            cache.store(10, 10, CARS, {"error": "boom"}, [])
+            assert cache.lookup(10, 10, CARS) is None
+
+    def test_eviction_drops_least_recently_used(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(directory, max_bytes=10**6)
+            keys = [f"{index:064x}" for index in range(5)]
+            for offset, key in enumerate(keys):
+                cache.put(key, {"collision": False})
+                path = cache._path(key)
+                os.utime(path, (time.time() - 100 + offset,) * 2)
+            cache.get(keys[0])
+
+            entry_size = os.path.getsize(cache._path(keys[0]))
+            cache.max_bytes = entry_size * 3
+            cache.evict()
+
+            remaining = [key for key in keys if cache.get(key) is not None]
+            assert remaining == [keys[0], keys[3], keys[4]]
+
+    def test_concurrent_writers(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with ProcessPoolExecutor(max_workers=4) as executor:
+                list(executor.map(write_entries, [directory] * 4, [0, 10, 20, 30]))
+
+            cache = ResultCache(directory)
+            assert all(
+                cache.get(f"{index:064x}") == {"collision": False}
+                for index in range(50)
+            )
+            leftovers = [
+                name
+                for _, _, names in os.walk(directory)
+                for name in names
+                if name.endswith(".tmp")
+            ]
+            assert leftovers == []
+
+    def test_one_entry_per_process_still_evicts(self):
+        # As main.py --cache-dir does: a new cache, and one put, per run.
+        with tempfile.TemporaryDirectory() as directory:
+            entry_size = len(b'{"collision":false}')
+            for index in range(40):
+                cache = ResultCache(directory, max_bytes=entry_size * 20)
+                cache.put(f"{index:064x}", {"collision": False})
+            assert cache.size() <= entry_size * 20
+
+    def test_malformed_entries_are_misses(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(directory)
+            key = scenario_key(10, 10, CARS)
+            for entry in [{"collision": True, "step": 3}, {"step": 3}, [1, 2]]:
+                cache.put(key, entry)
+                assert cache.get(key) is None
+                assert cache.lookup(10, 10, CARS) is None
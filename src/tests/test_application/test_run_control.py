@@ -0,0 +1,139 @@
+import io
+import random
+import time
+from contextlib import closing, redirect_stdout
+
+import pytest
+
+from application.batch_simulation import BatchSimulation
+from application.results import format_result
+from application.run_control import CancellationToken, RunControl
+from application.service import run_scenarios
+from application.simulation import Simulation
+from domain.trajectory import TrajectoryMemo
+from scenarios import random_scenario
+
+# A and B meet at (0, 5) after 5 steps; C keeps driving for 20.
+SCENARIO = (
+    10,
+    20,
+    [["A", "0 0 N", "FFFFF"], ["B", "0 10 S", "FFFFF"], ["C", "5 0 N", "F" * 19]],
+)
+CLEAR = (10, 20, [["A", "0 0 N", "F" * 19], ["B", "5 19 S", "F" * 19]])
+
+
+def run(scenario, control):
+    with redirect_stdout(io.StringIO()) as output:
+        result = Simulation(*scenario).run(control)
+    return result, output.getvalue()
+
+
+class TestRunControl:
+    def test_negative_max_steps(self):
+        with pytest.raises(ValueError):
+            RunControl(max_steps=-1)
+
+    def test_stop_reasons(self):
+        token = CancellationToken()
+        assert RunControl(token=token).stop_reason() is None
+        token.cancel()
+        assert RunControl(token=token).stop_reason() == "cancelled"
+        assert RunControl(deadline=time.monotonic() - 1).stop_reason() == "deadline"
+        assert RunControl.with_timeout(60).stop_reason() is None
+
+    def test_progress_is_throttled_by_steps(self):
+        reports = []
+        control = RunControl(
+            progress=lambda step, total: reports.append(step), progress_every=3
+        )
+        for step in range(1, 11):
+            control.report(step, 10)
+        assert reports == [3, 6, 9]
+
+
+class TestControlledSimulation:
+    def test_matches_uncontrolled_run(self):
+        for scenario in (SCENARIO, CLEAR):
+            assert run(scenario, RunControl()) == run(scenario, None)
+
+    def test_max_steps_returns_partial_result(self):
+        result, output = run(CLEAR, RunControl(max_steps=7))
+        assert result == {"collision": False, "stopped": "max_steps", "step": 7}
+        assert output == ""
+        assert format_result(result) == "no collision up to step 7 (stopped: max_steps)"
+
+    def test_budget_beyond_collision_still_finds_it(self):
+        result, _ = run(SCENARIO, RunControl(max_steps=5))
+        assert result["collision"] and result["step"] == 5
+
+    def test_cancelled_between_steps(self):
+        token = CancellationToken()
+        steps = []
+
+        def progress(step, total):
+            steps.append(step)
+            if step >= 4:
+                token.cancel()
+
+        result, _ = run(CLEAR, RunControl(token=token, progress=progress))
+        assert result == {"collision": False, "stopped": "cancelled", "step": 4}
+        assert steps == [1, 2, 3, 4]
+
+    def test_expired_deadline_stops_before_first_step(self):
+        result, _ = run(CLEAR, RunControl(deadline=time.monotonic()))
+        assert result == {"collision": False, "stopped": "deadline", "step": 0}
+
+
+class TestLongPrograms:
+    # Two cars turning in place for 2M steps: limits must hold without the
+    # whole programs being joined first.
+    CARS = [["A", "0 0 N", "LR" * 1_000_000], ["B", "5 5 N", "RL" * 1_000_000]]
+
+    def timed(self, control):
+        simulation = Simulation(10, 10, self.CARS, memo=TrajectoryMemo(2**30))
+        started = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            result = simulation.run(control)
+        return result, time.perf_counter() - started
+
+    def test_deadline_is_kept(self):
+        result, elapsed = self.timed(RunControl.with_timeout(0.05))
+        assert result["stopped"] == "deadline" and result["step"] > 0
+        assert elapsed < 0.5
+
+    def test_max_steps_with_a_cold_memo(self):
+        result, elapsed = self.timed(RunControl(max_steps=10))
+        assert result == {"collision": False, "stopped": "max_steps", "step": 10}
+        assert elapsed < 0.2
+
+    def test_first_steps_come_at_once(self):
+        simulation = Simulation(10, 10, self.CARS, memo=TrajectoryMemo(2**30))
+        started = time.perf_counter()
+        with closing(simulation.iter_steps()) as steps:
+            assert [next(steps).step for _ in range(10)] == list(range(1, 11))
+        assert time.perf_counter() - started < 0.2
+        assert simulation.grid.current_step == 10
+
+
+class TestControlledBatch:
+    def test_max_steps(self):
+        scenarios = [SCENARIO, CLEAR, (2, 2, [["A", "0 0 N", "F"]])]
+        results = BatchSimulation(scenarios).run(RunControl(max_steps=6))
+        assert results[0]["collision"] and results[0]["step"] == 5
+        assert results[1] == {"collision": False, "stopped": "max_steps", "step": 6}
+        assert results[2] == {"collision": False}
+
+    def test_matches_controlled_simulation(self):
+        rng = random.Random(38)
+        scenarios = [random_scenario(rng) for _ in range(100)]
+
+        results = BatchSimulation(scenarios).run(RunControl(max_steps=5))
+        for scenario, result in zip(scenarios, results):
+            assert result == run(scenario, RunControl(max_steps=5))[0]
+
+    def test_service_budget(self):
+        (response,) = run_scenarios([CLEAR], max_steps=3)
+        assert response["stopped"] == "max_steps"
+        assert response["output"] == "no collision up to step 3 (stopped: max_steps)"
+        (response,) = run_scenarios([CLEAR], timeout=0)
+        assert response["stopped"] == "deadline"
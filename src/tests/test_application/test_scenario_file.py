@@ -0,0 +1,82 @@
+import io
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from application.input_parser import parse_input
+from application.scenario_file import (
+    SCENARIO_HEADER,
+    ScenarioFile,
+    is_scenario_file,
+    write_scenario,
+)
+from application.simulation import Simulation
+
+TEXT = "10 10\n\nA\n1 2 N\nFFRFFFFFRL\n\nBé\n7 8 w\nFFLFFFFFFF\n\nC\n5 4 S\n\n"
+
+
+@pytest.fixture
+def directory():
+    with tempfile.TemporaryDirectory() as directory:
+        yield Path(directory)
+
+
+class TestScenarioFile:
+    def test_round_trip(self, directory):
+        path = directory / "scenario.scn"
+        write_scenario(path, *parse_input(TEXT))
+
+        scenario = ScenarioFile(path)
+        assert is_scenario_file(path)
+        assert (scenario.size_x, scenario.size_y, len(scenario)) == (10, 10, 3)
+        assert scenario.car_ids == ["A", "Bé", "C"]
+        assert scenario.car_id(1) == "Bé"
+        assert scenario.max_step == 10
+
+        text = io.StringIO()
+        scenario.write_text(text)
+        grid_x, grid_y, cars = parse_input(text.getvalue())
+        assert cars == [
+            ["A", "1 2 N", "FFRFFFFFRL"],
+            ["Bé", "7 8 W", "FFLFFFFFFF"],
+            ["C", "5 4 S", ""],
+        ]
+
+    def test_programs_stay_in_the_mapping(self, directory):
+        path = directory / "scenario.scn"
+        write_scenario(path, *parse_input(TEXT))
+
+        simulation = Simulation.from_scenario(ScenarioFile(path))
+        program = simulation.grid.cars["A"].program
+        assert program.to_bytes() == b"\x00\x00\x02\x00\x00\x00\x00\x00\x02\x01"
+        assert isinstance(program._store._buffer, memoryview)
+
+    def test_rejects_other_files(self, directory):
+        path = directory / "input.txt"
+        path.write_text(TEXT)
+
+        assert not is_scenario_file(path)
+        with pytest.raises(ValueError):
+            ScenarioFile(path)
+
+    def test_rejects_truncated_and_corrupt_files(self, directory):
+        path = directory / "scenario.scn"
+        write_scenario(path, *parse_input(TEXT))
+        data = path.read_bytes()
+        directions = SCENARIO_HEADER.size + 16 * 4 + 8 * 3
+
+        for corrupt in [
+            *(data[:size] for size in range(len(data))),
+            data + b"F",
+            data[:directions] + b"\x07" + data[directions + 1 :],
+        ]:
+            path.write_bytes(corrupt)
+            with pytest.raises(ValueError, match="not a scenario file"):
+                ScenarioFile(path)
+
+    def test_rejects_duplicate_ids(self, directory):
+        path = directory / "scenario.scn"
+        with pytest.raises(ValueError, match="Car with id 'A' already exists"):
+            write_scenario(path, 5, 5, [["A", "0 0 N", ""], ["A", "1 1 N", ""]])
+        assert not path.exists()
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from application.service import (
+    MicroBatcher,
+    SimulationService,
+    parse_request,
+    run_scenarios,
+    to_request,
+)
+from domain.command_store import parse_run_length
+
+INPUT_TEXT = "10 10\nA\n1 2 N\nFFRFFFFFRL\n\nB\n7 8 W\nFFLFFFFFFF\n"
+
+
+class TestParseRequest:
+    def test_parse_text_input(self):
+        grid_size_x, grid_size_y, cars = parse_request({"input": INPUT_TEXT})
+        assert (grid_size_x, grid_size_y) == (10, 10)
+        assert cars[1] == ["B", "7 8 W", "FFLFFFFFFF"]
+
+    def test_parse_json_scenario(self):
+        request = {
+            "scenario": {
+                "grid": [5, 5],
+                "cars": [{"id": "A", "x": 1, "y": 2, "direction": "N"}],
+            }
+        }
+        assert parse_request(request) == (5, 5, [["A", "1 2 N", ""]])
+
+    def test_run_length_programs_round_trip(self):
+        scenario = (20, 20, [["A", "1 2 N", parse_run_length("F10(LR)5")]])
+        request = to_request(scenario)
+        assert request["scenario"]["cars"][0]["commands"] == "F10(LR)5"
+        assert parse_request(request) == scenario
+
+    def test_parse_invalid_request(self):
+        try:
+            parse_request({"scenario": {"grid": [5, 5]}})
+            assert False
+        except ValueError as e:
+            assert "Invalid scenario object" in str(e)
+
+    def test_rejects_malformed_scenario_objects(self):
+        car = {"id": "A", "x": 1, "y": 2, "direction": "N", "commands": "F"}
+        for grid, changes, message in [
+            ([None, 5], {}, "'grid' must be an integer"),
+            ([5.5, 5], {}, "'grid' must be an integer"),
+            ([0, 5], {}, "'grid' must be an integer of at least 1"),
+            ([5, 5], {"x": -1}, "'x' must be an integer of at least 0"),
+            ([5, 5], {"y": "2"}, "'y' must be an integer"),
+            ([5, 5], {"direction": "Q"}, "direction must be N, E, S or W"),
+            ([5, 5], {"commands": "FXF"}, "invalid command 'X' in 'FXF'"),
+            ([5, 5], {"commands": 5}, "commands must be a string"),
+            ([5, 5], {"commands": "F0"}, "Invalid scenario object"),
+            ([5, 5], {"id": ""}, "'id' must be a non-empty string"),
+        ]:
+            request = {"scenario": {"grid": grid, "cars": [{**car, **changes}]}}
+            with pytest.raises(ValueError, match=re.escape(message)):
+                parse_request(request)
+        with pytest.raises(ValueError, match="'input' must be"):
+            parse_request({"input": 5})
+
+
+class TestRunScenarios:
+    def test_results_are_json_ready(self):
+        results = run_scenarios([parse_request({"input": INPUT_TEXT})])
+
+        assert results == [
+            {
+                "collision": True,
+                "cars": ["A", "B"],
+                "position": [5, 4],
+                "step": 7,
+                "output": "A B \n5 4\n7",
+            }
+        ]
+        json.dumps(results)
+
+    def test_run_length_programs_are_not_expanded(self):
+        scenarios = [
+            parse_request({"input": INPUT_TEXT}),
+            (10, 10, [["A", "0 0 N", parse_run_length("R2000000F999999999")]]),
+            (10, 10, [["A", "0 0 N", parse_run_length("F3")], ["A", "1 1 N", ""]]),
+        ]
+        started = time.perf_counter()
+        results = run_scenarios(scenarios)
+        assert time.perf_counter() - started < 1
+
+        assert results[0]["step"] == 7
+        assert results[1] == {"collision": False, "output": "no collision"}
+        assert results[2]["error"] == "Car with id 'A' already exists"
+
+
+class TestMicroBatcher:
+    def test_concurrent_requests_share_batches(self):
+        async def scenario():
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                batcher = MicroBatcher(executor, max_batch=8, max_delay=0.05)
+                task = asyncio.create_task(batcher.run())
+                requests = [(5, 5, [["A", f"{i % 5} 0 N", "F"]]) for i in range(20)]
+                results = await asyncio.gather(*map(batcher.submit, requests))
+                task.cancel()
+                return results
+
+        results = asyncio.run(scenario())
+
+        assert len(results) == 20
+        assert all(result["output"] == "no collision" for result in results)
+
+    def test_failing_scenario_does_not_fail_its_batch(self):
+        async def scenario():
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                batcher = MicroBatcher(executor, max_batch=8, max_delay=0.05)
+                task = asyncio.create_task(batcher.run())
+                requests = [(5, 5, [["A", "0 0 N", "F"]])] * 3
+                # Malformed past parse_request: BatchSimulation raises on it.
+                requests.insert(1, (5, 5, None))
+                results = await asyncio.gather(*map(batcher.submit, requests))
+                task.cancel()
+                return results
+
+        results = asyncio.run(scenario())
+
+        assert results[1]["error"].startswith("Worker failed")
+        assert (
+            results[1]["output"] == "ERROR: Simulation failed: " + results[1]["error"]
+        )
+        assert [results[i]["output"] for i in (0, 2, 3)] == ["no collision"] * 3
+
+
+class TestSimulationService:
+    def test_serves_requests_over_unix_socket(self):
+        async def scenario(path):
+            service = SimulationService(workers=1, max_delay=0.001)
+            await service.start()
+            server = await asyncio.start_unix_server(
+                service.handle_connection, path=path
+            )
+            try:
+                reader, writer = await asyncio.open_unix_connection(path)
+                for request in (
+                    {"id": 1, "input": INPUT_TEXT},
+                    {"id": 2, "input": "bad"},
+                ):
+                    writer.write(json.dumps(request).encode() + b"\n")
+                writer.write(b"[1]\n")
+                await writer.drain()
+                responses = [json.loads(await reader.readline()) for _ in range(3)]
+                writer.close()
+                return sorted(responses, key=lambda response: response.get("id", 0))
+            finally:
+                server.close()
+                await service.close()
+
+        with tempfile.TemporaryDirectory() as directory:
+            responses = asyncio.run(scenario(os.path.join(directory, "sim.sock")))
+
+        assert responses[0] == {
+            "error": "Invalid request: Request must be a JSON object",
+            "output": "ERROR: Simulation failed: "
+            "Invalid request: Request must be a JSON object",
+        }
+        assert responses[1]["output"] == "A B \n5 4\n7"
+        assert "Invalid grid size format" in responses[2]["error"]
+        assert responses[2]["output"].startswith("ERROR: Simulation failed: Invalid")
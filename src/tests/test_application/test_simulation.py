@@ -1,5 +1,19 @@
+import asyncio
+import io
+import logging
+import random
+import tracemalloc
+from contextlib import closing, redirect_stdout
+
+import pytest
+
+from application import simulation as simulation_module
+from application.conformance import reference_outcome, simulation_outcome
 from application.simulation import Simulation, parse_direction
 from constants import Direction
+from domain.command_store import parse_run_length
+from domain.trajectory import TrajectoryMemo
+from scenarios import edge_scenario, place_cars, random_scenario
 
 
 class TestParseDirection:
@@ -60,3 +74,210 @@ class TestSimulation:
         cars = [["A", "1 2 N", "F"], ["B", "5 5 S", ""], ["C", "8 8 E", "FFRFRF"]]
         simulation = Simulation(10, 10, cars)
         assert simulation.max_step == 6
+
+    def test_simulation_run_returns_collision_result(self):
+        cars = [["A", "1 2 N", "FFRFFFFFRL"], ["B", "7 8 W", "FFLFFFFFFF"]]
+        simulation = Simulation(10, 10, cars)
+        result = simulation.run()
+        assert result == {
+            "collision": True,
+            "cars": ["A", "B"],
+            "position": (5, 4),
+            "step": 7,
+        }
+
+    def test_simulation_run_without_collision(self):
+        simulation = Simulation(10, 10, [["A", "1 2 N", "FF"]])
+        assert simulation.run() == {"collision": False}
+
+    def test_windowed_runs_match_the_reference(self, monkeypatch):
+        monkeypatch.setattr(simulation_module, "WINDOW_WORK", 5)
+        rng = random.Random(32)
+        for _ in range(200):
+            scenario = rng.choice([random_scenario, edge_scenario])(rng)
+            assert simulation_outcome(scenario) == reference_outcome(scenario)
+
+    def test_early_collision_computes_only_the_first_window(self):
+        program = "F" + "LR" * 200_000
+        cars = [["A", "0 0 E", program], ["B", "2 0 W", program]]
+        simulation = Simulation(10, 10, cars, memo=TrajectoryMemo(2**30))
+
+        tracemalloc.start()
+        with redirect_stdout(io.StringIO()):
+            result = simulation.run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        assert result == {
+            "collision": True,
+            "cars": ["A", "B"],
+            "position": (1, 0),
+            "step": 1,
+        }
+        assert peak < 1024 * 1024
+
+    def test_long_run_length_programs_are_not_expanded(self, caplog):
+        # Every blocked move would be logged as a warning.
+        caplog.set_level(logging.ERROR)
+        cars = [
+            ["A", "0 1 N", parse_run_length("F100000000")],
+            ["B", "5 5 E", parse_run_length("(LR)50000000")],
+            ["C", "0 0 E", parse_run_length("(FFLFFR)10000000")],
+        ]
+        simulation = Simulation(10, 10, cars, memo=TrajectoryMemo(2**30))
+
+        tracemalloc.start()
+        with redirect_stdout(io.StringIO()):
+            result = simulation.run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        assert result == {"collision": False}
+        assert simulation.grid.cars["A"].position == (0, 9)
+        assert simulation.grid.cars["C"].position == (9, 9)
+        assert simulation.metrics.snapshot()["blocked_moves"] > 10**8
+        assert peak < 1024 * 1024
+
+
+def random_edit(rng, cars, size_x, size_y):
+    cars = [list(car) for car in cars]
+    edit = rng.choice(["commands", "pose", "remove", "add", "swap"])
+    index = rng.randrange(len(cars))
+    if edit == "commands":
+        commands = cars[index][2]
+        cut = rng.randint(0, len(commands))
+        cars[index][2] = commands[:cut] + rng.choice(["F", "L", "R", "FF", ""])
+    elif edit == "pose":
+        cars[index][1] = f"{rng.randrange(size_x)} {rng.randrange(size_y)} N"
+    elif edit == "remove" and len(cars) > 1:
+        del cars[index]
+    elif edit == "add":
+        cars.append(["Z", f"{rng.randrange(size_x)} {rng.randrange(size_y)} E", "FFF"])
+    else:
+        cars.insert(0, cars.pop(index))
+    return cars
+
+
+class TestSimulationRerun:
+    def test_matches_fresh_simulation_after_random_edits(self):
+        rng = random.Random(33)
+        commands = lambda: "".join(rng.choices("FFLR", k=rng.randint(0, 15)))
+        for _ in range(100):
+            size_x, size_y = rng.randint(2, 8), rng.randint(2, 8)
+            cars = place_cars(rng, size_x, size_y, rng.randint(1, 4), commands)
+            simulation = Simulation(size_x, size_y, cars)
+            with redirect_stdout(io.StringIO()):
+                simulation.run()
+
+            for _ in range(5):
+                previous, cars = cars, random_edit(rng, cars, size_x, size_y)
+                try:
+                    with redirect_stdout(io.StringIO()) as expected_output:
+                        fresh = Simulation(size_x, size_y, cars)
+                        expected = fresh.run()
+                except ValueError:
+                    with pytest.raises(ValueError):
+                        simulation.rerun(cars)
+                    cars = previous
+                    continue
+
+                with redirect_stdout(io.StringIO()) as output:
+                    result = simulation.rerun(cars)
+
+                assert result == expected
+                assert output.getvalue() == expected_output.getvalue()
+                assert simulation.max_step == fresh.max_step
+                assert [
+                    (car_id, car.position, car.direction)
+                    for car_id, car in simulation.grid.cars.items()
+                ] == [
+                    (car_id, car.position, car.direction)
+                    for car_id, car in fresh.grid.cars.items()
+                ]
+
+    def test_rerun_reuses_unchanged_trajectories(self):
+        memo = TrajectoryMemo(max_bytes=10**6)
+        cars = [
+            ["A", "0 0 N", "RL" * 3 + "F" * 9],
+            ["B", "5 0 N", "F" * 9 + "R" + "F" * 5],
+        ]
+        simulation = Simulation(20, 20, cars, memo=memo)
+        with redirect_stdout(io.StringIO()):
+            simulation.run()
+        misses = memo.misses
+
+        edited = [cars[0], ["B", "5 0 N", "F" * 9 + "L" + "F" * 5]]
+        with redirect_stdout(io.StringIO()):
+            result = simulation.rerun(edited)
+
+        assert memo.misses == misses + 1
+        assert result == {
+            "collision": True,
+            "cars": ["A", "B"],
+            "position": (0, 9),
+            "step": 15,
+        }
+
+
+def poses(grid):
+    return [(car_id, car.x, car.y, car.direction) for car_id, car in grid.cars.items()]
+
+
+class TestIterSteps:
+    def test_views_match_stepping(self):
+        rng = random.Random(39)
+        commands = lambda: "".join(rng.choices("FFLR", k=rng.randint(0, 15)))
+        for _ in range(100):
+            size_x, size_y = rng.randint(2, 8), rng.randint(2, 8)
+            cars = place_cars(rng, size_x, size_y, rng.randint(1, 4), commands)
+            stepped = Simulation(size_x, size_y, cars)
+            simulation = Simulation(size_x, size_y, cars)
+
+            with redirect_stdout(io.StringIO()) as output:
+                views = []
+                for view in simulation.iter_steps():
+                    before = poses(stepped.grid)
+                    with redirect_stdout(io.StringIO()) as expected_output:
+                        expected = stepped.grid.next_step()
+                    after = poses(stepped.grid)
+
+                    assert view.step == stepped.grid.current_step
+                    assert list(view.changed) == [
+                        pose for pose, old in zip(after, before) if pose != old
+                    ]
+                    assert poses(simulation.grid) == after
+                    assert (view.collision or {"collision": False}) == expected
+                    views.append(expected_output.getvalue())
+
+            assert output.getvalue() == "".join(views)
+            assert len(views) == simulation.max_step or views[-1]
+
+    def test_closing_early_leaves_grid_at_last_step(self):
+        cars = [["A", "0 0 N", "FFFFF"], ["B", "3 0 E", "LFFFF"]]
+        simulation = Simulation(10, 10, cars)
+        with closing(simulation.iter_steps(sync=False)) as steps:
+            for view in steps:
+                if view.step == 3:
+                    break
+            assert simulation.grid.cars["A"].position == (0, 0)
+
+        assert simulation.grid.current_step == 3
+        assert poses(simulation.grid) == [
+            ("A", 0, 3, Direction.NORTH),
+            ("B", 3, 2, Direction.NORTH),
+        ]
+        assert simulation.grid.cars_near(0, 3, 0) == ["A"]
+
+    def test_async_variant(self):
+        cars = [["A", "0 0 N", "FFFFF"], ["B", "0 6 S", "FFFFF"]]
+
+        async def collect():
+            simulation = Simulation(10, 10, cars)
+            return [view async for view in simulation.aiter_steps(yield_every=1)]
+
+        with redirect_stdout(io.StringIO()) as output:
+            views = asyncio.run(collect())
+
+        assert [view.step for view in views] == [1, 2, 3]
+        assert views[-1].collision["cars"] == ["A", "B"]
+        assert output.getvalue() == "A B \n0 3\n3\n"
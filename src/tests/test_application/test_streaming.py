@@ -0,0 +1,137 @@
+import asyncio
+import io
+import random
+from contextlib import redirect_stdout
+
+import pytest
+
+from application.simulation import Simulation
+from application.streaming import StreamingSimulation, parse_chunk
+from scenarios import random_scenario
+
+
+def random_chunks(rng, cars):
+    # Splits every program into chunks and interleaves them randomly, keeping
+    # each car's own chunks in order; some cars end explicitly.
+    queues = []
+    for car_id, _, commands in cars:
+        cuts = sorted(rng.choices(range(len(commands) + 1), k=rng.randint(0, 3)))
+        pieces = [commands[a:b] for a, b in zip([0, *cuts], [*cuts, len(commands)])]
+        chunks = [(car_id, piece) for piece in pieces]
+        if rng.random() < 0.5:
+            chunks.append((car_id, None))
+        queues.append(chunks)
+
+    lines = []
+    while any(queues):
+        queue = rng.choice([queue for queue in queues if queue])
+        lines.append(queue.pop(0))
+    return lines
+
+
+def as_line(chunk):
+    car_id, commands = chunk
+    return f"{car_id} {'.' if commands is None else commands}\n"
+
+
+class TestParseChunk:
+    def test_chunks(self):
+        assert parse_chunk("A FFR\n") == ("A", "FFR")
+        assert parse_chunk("A\n") == ("A", "")
+        assert parse_chunk("A .\n") == ("A", None)
+        assert parse_chunk("  \n") is None
+
+
+class TestStreamingSimulation:
+    def test_matches_batch_on_random_streams(self):
+        rng = random.Random(37)
+        for _ in range(300):
+            size_x, size_y, cars = random_scenario(rng)
+            with redirect_stdout(io.StringIO()) as expected_output:
+                expected = Simulation(size_x, size_y, cars).run()
+
+            starts = [[car_id, pose, ""] for car_id, pose, _ in cars]
+            lines = [as_line(chunk) for chunk in random_chunks(rng, cars)]
+            with redirect_stdout(io.StringIO()) as output:
+                result = StreamingSimulation(size_x, size_y, starts).consume(lines)
+
+            assert result == expected
+            assert output.getvalue() == expected_output.getvalue()
+
+    def test_steps_once_every_active_car_has_a_command(self, capsys):
+        cars = [["A", "0 0 E", ""], ["B", "4 4 W", ""]]
+        simulation = StreamingSimulation(5, 5, cars)
+
+        assert simulation.feed("A", "FF") is None
+        assert simulation.grid.current_step == 0
+        assert simulation.feed("B", "L") is None
+        assert simulation.grid.current_step == 1
+        assert simulation.end("B") is None
+        assert simulation.grid.current_step == 2
+        assert simulation.grid.cars["A"].position == (2, 0)
+        assert simulation.programs["A"].buffered == 0
+
+    def test_collision_is_reported_as_soon_as_it_happens(self, capsys):
+        simulation = StreamingSimulation(5, 5, [["A", "0 0 E", ""], ["B", "2 0 W", ""]])
+        simulation.feed("A", "F")
+
+        result = simulation.feed("B", "FFFF")
+
+        assert result == {
+            "collision": True,
+            "cars": ["A", "B"],
+            "position": (1, 0),
+            "step": 1,
+        }
+        assert capsys.readouterr().out == "A B \n1 0\n1\n"
+        assert simulation.feed("A", "F") == result
+
+    def test_buffering_is_bounded(self):
+        simulation = StreamingSimulation(
+            5, 5, [["A", "0 0 E", ""], ["B", "2 2 W", ""]], max_buffered=3
+        )
+        simulation.feed("A", "FFF")
+
+        with pytest.raises(ValueError, match="more than 3 commands"):
+            simulation.feed("A", "F")
+        simulation.feed("B", "L")
+        simulation.feed("A", "F")
+
+    def test_programs_from_the_input_are_not_bounded(self):
+        simulation = StreamingSimulation(
+            5, 5, [["A", "0 0 N", "LR" * 10], ["B", "4 4 S", "L"]], max_buffered=3
+        )
+        simulation.feed("A", "FFF")
+        with pytest.raises(ValueError, match="more than 3 commands"):
+            simulation.feed("A", "F")
+        simulation.end("B")
+        assert simulation.close() == {"collision": False}
+        assert simulation.grid.cars["A"].position == (0, 3)
+
+    def test_rejects_bad_chunks(self):
+        simulation = StreamingSimulation(5, 5, [["A", "0 0 E", ""]])
+        with pytest.raises(ValueError, match="invalid command 'X'"):
+            simulation.feed("A", "FX")
+        with pytest.raises(ValueError, match="does not exist"):
+            simulation.feed("B", "F")
+        simulation.end("A")
+        with pytest.raises(ValueError, match="already ended"):
+            simulation.feed("A", "F")
+
+    def test_consume_queue(self, capsys):
+        async def produce(queue):
+            for chunk in [("A", "F"), ("B", "F"), ("A", None), None]:
+                await queue.put(chunk)
+
+        async def run():
+            queue = asyncio.Queue(maxsize=1)
+            simulation = StreamingSimulation(
+                5, 5, [["A", "0 0 N", ""], ["B", "2 0 N", ""]]
+            )
+            _, result = await asyncio.gather(
+                produce(queue), simulation.consume_queue(queue)
+            )
+            return result
+
+        assert asyncio.run(run()) == {"collision": False}
+        assert capsys.readouterr().out == "no collision\n"
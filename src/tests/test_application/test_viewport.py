@@ -0,0 +1,86 @@
+import random
+
+import numpy as np
+import pytest
+
+from application.simulation import Simulation
+from application.viewport import Viewport
+from scenarios import place_cars
+
+
+def random_viewport(rng, size_x, size_y):
+    return Viewport(
+        size_x,
+        size_y,
+        rng.choice([None, rng.randint(-5, size_x + 5)]),
+        rng.choice([None, rng.randint(-5, size_y + 5)]),
+        tile=rng.randint(1, 6),
+        max_tiles=rng.randint(1, 8),
+    )
+
+
+class TestViewport:
+    def test_fit_shows_whole_grid(self):
+        viewport = Viewport.fit(20, 13, max_tiles=8)
+        assert (viewport.tile, viewport.columns, viewport.rows) == (3, 7, 5)
+        assert (viewport.x_min, viewport.y_min) == (0, 0)
+        assert (viewport.x_max, viewport.y_max) == (19, 12)
+        assert not viewport.detailed
+        assert Viewport.fit(8, 8, max_tiles=8).detailed
+
+    def test_window_stays_on_grid(self):
+        viewport = Viewport(20, 10, center_x=0, center_y=100, max_tiles=4)
+        assert (viewport.x_min, viewport.y_min) == (0, 6)
+        assert (viewport.x_max, viewport.y_max) == (3, 9)
+        assert Viewport(20, 10, center_x=10, max_tiles=4).x_min == 8
+        assert Viewport(20, 10, max_tiles=4, tile=2).tile_starts() == (
+            [6, 8, 10, 12],
+            [1, 3, 5, 7],
+        )
+
+    def test_rejects_empty_tiles(self):
+        with pytest.raises(ValueError, match="must be positive"):
+            Viewport(10, 10, tile=0)
+
+    def test_cars_in_view_match_grid(self):
+        rng = random.Random(46)
+        for _ in range(30):
+            size_x, size_y = rng.randint(1, 20), rng.randint(1, 20)
+            cars = place_cars(
+                rng, size_x, size_y, rng.randint(1, min(40, size_x * size_y)), str
+            )
+            grid = Simulation(size_x, size_y, cars).grid
+            viewport = random_viewport(rng, size_x, size_y)
+
+            in_view = {
+                (car.x, car.y): car_id
+                for car_id, car in grid.cars.items()
+                if viewport.x_min <= car.x <= viewport.x_max
+                and viewport.y_min <= car.y <= viewport.y_max
+            }
+            assert viewport.cells(grid) == in_view
+
+            counts = np.zeros((viewport.rows, viewport.columns), dtype=int)
+            for x, y in in_view:
+                counts[
+                    (y - viewport.y_min) // viewport.tile,
+                    (x - viewport.x_min) // viewport.tile,
+                ] += 1
+            assert viewport.car_counts(grid) == counts.tolist()
+
+    def test_tile_sums(self):
+        rng = random.Random(460)
+        for _ in range(30):
+            size_x, size_y = rng.randint(1, 30), rng.randint(1, 30)
+            values = np.array(
+                [[rng.randint(0, 9) for _ in range(size_x)] for _ in range(size_y)]
+            )
+            viewport = random_viewport(rng, size_x, size_y)
+
+            sums = viewport.tile_sums(values)
+            assert sums.shape == (viewport.rows, viewport.columns)
+            xs, ys = viewport.tile_starts()
+            for row, y in enumerate(ys):
+                for column, x in enumerate(xs):
+                    tile = values[y : y + viewport.tile, x : x + viewport.tile]
+                    assert sums[row, column] == tile.sum()
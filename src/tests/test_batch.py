@@ -0,0 +1,89 @@
+import gzip
+import io
+import json
+import lzma
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from application.result_cache import ResultCache
+from batch import main, run_batch
+
+
+class TestBatchRunner:
+    def test_run_batch_keeps_file_order(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = Path(directory) / "first.txt"
+            first.write_text("10 10\nA\n1 2 N\nFFRFFFFFRL\n\nB\n7 8 W\nFFLFFFFFFF\n")
+            second = Path(directory) / "second.txt"
+            second.write_text("5 5\nA\n1 1 N\nF\n")
+            missing = Path(directory) / "missing.txt"
+
+            results = run_batch([str(first), str(missing), str(second)])
+
+        assert results[0]["step"] == 7
+        assert "error" in results[1]
+        assert results[2] == {"collision": False}
+
+    def test_main_prints_each_result(self):
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".txt", delete=False) as f:
+            f.write("5 5\nA\n1 1 N\nF\n")
+            temp_path = f.name
+
+        with patch("sys.argv", ["batch.py", temp_path]):
+            with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+                main()
+                output = mock_stdout.getvalue()
+
+        Path(temp_path).unlink()
+        assert f"==> {temp_path} <==\nno collision\n" == output
+
+    def test_run_batch_with_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = Path(directory) / "first.txt"
+            first.write_text("10 10\nA\n1 2 N\nFFRFFFFFRL\n\nB\n7 8 W\nFFLFFFFFFF\n")
+            second = Path(directory) / "second.txt"
+            second.write_text("10 10\nB\n7 8 W\nFFLFFFFFFF\n\nA\n1 2 N\nFFRFFFFFRL\n")
+            cache = ResultCache(Path(directory) / "cache")
+
+            cold = run_batch([str(first)], cache)
+            warm = run_batch([str(first), str(second)], cache)
+
+        assert cold[0] == warm[0]
+        assert warm[1]["cars"] == ["B", "A"]
+        assert warm[1]["step"] == 7
+
+    def test_main_writes_compressed_ndjson(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = Path(directory) / "first.txt.gz"
+            first.write_bytes(gzip.compress(b"5 5\nA\n1 1 N\nF\n"))
+            output = Path(directory) / "results.ndjson.gz"
+
+            argv = ["batch.py", str(first), "--ndjson", str(output)]
+            with patch("sys.argv", argv):
+                with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+                    main()
+            lines = gzip.decompress(output.read_bytes()).decode().splitlines()
+
+        assert mock_stdout.getvalue() == ""
+        assert [json.loads(line) for line in lines] == [
+            {"input": str(first), "collision": False, "output": "no collision"}
+        ]
+
+    def test_corrupt_archives_are_per_file_errors(self):
+        text = b"5 5\nA\n1 1 N\nF\n"
+        with tempfile.TemporaryDirectory() as directory:
+            good = Path(directory) / "good.txt.gz"
+            good.write_bytes(gzip.compress(text))
+            truncated = Path(directory) / "truncated.txt.gz"
+            truncated.write_bytes(gzip.compress(text)[:-10])
+            corrupt = Path(directory) / "corrupt.txt.xz"
+            data = bytearray(lzma.compress(text))
+            data[24:32] = bytes(byte ^ 0xFF for byte in data[24:32])
+            corrupt.write_bytes(bytes(data))
+
+            results = run_batch([str(good), str(truncated), str(corrupt)])
+
+        assert results[0] == {"collision": False}
+        assert results[1]["error"].startswith("Corrupt gzip file")
+        assert results[2]["error"].startswith("Corrupt xz file")
@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ("pydantic", "pydantic_settings", "numpy", "streamlit")
+# Cumulative import time of main, in microseconds, as reported by -X importtime.
+IMPORT_BUDGET_US = 50_000
+
+
+def run_importtime(input_text: str) -> tuple[str, dict]:
+    with tempfile.NamedTemporaryFile(mode="w", suffix=".txt", delete=False) as f:
+        f.write(input_text)
+        temp_path = f.name
+
+    try:
+        completed = subprocess.run(
+            [
+                sys.executable,
+                "-X",
+                "importtime",
+                "-c",
+                "import main; main.main()",
+                temp_path,
+            ],
+            capture_output=True,
+            text=True,
+            env={**os.environ, "PYTHONPATH": str(SRC)},
+        )
+    finally:
+        Path(temp_path).unlink()
+
+    imports = {}
+    for line in completed.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                imports[name.strip()] = int(cumulative)
+    return completed.stdout, imports
+
+
+class TestColdStart:
+    def test_cli_fast_path_skips_heavy_imports(self):
+        stdout, imports = run_importtime("5 5\nA\n1 1 N\nFF\n\nB\n1 4 S\nF\n")
+
+        assert stdout == "A B \n1 3\n2\n"
+        heavy = [name for name in imports if name.split(".")[0] in HEAVY_MODULES]
+        assert heavy == []
+
+    def test_cli_import_budget(self):
+        _, imports = run_importtime("5 5\nA\n1 1 N\nF\n")
+
+        assert imports["main"] < IMPORT_BUDGET_US
@@ -196,3 +196,21 @@ class TestCar:
         )
 
         assert car.position == (5, 3)
+
+    def test_trusted_construct_matches_validated_car(self):
+        values = dict(
+            x=2,
+            y=3,
+            direction=Direction.WEST,
+            command_parser=SimpleCommandParser(),
+            forward_strategy=ForwardMovementStrategy(),
+            turn_strategy=TurnMovementStrategy(),
+        )
+
+        car = Car.trusted_construct(**values)
+        car.add_commands("FL")
+        car.move(car.get_next_command(0))
+
+        assert car.position == (1, 3)
+        assert car.get_next_command(1) == Command.L
+        assert car.model_dump() == Car(**values).model_dump() | {"x": 1}
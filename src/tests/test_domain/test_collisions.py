@@ -0,0 +1,89 @@
+import random
+
+from application.simulation import Simulation
+from constants import CollisionPolicy
+from domain import CollisionTable
+from scenarios import place_cars
+
+
+def reference_collisions(grid, steps, policy):
+    # Steps the grid one command at a time and applies the policy by hand.
+    frozen = set()
+    rows = []
+    for _ in range(steps):
+        grid.next_step()
+        cells = {}
+        for car_id, car in grid.cars.items():
+            cells.setdefault(car.position, []).append(car_id)
+        for (x, y), car_ids in cells.items():
+            moving = [car_id for car_id in car_ids if car_id not in frozen]
+            if len(car_ids) < 2 or not moving:
+                continue
+            rows.append(
+                {"step": grid.current_step, "position": (x, y), "cars": car_ids}
+            )
+            for car_id in moving:
+                if policy is CollisionPolicy.REMOVE:
+                    grid.remove_car(car_id)
+                else:
+                    car = grid.cars[car_id]
+                    car.load_program(list(car.program)[: grid.current_step])
+                    frozen.add(car_id)
+    return rows
+
+
+class TestCollisionTable:
+    def test_rows(self):
+        table = CollisionTable()
+        table.append(3, 1, 2, ["A", "B"])
+        table.append(5, 0, 0, ["C", "D", "E"])
+
+        assert len(table) == 2
+        assert table[-1] == {"step": 5, "position": (0, 0), "cars": ["C", "D", "E"]}
+        assert list(table)[0] == {"step": 3, "position": (1, 2), "cars": ["A", "B"]}
+
+
+class TestRunAll:
+    def test_matches_stepping_reference(self):
+        rng = random.Random(34)
+        commands = lambda: "".join(rng.choices("FFFLR", k=rng.randint(0, 15)))
+        for policy in CollisionPolicy:
+            for _ in range(200):
+                size_x, size_y = rng.randint(1, 6), rng.randint(1, 6)
+                count = rng.randint(1, min(8, size_x * size_y))
+                cars = place_cars(rng, size_x, size_y, count, commands)
+                reference = Simulation(size_x, size_y, cars)
+                expected = reference_collisions(
+                    reference.grid, reference.max_step, policy
+                )
+
+                simulation = Simulation(size_x, size_y, cars)
+                assert list(simulation.run_all(policy)) == expected
+                assert {
+                    car_id: (car.position, car.direction)
+                    for car_id, car in simulation.grid.cars.items()
+                } == {
+                    car_id: (car.position, car.direction)
+                    for car_id, car in reference.grid.cars.items()
+                }
+
+    def test_frozen_cars_block_their_cell(self):
+        cars = [["A", "0 0 E", "F"], ["B", "2 0 W", "F"], ["C", "1 2 S", "FF"]]
+        simulation = Simulation(3, 3, cars)
+
+        collisions = simulation.run_all(CollisionPolicy.FREEZE)
+
+        assert list(collisions) == [
+            {"step": 1, "position": (1, 0), "cars": ["A", "B"]},
+            {"step": 2, "position": (1, 0), "cars": ["A", "B", "C"]},
+        ]
+
+    def test_removed_cars_leave_the_grid(self):
+        cars = [["A", "0 0 E", "F"], ["B", "2 0 W", "F"], ["C", "1 2 S", "FF"]]
+        simulation = Simulation(3, 3, cars)
+
+        collisions = simulation.run_all(CollisionPolicy.REMOVE)
+
+        assert len(collisions) == 1
+        assert list(simulation.grid.cars) == ["C"]
+        assert simulation.grid.cars["C"].position == (1, 0)
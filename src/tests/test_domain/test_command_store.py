@@ -0,0 +1,153 @@
+import os
+import pickle
+import re
+import tempfile
+
+import pytest
+
+from constants import Command, Direction
+from domain import Grid
+from domain.command_store import (
+    CommandStore,
+    RunLengthProgram,
+    command_text,
+    encode_commands,
+    parse_run_length,
+)
+
+
+class TestCommandStore:
+    def test_encode_commands_ignores_invalid_characters(self):
+        assert encode_commands("FxLR ") == b"\x00\x01\x02"
+        assert encode_commands([Command.R, Command.F]) == b"\x02\x00"
+
+    def test_append_and_program_view(self):
+        store = CommandStore()
+        first = store.append("FFR")
+        second = store.append("")
+        third = store.append([Command.L])
+
+        assert (first, second, third) == (0, 1, 2)
+        assert len(store) == 3
+        assert store.program(0) == [Command.F, Command.F, Command.R]
+        assert len(store.program(1)) == 0
+        assert store.program(2)[0] == Command.L
+        assert store.program(0)[-1] == Command.R
+        assert store.program(0).window(1) == bytes([0, 2])
+        assert store.program(0).window(0, 1) == bytes([0])
+
+    def test_command_at_past_end(self):
+        store = CommandStore()
+        store.append("FL")
+
+        assert store.command_at(0, 1) == Command.L
+        assert store.command_at(0, 2) is None
+
+    def test_one_byte_per_command(self):
+        store = CommandStore()
+        for _ in range(100):
+            store.append("F" * 1000)
+
+        assert store.nbytes == 100 * 1000 + 8 * 101
+
+    def test_save_and_open_memory_mapped(self):
+        store = CommandStore()
+        store.append("FLR")
+        store.append("RRF")
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "programs.bin")
+            store.save(path)
+            loaded = CommandStore.open(path)
+
+            assert loaded.read_only
+            assert loaded.program(1) == [Command.R, Command.R, Command.F]
+            assert pickle.loads(pickle.dumps(loaded)).program(0) == store.program(0)
+
+            try:
+                loaded.append("F")
+                assert False
+            except ValueError as e:
+                assert "Cannot append to a shared command store" in str(e)
+
+    def test_open_rejects_other_files(self):
+        with tempfile.NamedTemporaryFile(delete=False) as file:
+            file.write(b"not a store at all")
+            path = file.name
+
+        try:
+            CommandStore.open(path)
+            assert False
+        except ValueError as e:
+            assert "is not a command store file" in str(e)
+        finally:
+            os.unlink(path)
+
+    def test_share_keeps_existing_views(self):
+        store = CommandStore()
+        program = store.program(store.append("FRL"))
+
+        store.share()
+
+        assert store.read_only
+        assert program == [Command.F, Command.R, Command.L]
+
+    def test_grid_cars_read_from_store(self):
+        grid = Grid(size_x=5, size_y=5)
+        grid.add_car("A", 0, 0, Direction.NORTH, "FR")
+        grid.add_car("B", 4, 4, Direction.SOUTH, "L")
+
+        assert len(grid.command_store) == 2
+        assert grid.cars["A"].get_next_command(1) == Command.R
+        assert grid.cars["A"].get_next_command(2) is None
+
+        grid.cars["B"].add_commands("F")
+        assert grid.cars["B"].get_next_command(1) == Command.F
+
+
+class TestRunLengthProgram:
+    def test_parses_runs_and_nested_groups(self):
+        program = parse_run_length("F3(FFR)2L((LR)2F)2")
+
+        assert len(program) == 20
+        assert program.to_text() == "F3(FFR)2L(LRLRF)2"
+        assert command_text(program) == "FFFFFRFFRLLRLRFLRLRF"
+        assert program.count(Command.F) == 9
+        assert parse_run_length(program.to_text()) == program
+        assert RunLengthProgram.compress("FFFLLR").to_text() == "F3L2R"
+
+    def test_rejects_malformed_programs(self):
+        for text, message in [
+            ("(FF", "Unmatched '('"),
+            ("FF)", "Unmatched ')'"),
+            ("()3", "Empty group"),
+            ("F0", "Repeat count must be positive"),
+            ("FX2", "Invalid command 'X'"),
+        ]:
+            with pytest.raises(ValueError, match=re.escape(message)):
+                parse_run_length(text)
+
+    def test_steps_match_expanded_program(self):
+        program = parse_run_length("F5(LR)3(FFR)4R2")
+        text = command_text(program)
+        steps = list(range(len(text))) + list(range(len(text) - 1, -1, -3))
+        assert [program[step].name for step in steps] == [text[s] for s in steps]
+        assert program[-1] == Command.R
+        with pytest.raises(IndexError):
+            program[len(text)]
+
+    def test_after_stays_compressed(self):
+        program = parse_run_length("F1000000(FFR)50")
+        text = command_text(program)
+        for step in [0, 1, 999_999, 1_000_000, 1_000_001, 1_000_002, 1_000_150]:
+            assert command_text(program.after(step)) == text[step:]
+        assert program.after(1_000_001).to_text() == "(FR)(FFR)49"
+
+    def test_window_stays_compressed(self):
+        program = parse_run_length("F5(LR)3(FFR)4R2")
+        text = command_text(program)
+        for start in range(len(text) + 1):
+            for stop in range(start, len(text) + 2):
+                window = program.window(start, stop)
+                assert command_text(window) == text[start:stop]
+        assert program.window(1, 13).to_text() == "F4(LR)3(FF)"
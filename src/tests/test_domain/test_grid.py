@@ -154,3 +154,79 @@ class TestCar:
             assert False
         except ValueError as e:
             assert "Car with id 'X' does not exist" in str(e)
+
+    def test_add_cars_batch(self):
+        grid = Grid(size_x=5, size_y=5)
+        grid.add_cars(
+            [
+                ("A", 0, 0, Direction.NORTH, "FF"),
+                ("B", 4, 4, Direction.SOUTH, "L"),
+            ]
+        )
+
+        assert list(grid.cars) == ["A", "B"]
+        assert grid.cars["A"].get_next_command(1) is not None
+        assert grid.cars["B"].direction == Direction.SOUTH
+
+    def test_add_cars_duplicate_position_in_batch(self):
+        grid = Grid(size_x=5, size_y=5)
+
+        try:
+            grid.add_cars(
+                [
+                    ("A", 1, 1, Direction.NORTH, ""),
+                    ("B", 1, 1, Direction.NORTH, ""),
+                ]
+            )
+            assert False
+        except ValueError as e:
+            assert "Position (1, 1) is already occupied by car A" in str(e)
+
+        assert len(grid.cars) == 0
+
+    def test_add_cars_duplicate_id_against_existing(self):
+        grid = Grid(size_x=5, size_y=5)
+        grid.add_car("A", 0, 0, Direction.NORTH, "")
+
+        try:
+            grid.add_cars([("A", 2, 2, Direction.NORTH, "")])
+            assert False
+        except ValueError as e:
+            assert "Car with id 'A' already exists" in str(e)
+
+    def test_add_cars_out_of_bounds(self):
+        grid = Grid(size_x=5, size_y=5)
+
+        try:
+            grid.add_cars(
+                [
+                    ("A", 0, 0, Direction.NORTH, ""),
+                    ("B", 5, 0, Direction.NORTH, ""),
+                ]
+            )
+            assert False
+        except ValueError as e:
+            assert "Car position (5, 0) is out of bounds" in str(e)
+
+    def test_add_cars_capacity_limit(self):
+        grid = Grid(size_x=1, size_y=2)
+
+        try:
+            grid.add_cars(
+                [
+                    ("A", 0, 0, Direction.NORTH, ""),
+                    ("B", 0, 1, Direction.NORTH, ""),
+                    ("C", 0, 0, Direction.NORTH, ""),
+                ]
+            )
+            assert False
+        except ValueError as e:
+            assert "Cannot add more cars than the grid can hold" in str(e)
+
+    def test_add_cars_trusted_skips_validation(self):
+        grid = Grid(size_x=5, size_y=5)
+        grid.add_cars([("A", 1, 1, Direction.EAST, "F")], trusted=True)
+
+        grid.next_step()
+
+        assert grid.cars["A"].position == (2, 1)
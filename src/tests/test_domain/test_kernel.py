@@ -0,0 +1,24 @@
+from domain.command_store import parse_run_length
+from domain.kernel import run_kernel
+
+
+class TestKernel:
+    def test_collision_result(self):
+        cars = [["A", "1 2 N", "FFRFFFFFRL"], ["B", "7 8 W", "FFLFFFFFFF"]]
+        assert run_kernel(10, 10, cars) == {
+            "collision": True,
+            "cars": ["A", "B"],
+            "position": (5, 4),
+            "step": 7,
+        }
+
+    def test_rejects_what_grid_rejects(self):
+        assert run_kernel(0, 10, [["A", "1 1 N", ""]]) is None
+        assert run_kernel(1000, 10, [["A", "1 1 N", ""]]) is None
+        assert run_kernel(5, 5, [["A", "5 1 N", ""]]) is None
+        assert run_kernel(5, 5, [["A", "1 1 N", ""], ["B", "1 1 S", ""]]) is None
+        assert run_kernel(5, 5, [["A", "1 1 N", ""], ["A", "2 2 S", ""]]) is None
+
+    def test_leaves_run_length_programs_to_the_simulation(self):
+        program = parse_run_length("F100000000")
+        assert run_kernel(5, 5, [["A", "1 1 N", program]]) is None
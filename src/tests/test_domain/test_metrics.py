@@ -0,0 +1,137 @@
+import io
+import random
+import urllib.request
+from contextlib import redirect_stdout
+
+from application.batch_simulation import BatchSimulation
+from application.metrics_export import serve_metrics, write_prometheus
+from application.service import run_scenarios_counted
+from application.simulation import Simulation
+from domain.command_store import parse_run_length
+from domain.metrics import LATENCY_BUCKETS, Metrics
+from scenarios import random_scenario
+
+# A is blocked twice at the top edge; B turns and stops after 3 commands.
+SCENARIO = (5, 5, [["A", "0 3 N", "FFFF"], ["B", "3 0 E", "LFF"]])
+
+
+def run(scenario, metrics, stepped=False):
+    simulation = Simulation(*scenario, metrics=metrics)
+    with redirect_stdout(io.StringIO()):
+        if not stepped:
+            return simulation.run()
+        for _ in range(simulation.max_step):
+            if simulation.grid.next_step()["collision"]:
+                break
+
+
+class TestMetrics:
+    def test_recorder_merges_on_flush(self):
+        metrics = Metrics()
+        recorder = metrics.recorder()
+        recorder.step(3, 2, 2e-6)
+        recorder.step(1, 0, 2.0)
+        assert metrics.steps == 0
+
+        recorder.flush(blocked_moves=1, active_cars=1)
+        snapshot = metrics.snapshot()
+        assert snapshot["steps"] == 2
+        assert snapshot["car_steps"] == 4
+        assert snapshot["collision_probes"] == 2
+        assert snapshot["blocked_moves"] == 1
+        assert snapshot["active_cars"] == 1
+        assert snapshot["step_latency"][1] == 1
+        assert snapshot["step_latency"][len(LATENCY_BUCKETS)] == 1
+
+    def test_steps_recorded_at_once_count_in_the_histogram(self):
+        metrics = Metrics()
+        recorder = metrics.recorder()
+        recorder.step(6, 0, 9e-6, 3)
+        recorder.step(40, 0, 0.0, 20)
+        recorder.flush()
+
+        snapshot = metrics.snapshot()
+        assert snapshot["steps"] == 23
+        assert snapshot["step_latency"][:2] == [20, 3]
+        assert sum(snapshot["step_latency"]) == 23
+
+    def test_skipped_steps_count_in_the_histogram(self):
+        metrics = Metrics()
+        program = parse_run_length("FL1000F")
+        run((5, 5, [["A", "0 0 N", program], ["B", "4 4 S", "R"]]), metrics)
+        snapshot = metrics.snapshot()
+
+        assert snapshot["steps"] == 1002
+        assert sum(snapshot["step_latency"]) == 1002
+        assert "car_simulation_step_latency_seconds_count 1002\n" in (
+            metrics.to_prometheus()
+        )
+
+    def test_prometheus_text(self):
+        metrics = Metrics()
+        recorder = metrics.recorder()
+        recorder.step(2, 2, 3e-6)
+        recorder.flush(blocked_moves=1, active_cars=2)
+
+        text = metrics.to_prometheus()
+        assert "# TYPE car_simulation_steps_total counter\n" in text
+        assert "car_simulation_steps_total 1\n" in text
+        assert "car_simulation_blocked_moves_total 1\n" in text
+        assert "car_simulation_active_cars 2\n" in text
+        assert 'car_simulation_step_latency_seconds_bucket{le="1e-06"} 0\n' in text
+        assert 'car_simulation_step_latency_seconds_bucket{le="5e-06"} 1\n' in text
+        assert 'car_simulation_step_latency_seconds_bucket{le="+Inf"} 1\n' in text
+        assert "car_simulation_step_latency_seconds_count 1\n" in text
+
+    def test_simulation_counts(self):
+        metrics = Metrics()
+        run(SCENARIO, metrics)
+        snapshot = metrics.snapshot()
+        assert snapshot["steps"] == 4
+        assert snapshot["car_steps"] == 7
+        assert snapshot["blocked_moves"] == 3
+        assert snapshot["active_cars"] == 1
+        assert sum(snapshot["step_latency"]) == 4
+
+    def test_engines_agree_on_work_done(self):
+        rng = random.Random(41)
+        scenarios = [random_scenario(rng) for _ in range(50)]
+
+        joined, stepped, batched = Metrics(), Metrics(), Metrics()
+        for scenario in scenarios:
+            run(scenario, joined)
+            run(scenario, stepped, stepped=True)
+        BatchSimulation(scenarios, batched).run()
+
+        for name in ("steps", "car_steps", "blocked_moves"):
+            assert joined.snapshot()[name] == stepped.snapshot()[name]
+            assert batched.snapshot()[name] == stepped.snapshot()[name]
+
+    def test_service_workers_report_counts(self):
+        responses, counts = run_scenarios_counted([SCENARIO])
+        assert responses[0]["output"] == "no collision"
+        assert (counts["steps"], counts["car_steps"]) == (4, 7)
+
+
+class TestMetricsExport:
+    def test_write_prometheus(self, tmp_path):
+        metrics = Metrics()
+        run(SCENARIO, metrics)
+        path = tmp_path / "simulation.prom"
+        write_prometheus(metrics, path)
+        assert path.read_text() == metrics.to_prometheus()
+
+    def test_http_endpoint(self):
+        metrics = Metrics()
+        run(SCENARIO, metrics)
+        server = serve_metrics(metrics, port=0)
+        try:
+            port = server.server_address[1]
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as reply:
+                body = reply.read().decode()
+                content_type = reply.headers["Content-Type"]
+        finally:
+            server.shutdown()
+
+        assert body == metrics.to_prometheus()
+        assert content_type.startswith("text/plain; version=0.0.4")
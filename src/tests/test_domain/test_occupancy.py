@@ -0,0 +1,84 @@
+import pytest
+
+from constants import Direction
+from domain import Grid
+from domain.occupancy import DenseOccupancy, SparseOccupancy, occupancy_for
+
+
+class TestOccupancy:
+    def test_backend_follows_density(self):
+        assert isinstance(occupancy_for(20, 20, 100), DenseOccupancy)
+        assert isinstance(occupancy_for(20, 20, 99), SparseOccupancy)
+        assert not isinstance(occupancy_for(20, 20, 99), DenseOccupancy)
+
+    @pytest.mark.parametrize("backend", [SparseOccupancy, DenseOccupancy])
+    def test_counts(self, backend):
+        occupancy = backend(5, 4)
+        index = occupancy.index(3, 2)
+
+        assert index == 13
+        assert occupancy.add(index) == 1
+        assert occupancy.add(index) == 2
+        occupancy.remove(index)
+        assert occupancy.count(index) == 1
+        occupancy.remove(index)
+        assert occupancy.count(index) == 0
+
+    @pytest.mark.parametrize("backend", [SparseOccupancy, DenseOccupancy])
+    def test_counts_of_neighbouring_cells(self, backend):
+        occupancy = backend(5, 4)
+        for index in (7, 8, 8, 8, 9, 15, 16):
+            occupancy.add(index)
+        occupancy.remove(8)
+        occupancy.remove(16)
+
+        counts = {index: occupancy.count(index) for index in range(20)}
+        assert {index: count for index, count in counts.items() if count} == {
+            7: 1,
+            8: 2,
+            9: 1,
+            15: 1,
+        }
+
+    def test_dense_backend_takes_a_bit_per_cell(self):
+        occupancy = DenseOccupancy(100, 80)
+        assert len(occupancy._bits) == 1000
+        occupancy.add(occupancy.index(99, 79))
+        assert occupancy.count(7999) == 1
+
+
+class TestDenseGrid:
+    def full_grid(self):
+        grid = Grid(size_x=4, size_y=4, cars={})
+        grid.add_cars(
+            (f"C{x}{y}", x, y, Direction.NORTH, "")
+            for x in range(4)
+            for y in range(4)
+            if (x, y) != (3, 3)
+        )
+        return grid
+
+    def test_occupied_check(self):
+        grid = self.full_grid()
+        assert isinstance(grid.occupancy(), DenseOccupancy)
+
+        with pytest.raises(
+            ValueError, match=r"\(1, 2\) is already occupied by car C12"
+        ):
+            grid.add_car("Z", 1, 2, Direction.NORTH, "")
+
+    def test_check_collisions(self, capsys):
+        grid = self.full_grid()
+        assert grid.check_collisions() == {"collision": False}
+
+        grid.cars["C32"].y = 3
+        grid.cars["C22"].x = 3
+        assert grid.check_collisions() == {"collision": False}
+
+        grid.cars["C23"].x = 3
+        assert grid.check_collisions() == {
+            "collision": True,
+            "cars": ["C23", "C32"],
+            "position": (3, 3),
+        }
+        assert capsys.readouterr().out == "C23 C32 \n3 3\n0\n"
@@ -0,0 +1,135 @@
+import io
+import random
+from contextlib import redirect_stdout
+
+import pytest
+
+from application.simulation import Simulation
+from constants import CollisionPolicy
+from domain import SpatialIndex
+from scenarios import place_cars
+
+
+def brute_in_rect(grid, x_min, y_min, x_max, y_max):
+    return [
+        car_id
+        for car_id, car in grid.cars.items()
+        if x_min <= car.x <= x_max and y_min <= car.y <= y_max
+    ]
+
+
+def brute_near(grid, x, y, radius):
+    return [
+        car_id
+        for car_id, car in grid.cars.items()
+        if (car.x - x) ** 2 + (car.y - y) ** 2 <= radius**2
+    ]
+
+
+def random_simulation(rng):
+    size_x, size_y = rng.randint(1, 20), rng.randint(1, 20)
+    count = rng.randint(1, min(30, size_x * size_y))
+    commands = lambda: "".join(rng.choices("FFLR", k=rng.randint(0, 20)))
+    return Simulation(size_x, size_y, place_cars(rng, size_x, size_y, count, commands))
+
+
+def brute_tile_counts(grid, x_min, y_min, columns, rows, tile):
+    counts = [[0] * columns for _ in range(rows)]
+    for car in grid.cars.values():
+        column, row = (car.x - x_min) // tile, (car.y - y_min) // tile
+        if 0 <= column < columns and 0 <= row < rows:
+            counts[row][column] += 1
+    return counts
+
+
+def check_queries(rng, grid):
+    for _ in range(5):
+        x_min, x_max = sorted(rng.randint(-2, grid.size_x + 1) for _ in range(2))
+        y_min, y_max = sorted(rng.randint(-2, grid.size_y + 1) for _ in range(2))
+        assert grid.cars_in_rect(x_min, y_min, x_max, y_max) == brute_in_rect(
+            grid, x_min, y_min, x_max, y_max
+        )
+
+        x, y = rng.randint(0, grid.size_x), rng.randint(0, grid.size_y)
+        radius = rng.choice([0, 1, 1.5, 2.9, 5, 30])
+        assert grid.cars_near(x, y, radius) == brute_near(grid, x, y, radius)
+
+        tile = rng.randint(1, 6)
+        columns, rows = rng.randint(1, 5), rng.randint(1, 5)
+        x_min, y_min = rng.randint(-3, grid.size_x), rng.randint(-3, grid.size_y)
+        assert grid.tile_counts(x_min, y_min, columns, rows, tile) == brute_tile_counts(
+            grid, x_min, y_min, columns, rows, tile
+        )
+
+
+class TestSpatialIndex:
+    def test_queries_in_insertion_order(self):
+        index = SpatialIndex(bucket_size=2)
+        index.insert("B", 5, 5)
+        index.insert("A", 0, 0)
+        index.insert("C", 1, 1)
+
+        assert index.in_rect(0, 0, 5, 5) == ["B", "A", "C"]
+        assert index.in_rect(1, 0, 5, 4) == ["C"]
+        assert index.near(0, 0, 1.5) == ["A", "C"]
+        assert index.near(0, 0, 1) == ["A"]
+
+        index.move("A", 4, 4)
+        index.remove("B")
+        assert index.near(5, 5, 1.5) == ["A"]
+        assert len(index) == 2
+
+    def test_tile_counts(self):
+        index = SpatialIndex(bucket_size=2)
+        for car_id, x, y in [("A", 0, 0), ("B", 1, 1), ("C", 2, 3), ("D", 7, 7)]:
+            index.insert(car_id, x, y)
+
+        assert index.tile_counts(0, 0, 2, 2, 4) == [[3, 0], [0, 1]]
+        assert index.tile_counts(1, 1, 2, 2, 2) == [[1, 0], [1, 0]]
+        assert index.tile_counts(8, 8, 1, 1, 4) == [[0]]
+
+    def test_rejects_unknown_and_duplicate_cars(self):
+        index = SpatialIndex()
+        index.insert("A", 0, 0)
+        with pytest.raises(ValueError, match="already indexed"):
+            index.insert("A", 1, 1)
+        with pytest.raises(ValueError, match="not indexed"):
+            index.remove("B")
+        with pytest.raises(ValueError, match="Radius"):
+            index.near(0, 0, -1)
+
+
+class TestGridQueries:
+    def test_stays_correct_while_stepping(self):
+        rng = random.Random(36)
+        for _ in range(30):
+            grid = random_simulation(rng).grid
+            check_queries(rng, grid)
+            with redirect_stdout(io.StringIO()):
+                for _ in range(10):
+                    grid.next_step()
+                    check_queries(rng, grid)
+
+            car_id = rng.choice(list(grid.cars))
+            grid.remove_car(car_id)
+            check_queries(rng, grid)
+
+    def test_stays_correct_after_joined_runs(self):
+        rng = random.Random(360)
+        for _ in range(30):
+            simulation = random_simulation(rng)
+            check_queries(rng, simulation.grid)
+            with redirect_stdout(io.StringIO()):
+                simulation.run()
+            check_queries(rng, simulation.grid)
+
+            cars = [
+                [car_id, f"{x} {y} N", "FF"]
+                for car_id, x, y, _, _ in reversed(simulation.parsed_cars)
+            ]
+            with redirect_stdout(io.StringIO()):
+                simulation.rerun(cars)
+            check_queries(rng, simulation.grid)
+
+            simulation.run_all(CollisionPolicy.REMOVE)
+            check_queries(rng, simulation.grid)
@@ -0,0 +1,151 @@
+import io
+import random
+from contextlib import redirect_stdout
+
+from application.simulation import Simulation
+from constants import Direction
+from domain import Grid
+from domain.command_store import encode_commands, parse_run_length
+from domain.trajectory import (
+    TrajectoryMemo,
+    compute_run_trajectory,
+    compute_trajectory,
+    get_trajectory_memo,
+)
+from scenarios import random_scenario
+
+DIRECTIONS = {"N": Direction.NORTH, "E": Direction.EAST, "S": Direction.SOUTH}
+DIRECTIONS["W"] = Direction.WEST
+
+
+def random_grid(rng):
+    size_x, size_y, cars = random_scenario(rng)
+    grid = Grid(size_x=size_x, size_y=size_y, cars={})
+    for car_id, pose, commands in cars:
+        x, y, direction = pose.split()
+        grid.add_car(car_id, int(x), int(y), DIRECTIONS[direction], commands)
+    return grid
+
+
+def step_until_collision(grid, steps):
+    for _ in range(steps):
+        result = grid.next_step()
+        if result["collision"]:
+            return result
+    return {"collision": False}
+
+
+class TestComputeTrajectory:
+    def test_records_poses_and_blocked_moves(self):
+        trajectory = compute_trajectory(
+            0, 1, Direction.NORTH, encode_commands("FRFLF"), 3, 2
+        )
+
+        assert len(trajectory) == 6
+        assert trajectory.state(0) == (0, 1, Direction.NORTH)
+        assert trajectory.state(2) == (0, 1, Direction.EAST)
+        assert trajectory.state(5) == (1, 1, Direction.NORTH)
+        assert trajectory.state(50) == trajectory.state(5)
+        assert trajectory.blocked == ((1, 0, 2), (5, 1, 2))
+
+    def test_run_length_programs_match_command_by_command(self):
+        rng = random.Random(48)
+        parts = ["F", "L", "R", "F9", "L5", "R6", "(FR)3", "(LR)4", "((FL)2R)2"]
+        parts += ["(FFRR)3", "(FRFRFRFR)2", "(FR)30", "(FFL)25", "(FFLFR)17"]
+        parts += ["(FRFL)40", "(F3L2)11", "(FFRFFL)9", "(LR)50", "F40"]
+        for _ in range(500):
+            size_x, size_y = rng.randint(1, 9), rng.randint(1, 9)
+            program = parse_run_length("".join(rng.choices(parts, k=6)))
+            pose = (
+                rng.randrange(size_x),
+                rng.randrange(size_y),
+                DIRECTIONS[rng.choice("NESW")],
+            )
+            expected = compute_trajectory(*pose, program.to_bytes(), size_x, size_y)
+            actual = compute_run_trajectory(*pose, program, size_x, size_y)
+            assert len(actual) == len(expected)
+            assert list(actual.cells) == list(expected.cells)
+            assert bytes(actual.directions) == expected.directions
+            assert tuple(actual.blocked_steps()) == expected.blocked
+            assert actual.cell_array(len(expected) - 3) == expected.cells[:-3]
+
+            step = rng.randrange(1, len(expected) + 1)
+            assert actual.state(step) == expected.state(step)
+            assert actual.blocked_count(step, step + 20) == sum(
+                step <= blocked[0] <= step + 20 for blocked in expected.blocked
+            )
+            until = actual.still_until(step)
+            cells = expected.cells[step - 1 : until]
+            assert cells.count(cells[0]) == len(cells)
+
+    def test_long_run_length_programs_stay_small(self):
+        program = parse_run_length("F10000000(LR)5000000(FFRFFL)1000000")
+        trajectory = compute_run_trajectory(0, 0, Direction.NORTH, program, 10, 10)
+        assert len(trajectory) == len(program) + 1
+        assert trajectory.nbytes < 10_000
+        assert trajectory.state(10**7) == (0, 9, Direction.NORTH)
+        assert trajectory.still_until(10) == 2 * 10**7 + 4
+        assert trajectory.blocked_count(1, 10**7) == 10**7 - 9
+        assert next(trajectory.blocked_steps()) == (10, 0, 10)
+
+
+class TestTrajectoryMemo:
+    def test_reuses_trajectories(self):
+        memo = TrajectoryMemo(max_bytes=10**6)
+        program = encode_commands("FFRFF")
+        first = memo.trajectory(1, 1, Direction.NORTH, program, 10, 10)
+        second = memo.trajectory(1, 1, Direction.NORTH, program, 10, 10)
+        other = memo.trajectory(1, 1, Direction.NORTH, program, 10, 3)
+
+        assert first is second
+        assert other is not first
+        assert (memo.hits, memo.misses, len(memo)) == (1, 2, 2)
+
+    def test_evicts_least_recently_used(self):
+        program = encode_commands("F" * 10)
+        size = compute_trajectory(0, 0, Direction.NORTH, program, 20, 20).nbytes
+        memo = TrajectoryMemo(max_bytes=size * 2)
+
+        first = memo.trajectory(0, 0, Direction.NORTH, program, 20, 20)
+        memo.trajectory(1, 0, Direction.NORTH, program, 20, 20)
+        memo.trajectory(0, 0, Direction.NORTH, program, 20, 20)
+        memo.trajectory(2, 0, Direction.NORTH, program, 20, 20)
+
+        assert len(memo) == 2
+        assert memo.nbytes <= memo.max_bytes
+        assert memo.trajectory(0, 0, Direction.NORTH, program, 20, 20) is first
+        assert memo.misses == 3
+
+
+class TestRunTrajectories:
+    def test_matches_stepping_on_random_grids(self):
+        rng = random.Random(32)
+        for _ in range(300):
+            state = rng.getstate()
+            stepped = random_grid(rng)
+            rng.setstate(state)
+            joined = random_grid(rng)
+            steps = rng.randint(0, 16)
+
+            with redirect_stdout(io.StringIO()) as stepped_output:
+                expected = step_until_collision(stepped, steps)
+            with redirect_stdout(io.StringIO()) as joined_output:
+                result = joined.run_trajectories(steps, TrajectoryMemo(10**6))
+
+            assert result == expected
+            assert joined_output.getvalue() == stepped_output.getvalue()
+            assert joined.current_step == stepped.current_step
+            assert [(car.position, car.direction) for car in joined.cars.values()] == [
+                (car.position, car.direction) for car in stepped.cars.values()
+            ]
+
+    def test_simulations_share_the_process_memo(self):
+        memo = get_trajectory_memo()
+        cars = [["A", "1 2 N", "FFRFFFFFRL"], ["B", "7 8 W", "FFLFFFFFFF"]]
+        Simulation(10, 10, cars).run()
+        hits = memo.hits
+
+        result = Simulation(10, 10, [cars[0], ["C", "0 0 E", "F"]]).run()
+
+        assert result == {"collision": False}
+        assert memo.hits == hits + 1
@@ -1,8 +1,13 @@
+import bz2
+import gzip
 import io
+import json
 import tempfile
 from pathlib import Path
 from unittest.mock import patch
 
+import pytest
+
 from main import show_format_help
 
 
@@ -72,3 +77,228 @@ class TestMainInputValidation:
 
         Path(temp_path).unlink()
         assert success
+
+    def test_run_length_commands(self):
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".txt", delete=False) as f:
+            f.write("10 10\n\nA\n0 0 E\nF4(LR)500\n\nB\n4 1 N\nL2F\n")
+            temp_path = f.name
+
+        with patch("sys.argv", ["main.py", temp_path]):
+            with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+                from main import main
+
+                main()
+
+        Path(temp_path).unlink()
+        assert mock_stdout.getvalue() == "A B \n4 0\n4\n"
+
+    @pytest.mark.parametrize(
+        "text, lines",
+        [
+            ("\n\n", ["ERROR: Empty input file!"]),
+            ("5 5\n", ["ERROR: No cars found in input file!"]),
+            (
+                "5\nA\n1 2 N\n",
+                [
+                    "ERROR: Invalid grid size format: '5'",
+                    "Expected: two positive integers (e.g., '10 10')",
+                ],
+            ),
+            (
+                "5 5\nA\n1 2 X\n",
+                [
+                    "ERROR: Car 1 ('A') has invalid position/direction: '1 2 X'",
+                    "Expected format: 'x y direction' (e.g., '1 2 N')",
+                ],
+            ),
+            (
+                "5 5\nA\n1 2 N\nFXF\n",
+                [
+                    "ERROR: Car 1 ('A') has invalid command 'X' in 'FXF'",
+                    "Commands must contain only F (Forward), L (Left), R (Right)",
+                ],
+            ),
+            ("5 5\nA\n", ["ERROR: Car 1 ('A') missing position and direction"]),
+        ],
+    )
+    def test_invalid_input_messages(self, tmp_path, text, lines):
+        input_path = tmp_path / "input.txt"
+        input_path.write_text(text)
+
+        with patch("sys.argv", ["main.py", str(input_path)]):
+            with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+                from main import main
+
+                with pytest.raises(SystemExit) as exit_info:
+                    main()
+
+        assert exit_info.value.code == 1
+        output = mock_stdout.getvalue().splitlines()
+        assert output[: len(lines)] == lines
+        assert output[len(lines)] == "ERROR: Invalid input format!"
+
+
+class TestMainResultCache:
+    def test_cache_dir_reuses_results(self):
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = Path(directory) / "input.txt"
+            input_path.write_text(
+                "10 10\nA\n1 2 N\nFFRFFFFFRL\n\nB\n7 8 W\nFFLFFFFFFF\n"
+            )
+            cache_dir = Path(directory) / "cache"
+            outputs = []
+
+            for _ in range(2):
+                argv = ["main.py", "--cache-dir", str(cache_dir), str(input_path)]
+                with patch("sys.argv", argv):
+                    with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+                        from main import main
+
+                        main()
+                        outputs.append(mock_stdout.getvalue())
+
+            cached_files = list(cache_dir.glob("*/*.json"))
+
+        assert outputs == ["A B \n5 4\n7\n"] * 2
+        assert len(cached_files) == 1
+
+    @pytest.mark.parametrize(
+        "option", [["--all-collisions", "freeze"], ["--trajectory-out", "out.ndjson"]]
+    )
+    def test_cache_dir_rejects_uncached_runs(self, tmp_path, option):
+        input_path = tmp_path / "input.txt"
+        input_path.write_text("5 5\nA\n1 2 N\nF\n")
+
+        argv = ["main.py", "--cache-dir", str(tmp_path / "cache"), *option]
+        with patch("sys.argv", argv + [str(input_path)]):
+            with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+                from main import main
+
+                with pytest.raises(SystemExit) as exit_info:
+                    main()
+
+        assert exit_info.value.code == 1
+        assert mock_stdout.getvalue() == (
+            "ERROR: --cache-dir caches first-collision results only\n"
+        )
+        assert not (tmp_path / "cache").exists()
+
+    def test_usage_lists_every_option(self):
+        with patch("sys.argv", ["main.py"]):
+            with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+                from main import main
+
+                with pytest.raises(SystemExit):
+                    main()
+
+        usage = mock_stdout.getvalue().splitlines()[1]
+        options = ["--cache-dir DIR", "--cache-max-mb MB", "--paged"]
+        options += ["--all-collisions {freeze,remove}", "--scratch-dir DIR"]
+        options += ["--trajectory-out PATH"]
+        assert [option for option in options if option not in usage] == []
+
+
+class TestMainAllCollisions:
+    def test_reports_every_collision(self):
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = Path(directory) / "input.txt"
+            input_path.write_text("3 3\nA\n0 0 E\nF\n\nB\n2 0 W\nF\n\nC\n1 2 S\nFF\n")
+
+            argv = ["main.py", "--all-collisions", "freeze", str(input_path)]
+            with patch("sys.argv", argv):
+                with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+                    from main import main
+
+                    main()
+
+        assert mock_stdout.getvalue() == "A B \n1 0\n1\nA B C \n1 0\n2\n"
+
+
+class TestMainScenarioFile:
+    def test_runs_converted_scenario(self):
+        text = "10 10\nA\n1 2 N\nFFRFFFFFRL\n\nB\n7 8 W\nFFLFFFFFFF\n"
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = Path(directory) / "input.txt"
+            input_path.write_text(text)
+            binary_path = Path(directory) / "input.scn"
+            text_path = Path(directory) / "output.txt"
+
+            from convert import main as convert
+
+            with patch("sys.argv", ["convert.py", str(input_path), str(binary_path)]):
+                convert()
+            with patch("sys.argv", ["convert.py", str(binary_path), str(text_path)]):
+                convert()
+
+            with patch("sys.argv", ["main.py", str(binary_path)]):
+                with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+                    from main import main
+
+                    main()
+            converted = text_path.read_text()
+
+        assert mock_stdout.getvalue() == "A B \n5 4\n7\n"
+        assert converted == ("10 10\n\nA\n1 2 N\nFFRFFFFFRL\n\nB\n7 8 W\nFFLFFFFFFF\n")
+
+    def test_runs_paged(self):
+        from application.input_parser import parse_input
+        from application.scenario_file import write_scenario
+
+        text = "10 10\nA\n1 2 N\nFFRFFFFFRL\n\nB\n7 8 W\nFFLFFFFFFF\n"
+        with tempfile.TemporaryDirectory() as directory:
+            binary_path = Path(directory) / "input.scn"
+            write_scenario(binary_path, *parse_input(text))
+
+            argv = ["main.py", "--paged", "--scratch-dir", directory, str(binary_path)]
+            with patch("sys.argv", argv):
+                with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+                    from main import main
+
+                    main()
+
+        assert mock_stdout.getvalue() == "A B \n5 4\n7\n"
+
+    def test_parses_large_text_in_parallel(self):
+        text = "10 10\nA\n1 2 N\nFFRFFFFFRL\n\nB\n7 8 W\nFFLFFFFFFF\n"
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = Path(directory) / "input.txt"
+            input_path.write_text(text)
+
+            argv = ["main.py", "--scratch-dir", directory, str(input_path)]
+            with patch("sys.argv", argv):
+                with patch("application.parallel_parser.PARALLEL_MIN_BYTES", 0):
+                    with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+                        from main import main
+
+                        main()
+            leftover = sorted(path.name for path in Path(directory).iterdir())
+
+        assert mock_stdout.getvalue() == "A B \n5 4\n7\n"
+        assert leftover == ["input.txt"]
+
+    def test_writes_compressed_trajectory(self):
+        text = "10 10\nA\n1 2 N\nFFRFFFFFRL\n\nB\n7 8 W\nFFLFFFFFFF\n"
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = Path(directory) / "input.txt.bz2"
+            input_path.write_bytes(bz2.compress(text.encode()))
+            output = Path(directory) / "trajectory.ndjson.gz"
+
+            argv = ["main.py", "--trajectory-out", str(output), str(input_path)]
+            with patch("sys.argv", argv):
+                with patch("sys.stdout", new_callable=io.StringIO) as mock_stdout:
+                    from main import main
+
+                    main()
+            records = [
+                json.loads(line)
+                for line in gzip.decompress(output.read_bytes()).splitlines()
+            ]
+
+        assert mock_stdout.getvalue() == "A B \n5 4\n7\n"
+        assert records[0] == {"step": 0, "cars": [["A", 1, 2, "N"], ["B", 7, 8, "W"]]}
+        assert records[1] == {"step": 1, "cars": [["A", 1, 3, "N"], ["B", 6, 8, "W"]]}
+        assert records[-1] == {
+            "step": 7,
+            "cars": [["A", 5, 4, "E"], ["B", 5, 4, "S"]],
+            "collision": {"cars": ["A", "B"], "position": [5, 4]},
+        }
@@ -0,0 +1,25 @@
+import os
+from unittest.mock import patch
+
+from settings import Settings, get_settings, settings
+
+
+class TestSettings:
+    def test_settings_are_cached(self):
+        assert get_settings() is get_settings()
+        assert settings is get_settings()
+
+    def test_toml_values_beat_environment(self):
+        with patch.dict(os.environ, {"LOG_LEVEL": "debug", "MAX_GRID_SIZE_X": "7"}):
+            loaded = Settings.from_config({"log_level": "critical"})
+
+        assert loaded.log_level == "critical"
+        assert loaded.max_grid_size_x == 7
+        assert loaded.max_grid_size_y == 20
+
+    def test_unknown_setting_rejected(self):
+        try:
+            Settings.from_config({"max_grid": 3})
+            assert False
+        except ValueError as e:
+            assert "Unknown settings: max_grid" in str(e)